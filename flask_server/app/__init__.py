@@ -91,7 +91,12 @@ def create_app():
                              SupportResponse, 
                              SupportDraft, 
                              UserActionTokens, 
-                             AppliedSQLScripts)
+                             AppliedSQLScripts,
+                             Data_Version,
+                             User_Scenario,
+                             User_Scenario_Recipe,
+                             Save_Ingest_Job,
+                             User_Save_Generation)
         db.create_all()  # Ensure tables are created
         
 
@@ -108,6 +113,12 @@ def create_app():
     # print(f"Total Routes Registered: {x}")
     logger.info(f"Total Routes Registered: {x}")
     # logging.info(f"Total Routes Registered: {x}")
+
+    # Servers that import the app (e.g. gunicorn run:app) opt in to running the save ingest workers, so saves queued
+    # before a restart are picked up; CLI commands and scripts that create the app leave them off
+    if app.config.get("INGEST_START_WORKERS", False):
+        from .ingest_jobs import ensure_ingest_workers
+        ensure_ingest_workers(app)
     
     logger.info("✅ Flask Application successfully created")
     # logging.info("Flask Application successfully created")
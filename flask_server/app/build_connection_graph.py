@@ -3,6 +3,9 @@ from collections import defaultdict
 from .logging_util import setup_logger
 from . import db
 from .models import User_Save_Pipes, User_Connection_Data, User_Pipe_Data
+from .bulk_insert import insert_rows
+from .save_generation import get_active_generation
+from .reference_data import get_pipeline_flow_rates
 from sqlalchemy import text
 import json
 import re
@@ -11,6 +14,13 @@ logger = setup_logger("build_connection_graph")
 progress = ""  # Debugging variable
 visited = None
 
+# Columns of the rows built for the derived connection tables, in the order of the row tuples
+CONNECTION_DATA_COLUMNS = ("user_id", "source_component", "source_level", "source_reference_id", "target_component",
+                           "target_level", "target_reference_id", "direction", "connection_type", "produced_item",
+                           "conveyor_speed")
+PIPE_DATA_COLUMNS = ("user_id", "pipe_network", "source_component", "source_level", "source_reference_id", "target_component",
+                     "target_level", "target_reference_id", "connection_type", "produced_item", "pipe_flow_rate")
+
 def build_connection_graph(connection_data):
     """
     Processes the connection data into a machine graph.
@@ -71,56 +81,70 @@ def detect_cycles(graph):
 
     return any(visit(node) for node in graph)
 
-def build_factory_graph(user_id, visited=None):
-    """Builds a factory graph by navigating the machine connections step by step."""
-    try:
-        graph, metadata_map = {}, {}
-
-        # 🔹 Step 1: Get all starting points (machines with no input OR machines with pipe inputs and conveyor outputs)
-        start_query = text("""
-            SELECT output_inventory 
-            FROM user_save
-            WHERE user_id = 1 
-            AND output_inventory REGEXP 'Miner|Blender|Converter|Packager|Encoder';                           
-        """)
-        # Old query SELECT output_inventory FROM user_save WHERE input_inventory IS NULL AND user_id = :user_id
+def collect_factory_graph(user_id, generation, visited=None):
+    """Returns (graph, metadata_map) built from the user's save rows of the given ingest generation, without saving them."""
+    graph, metadata_map = {}, {}
+
+    # 🔹 Step 1: Get all starting points (machines with no input OR machines with pipe inputs and conveyor outputs)
+    start_query = text("""
+        SELECT output_inventory 
+        FROM user_save
+        WHERE user_id = :user_id
+        AND ingest_generation = :generation
+        AND output_inventory REGEXP 'Miner|Blender|Converter|Packager|Encoder';                           
+    """)
+    # Old query SELECT output_inventory FROM user_save WHERE input_inventory IS NULL AND user_id = :user_id
+
+    start_points = db.session.execute(start_query, {"user_id": user_id, "generation": generation}).fetchall()
+    
+    # 🔹 Step 2: Fetch machine metadata
+    metadata_query = text("""
+        SELECT us.output_inventory, m.machine_name, p.part_name AS produced_item, 
+               r.part_supply_pm, cs.supply_pm AS conveyor_speed, i.icon_path AS icon_path
+        FROM user_save us
+        JOIN machine m ON us.machine_id = m.id
+        JOIN recipe r ON us.recipe_id = r.id
+        JOIN part p ON r.part_id = p.id
+        LEFT JOIN user_save_connections usc ON us.output_inventory = usc.connection_inventory
+            AND usc.user_id = us.user_id AND usc.ingest_generation = us.ingest_generation
+        LEFT JOIN conveyor_supply cs ON usc.conveyor_speed = cs.supply_pm
+        LEFT JOIN icon i ON m.icon_id = i.id
+        WHERE us.user_id = :user_id AND us.ingest_generation = :generation
+    """)
+
+    metadata_results = db.session.execute(metadata_query, {"user_id": user_id, "generation": generation}).fetchall()
+    for row in metadata_results:
+        metadata_map[row.output_inventory] = {
+            "machine_name": row.machine_name,
+            "produced_item": row.produced_item,
+            "conveyor_speed": row.conveyor_speed,
+            "icon_path": row.icon_path,
+        }
+    # 🔹 Step 3: Build the conveyor connections
+    for start in start_points:
+        machine = start.output_inventory
+        graph[machine] = []
+        if visited is None:
+            visited = set()
+        # 🔹 Steps 4 & 5 Connect the sources and targets until you find the last machine
+        traverse_factory_graph(machine, graph, user_id, visited, generation)  # Recursively build graph
+    
+    logger.info(f"✅ Successfully built factory graph")
+    return graph, metadata_map
 
-        start_points = db.session.execute(start_query, {"user_id": user_id}).fetchall()
-        progress = f"Step 1 Query: {start_query}, Start Points: {start_points}"
-        
-        # 🔹 Step 2: Fetch machine metadata
-        metadata_query = text("""
-            SELECT us.output_inventory, m.machine_name, p.part_name AS produced_item, 
-                   r.part_supply_pm, cs.supply_pm AS conveyor_speed, i.icon_path AS icon_path
-            FROM user_save us
-            JOIN machine m ON us.machine_id = m.id
-            JOIN recipe r ON us.recipe_id = r.id
-            JOIN part p ON r.part_id = p.id
-            LEFT JOIN user_save_connections usc ON us.output_inventory = usc.connection_inventory
-            LEFT JOIN conveyor_supply cs ON usc.conveyor_speed = cs.supply_pm
-            LEFT JOIN icon i ON m.icon_id = i.id
-            WHERE us.user_id = :user_id
-        """)
+def build_factory_graph(user_id, visited=None, generation=None, raise_errors=False):
+    """
+    Builds a factory graph by navigating the machine connections step by step.
+    Reads and writes the rows of the given ingest generation (the user's active generation by default).
+    With raise_errors, a failure to build or save the graph is raised instead of logged.
+    """
+    progress = "Starting"
+    try:
+        if generation is None:
+            generation = get_active_generation(user_id)
 
-        metadata_results = db.session.execute(metadata_query, {"user_id": user_id}).fetchall()
-        for row in metadata_results:
-            metadata_map[row.output_inventory] = {
-                "machine_name": row.machine_name,
-                "produced_item": row.produced_item,
-                "conveyor_speed": row.conveyor_speed,
-                "icon_path": row.icon_path,
-            }
-        progress = f"Step 2 Query: {metadata_query}, Metadata Results: {metadata_results}"
-        # 🔹 Step 3: Build the conveyor connections
-        for start in start_points:
-            machine = start.output_inventory
-            graph[machine] = []
-            if visited is None:
-                visited = set()
-            # 🔹 Steps 4 & 5 Connect the sources and targets until you find the last machine
-            traverse_factory_graph(machine, graph, user_id, visited)  # Recursively build graph
-        
-        logger.info(f"✅ Successfully built factory graph")
+        # 🔹 Steps 1 to 5: Find the starting points and follow their conveyors
+        graph, metadata_map = collect_factory_graph(user_id, generation, visited)
         progress = f"Step 3, 4, 5: Successfully built factory graph"
 
 
@@ -148,8 +172,10 @@ def build_factory_graph(user_id, visited=None):
         # progress = f"Step 6: Successfully integrated pipes into the graph"
 
         # 🔹 Step 7: Save the Processed User Connection Data
-        save_user_connection_data(graph, metadata_map, user_id)  # Save processed data 
-        process_pipe_network(user_id)  # Process pipe network       
+        if not save_user_connection_data(graph, metadata_map, user_id, generation) and raise_errors:  # Save processed data
+            raise RuntimeError("Failed to save user connection data")
+        if process_pipe_network(user_id, generation) is False and raise_errors:  # Process pipe network
+            raise RuntimeError("Failed to save user pipe data")
         progress = f"Step 7: Successfully saved processed user conveyor and pipe data"
         logger.info(f"✅ Successfully saved processed user conveyor and pipe data")
 
@@ -158,18 +184,20 @@ def build_factory_graph(user_id, visited=None):
 
     except Exception as e:
         logger.error(f"❌ Error building full factory graph. Progress: {progress} Error: {e}")
+        if raise_errors:
+            raise
         return jsonify({"error": "Failed to build factory graph"}), 500
 
-def traverse_factory_graph(current_machine, graph, user_id, visited):
+def traverse_factory_graph(current_machine, graph, user_id, visited, generation=0):
     """Recursively finds machines linked through conveyors."""
     
     try:
         # 🔹 Step 4: Get the first conveyor connected to this machine
         conveyor_query = text("""
             SELECT connected_component, direction FROM user_save_connections
-            WHERE connection_inventory = :machine AND user_id = :user_id
+            WHERE connection_inventory = :machine AND user_id = :user_id AND ingest_generation = :generation
         """)
-        conveyors = db.session.execute(conveyor_query, {"machine": current_machine, "user_id": user_id}).fetchall()
+        conveyors = db.session.execute(conveyor_query, {"machine": current_machine, "user_id": user_id, "generation": generation}).fetchall()
         progress = f"Step 4 Conveyors: {conveyor_query}, {conveyors} for machine: {current_machine}"
         # logger.debug(f"-- Step 4 Querying for conveyors: found: {conveyors} for machine: {current_machine}")
         # log_text = f"SELECT connected_component, direction FROM user_save_connections WHERE connection_inventory = '{current_machine}' AND user_id = {user_id};\n/*RESULT\n\n*/"
@@ -180,9 +208,9 @@ def traverse_factory_graph(current_machine, graph, user_id, visited):
             # 🔹 Step 4.5: Check if connected to a merger before skipping.
             conveyor_query = text("""
                 SELECT connected_component, direction FROM user_save_connections
-                WHERE outer_path_name = :machine AND direction LIKE 'input%' AND user_id = :user_id
+                WHERE outer_path_name = :machine AND direction LIKE 'input%' AND user_id = :user_id AND ingest_generation = :generation
    """)
-            conveyors = db.session.execute(conveyor_query, {"machine": current_machine, "user_id": user_id}).fetchall()
+            conveyors = db.session.execute(conveyor_query, {"machine": current_machine, "user_id": user_id, "generation": generation}).fetchall()
             progress = f"Step 4 Conveyors: {conveyor_query}, {conveyors} for machine: {current_machine}"
             # logger.debug(f"-- Step 4.5 Querying for merger: found: {conveyors} for machine: {current_machine}")
             # log_text = f"SELECT connected_component, direction FROM user_save_connections WHERE outer_path_name = '{current_machine}' AND direction LIKE 'input%' AND user_id = {user_id};\n/*RESULT\n\n*/"
@@ -215,9 +243,9 @@ def traverse_factory_graph(current_machine, graph, user_id, visited):
             # 🔹 Step 5: Find the next machine (destination of the conveyor)
             next_machine_query = text("""
                 SELECT connected_component, direction FROM user_save_connections
-                WHERE outer_path_name = :conveyor AND direction LIKE 'input%' AND user_id = :user_id
+                WHERE outer_path_name = :conveyor AND direction LIKE 'input%' AND user_id = :user_id AND ingest_generation = :generation
             """)
-            next_machines = db.session.execute(next_machine_query, {"conveyor": conveyor_belt, "user_id": user_id}).fetchall()
+            next_machines = db.session.execute(next_machine_query, {"conveyor": conveyor_belt, "user_id": user_id, "generation": generation}).fetchall()
             progress = f"Step 5 Query: {next_machine_query}, Conveyor: {conveyor_belt}, User: {user_id}"
             # logger.debug(f"-- Step 5 Querying for next machines: found: {conveyor_belt}, User: {user_id}")
             # log_text = f"SELECT connected_component, direction FROM user_save_connections WHERE outer_path_name = '{conveyor_belt}' AND direction LIKE 'input%' AND user_id = {user_id};\n/*RESULT\n\n*/"
@@ -226,9 +254,9 @@ def traverse_factory_graph(current_machine, graph, user_id, visited):
             if not next_machines:
                 next_machine_query = text("""
                 SELECT connected_component, direction FROM user_save_connections
-                WHERE outer_path_name = :conveyor AND direction LIKE 'conveyor%' AND user_id = :user_id
+                WHERE outer_path_name = :conveyor AND direction LIKE 'conveyor%' AND user_id = :user_id AND ingest_generation = :generation
             """)
-                next_machines = db.session.execute(next_machine_query, {"conveyor": conveyor_belt, "user_id": user_id}).fetchall()
+                next_machines = db.session.execute(next_machine_query, {"conveyor": conveyor_belt, "user_id": user_id, "generation": generation}).fetchall()
                 progress = f"No input found, checking for conveyors Query: {next_machine_query}, Conveyor: {conveyor_belt}, User: {user_id}"
                 # logger.debug(f"-- Step 5.5 No input found, checking for conveyors. found: {conveyor_belt}, User: {user_id}")
                 # log_text = f"SELECT connected_component, direction FROM user_save_connections WHERE outer_path_name = '{conveyor_belt}' AND direction LIKE 'conveyor%' AND user_id = {user_id};\n/*RESULT\n\n*/"
@@ -259,7 +287,7 @@ def traverse_factory_graph(current_machine, graph, user_id, visited):
                 })
 
                 
-                traverse_factory_graph(machine_target, graph, user_id, visited)  # Continue traversing        
+                traverse_factory_graph(machine_target, graph, user_id, visited, generation)  # Continue traversing        
         return graph
     except Exception as e:
         logger.error(f"❌ Error traversing factory graph: e: {e}, Progress: {progress}, Current Machine: {current_machine}")
@@ -329,48 +357,47 @@ def clean_name(raw_name):
 
     return raw_name, "N/A", "N/A"  # Default values if no match is found
 
-def save_user_connection_data(graph, metadata_map, user_id):
-    """Saves the processed connection data into the database."""
-    try:
-        connection_entries = []
+def connection_data_rows(graph, metadata_map, user_id):
+    """Returns the user_connection_data rows (see CONNECTION_DATA_COLUMNS) of a factory graph."""
+    connection_entries = []
+    
+    # logger.debug(f"🔍 About to process {len(graph)} connections for user {user_id}")
+    # logger.debug("**************************Graph**************************")
+    # logger.debug(graph)
+    # logger.debug("**************************End of Graph**************************")
+    
+    for src, targets in graph.items():
         
-        # logger.debug(f"🔍 About to process {len(graph)} connections for user {user_id}")
-        # logger.debug("**************************Graph**************************")
-        # logger.debug(graph)
-        # logger.debug("**************************End of Graph**************************")
+        # logger.debug(f"🔍 Processing connections for source: {src} targets {targets} in graph.items {graph.items}")
         
-        for src, targets in graph.items():
-            
-            # logger.debug(f"🔍 Processing connections for source: {src} targets {targets} in graph.items {graph.items}")
-            
-            for tgt in targets:
-                if tgt:
-                    target_component = tgt.get("target", tgt) if isinstance(tgt, dict) else tgt
-                    target_direction = tgt.get("direction", None) if isinstance(tgt, dict) else None
+        for tgt in targets:
+            if tgt:
+                target_component = tgt.get("target", tgt) if isinstance(tgt, dict) else tgt
+                target_direction = tgt.get("direction", None) if isinstance(tgt, dict) else None
 
-                    
-                    src_clean, src_level, src_ref = clean_name(src)                    
-                    tgt_clean, tgt_level, tgt_ref = clean_name(target_component)
-                    
-                    
-                    connection_entries.append(User_Connection_Data(
-                        user_id=user_id,
-                        source_component=src_clean,
-                        source_level=src_level,
-                        source_reference_id=src_ref,
-                        target_component=tgt_clean,
-                        target_level=tgt_level,
-                        target_reference_id=tgt_ref,
-                        direction=target_direction,
-                        connection_type="Conveyor Network",
-                        produced_item=metadata_map.get(src, {}).get("produced_item", None),
-                        conveyor_speed=metadata_map.get(src, {}).get("conveyor_speed", None)
-                    ))
+                
+                src_clean, src_level, src_ref = clean_name(src)                    
+                tgt_clean, tgt_level, tgt_ref = clean_name(target_component)
+                
+                
+                connection_entries.append((
+                    user_id, src_clean, src_level, src_ref, tgt_clean, tgt_level, tgt_ref, target_direction,
+                    "Conveyor Network",
+                    metadata_map.get(src, {}).get("produced_item", None),
+                    metadata_map.get(src, {}).get("conveyor_speed", None),
+                ))
+    return connection_entries
+
+def save_user_connection_data(graph, metadata_map, user_id, generation=0):
+    """Saves the processed connection data into the database."""
+    connection_entries = []
+    try:
+        connection_entries = connection_data_rows(graph, metadata_map, user_id)
 
         # Bulk insert processed data
         # logger.debug(f"📥 About to save {len(connection_entries)} processed connections in user_connection_data")
         
-        db.session.bulk_save_objects(connection_entries)
+        insert_rows(User_Connection_Data, CONNECTION_DATA_COLUMNS, connection_entries, values={"ingest_generation": generation})
         
         # logger.debug(f"📥 Successfully bulk saved processed connections in user_connection_data")
         
@@ -400,60 +427,53 @@ def clean_instance_name(instance_name):
     match = re.search(r"Persistent_Level:PersistentLevel\.FG([A-Za-z0-9_]+)", instance_name)
     return match.group(1) if match else instance_name
 
-def process_pipe_network(user_id):
+def pipe_data_rows(user_id, generation=0):
+    """Returns the user_pipe_data rows (see PIPE_DATA_COLUMNS) of the user's pipe networks in the given generation."""
+    query = text("""
+        SELECT id, instance_name, fluid_type, connection_points 
+        FROM user_save_pipes WHERE user_id = :user_id AND ingest_generation = :generation
+    """)
+    pipe_networks = db.session.execute(query, {"user_id": user_id, "generation": generation}).fetchall()
+
+    processed_pipes = []
+    if not pipe_networks:
+        return processed_pipes
+    pipeline_flow_rates = get_pipeline_flow_rates()
+    
+    for pipe in pipe_networks:
+        instance_name = clean_instance_name(pipe.instance_name)
+        fluid_type = clean_fluid_type(pipe.fluid_type)
+        connection_points = json.loads(pipe.connection_points) if pipe.connection_points else []
+
+        # Convert connection points into Source → Target links
+        for i in range(len(connection_points) - 1):
+            source = connection_points[i]
+            target = connection_points[i + 1]
+
+            # Extract names, levels, and IDs
+            src_clean, src_level, src_ref = clean_name(source)
+            tgt_clean, tgt_level, tgt_ref = clean_name(target)
+
+            # Fetch pipeline flow rate if available
+            pipe_flow_rate = pipeline_flow_rates.get(src_level)
+
+            processed_pipes.append((
+                    user_id, instance_name, src_clean, src_level, src_ref, tgt_clean, tgt_level, tgt_ref,
+                    "Pipe Network", fluid_type, pipe_flow_rate,
+                ))
+    return processed_pipes
+
+def process_pipe_network(user_id, generation=0):
     """Processes pipes into a Source → Target format for visualization."""
+    processed_pipes = []
     try:
-        query = text("""
-            SELECT id, instance_name, fluid_type, connection_points 
-            FROM user_save_pipes WHERE user_id = :user_id
-        """)
-        pipe_networks = db.session.execute(query, {"user_id": user_id}).fetchall()
+        processed_pipes = pipe_data_rows(user_id, generation)
 
-        if not pipe_networks:
+        if not processed_pipes:
             logger.warning(f"⚠️ No pipes found for user {user_id}")
             return
 
-        processed_pipes = []
-        
-        for pipe in pipe_networks:
-            instance_name = clean_instance_name(pipe.instance_name)
-            fluid_type = clean_fluid_type(pipe.fluid_type)
-            connection_points = json.loads(pipe.connection_points) if pipe.connection_points else []
-
-            # Convert connection points into Source → Target links
-            for i in range(len(connection_points) - 1):
-                source = connection_points[i]
-                target = connection_points[i + 1]
-
-                # Extract names, levels, and IDs
-                src_clean, src_level, src_ref = clean_name(source)
-                tgt_clean, tgt_level, tgt_ref = clean_name(target)
-
-                # Fetch pipeline flow rate if available
-                flow_rate_query = text("""
-                    SELECT ps.supply_pm 
-                    FROM pipeline_supply ps
-                    JOIN pipeline_level pl ON ps.pipeline_level_id = pl.id
-                    WHERE pl.pipeline_level = :pipeline_level
-                """)
-                flow_rate_result = db.session.execute(flow_rate_query, {"pipeline_level": src_level}).fetchone()
-                pipe_flow_rate = flow_rate_result.supply_pm if flow_rate_result else None
-
-                processed_pipes.append(User_Pipe_Data(
-                        user_id=user_id,
-                        pipe_network=instance_name,
-                        source_component=src_clean,
-                        source_level=src_level,
-                        source_reference_id=src_ref,
-                        target_component=tgt_clean,
-                        target_level=tgt_level,
-                        target_reference_id=tgt_ref,
-                        connection_type="Pipe Network",
-                        produced_item=fluid_type,
-                        pipe_flow_rate=pipe_flow_rate                        
-                    ))        
-
-        db.session.bulk_save_objects(processed_pipes)
+        insert_rows(User_Pipe_Data, PIPE_DATA_COLUMNS, processed_pipes, values={"ingest_generation": generation})
         db.session.commit()
         logger.info(f"✅ Processed and saved {len(processed_pipes)} pipe connections for user {user_id}")
         return True
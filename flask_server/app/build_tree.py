@@ -1,63 +1,216 @@
 # Description: This module contains the function to build the tree structure for the given part_id, recipe_name, target_quantity and target_parts_pm/target_timeframe.
-# It then recursively builds the subtrees for each part in the recipe.
+# It then builds the subtrees for each part in the recipe.
 # The function calculates the required quantity, required parts per minute, timeframe, and number of machines needed to produce the given part and each of the ingredient inputs based on the target quantity and target parts per minute.
 # The function returns a dictionary containing the tree structure and subtrees for the given part_id and all it's ingredient inputs.
+# Recipes are read from the in-memory RecipeGraph (see recipe_graph.py) and the user's selections from their cached effective recipe map (see recipe_selection.py).
+#
+# Production trees scale linearly with the target, so building one is split in two:
+#   1. Resolve the "unit subtree" of a (part_id, recipe) - the recipe every ingredient uses and its demand per unit of its parent.
+#      Unit subtrees do not depend on the target, so they are memoized on the graph per selection set and shared
+#      intermediates (Iron Plate, Screw, Wire...) are resolved once across branches, tracked items and requests.
+#   2. Materialize the requested tree by scaling the unit subtree by the target quantity and rate.
+# Both steps walk the tree with an explicit stack, so long chains cannot hit Python's recursion limit.
+# Circular dependencies are found up front from the strongly connected components of the recipe graph
+# (see RecipeGraph.find_cycle_reaching_keys); only keys that can reach one are tracked on the walk's path.
+# build_flat_bom returns the same totals aggregated per part, recipe and machine (/api/build_tree?mode=flat).
+# build_tree(depth=N) stops after N levels and expand_tree_node fills in one entry later (/api/build_tree/node).
+# build_tree_dag returns the unit subtrees as a node table plus edges with multipliers (/api/build_tree?format=dag).
+# Given a graph and a selection map these functions need no request (or app) context, so they can run on worker
+# threads and processes (see tree_workers.py); only the selected_recipes=None fallback reads the logged-in user.
 
-from sqlalchemy import text
-from . import db
-from flask_login import current_user
+from collections import namedtuple
+from flask import current_app, has_app_context
 from .logging_util import setup_logger
-import logging
+from .recipe_graph import get_recipe_graph
+from .recipe_selection import get_current_user_recipe_map
 
 logger = setup_logger("build_tree")
 
-def build_tree(part_id, recipe_name="_Standard", target_quantity=1, target_parts_pm=None, target_timeframe=None, visited=None, in_recursion=False):
-    #logging.debug(f"*********************Building tree for part_id: {part_id}, recipe_name: {recipe_name}, target_quantity: {target_quantity}, target_parts_pm: {target_parts_pm}, target_timeframe: {target_timeframe}, visited: {visited}, in_recursion: {in_recursion}*****************")
-    # Check for user-selected recipe
-    parent_required_rate = 0
-    if float(target_parts_pm) is not None and float(target_parts_pm) > 0:
-        parent_required_rate = float(target_parts_pm)
-    elif float(target_timeframe) is not None and float(target_timeframe) > 0:
-        parent_required_rate = target_quantity / float(target_timeframe)
-    
-    parent_total_quantity = target_quantity
-    selected_recipe_query = """
-        SELECT r.id, r.recipe_name
-        FROM user_selected_recipe usr
-        JOIN recipe r ON usr.recipe_id = r.id
-        WHERE usr.user_id = :user_id AND usr.part_id = :part_id
+# recipe is None when the recipe was not found or the node closes a circular dependency
+UnitNode = namedtuple("UnitNode", ["recipe", "children"])
+# child_recipe is kept apart from node.recipe because a circular child still reports its own supply and machine
+UnitChild = namedtuple("UnitChild", ["ingredient", "final_recipe", "child_recipe", "node"])
+
+CIRCULAR_NODE = UnitNode(None, ())
+
+def _to_float(value):
+    """Convert a target value from the request or tracker table to a float, treating blanks as 0."""
+    if value is None or value == "":
+        return 0.0
+    return float(value)
+
+class SubtreeMemo:
+    """Unit subtrees resolved under one recipe selection set, plus the keys that lead into a circular dependency."""
+
+    def __init__(self, graph, selected_recipes):
+        self.units = {}  # (part_id, recipe_name) -> UnitNode
+        # Subtrees of these keys are cut short wherever the walk loops back, so they depend on the path and are never memoized
+        self.cycle_reaching = graph.find_cycle_reaching_keys(selected_recipes)
+
+def get_subtree_memo(graph, selected_recipes):
+    """Return the SubtreeMemo shared by every request with the same recipe selections."""
+    key = frozenset(selected_recipes.items())
+    with graph.subtree_memos_lock:
+        memo = graph.subtree_memos.get(key)
+        if memo is None:
+            memo = SubtreeMemo(graph, selected_recipes)
+            graph.subtree_memos[key] = memo
+            max_memos = current_app.config.get("SUBTREE_MEMO_SELECTION_SETS", 64) if has_app_context() else 64
+            while len(graph.subtree_memos) > max_memos:
+                graph.subtree_memos.popitem(last=False)
+        else:
+            graph.subtree_memos.move_to_end(key)
+    return memo
+
+def _unit_node_or_none(graph, memo, key):
+    """Return the finished UnitNode for key if it needs no walk (memoized or missing recipe), else None."""
+    node = memo.units.get(key)
+    if node is None and key not in graph.recipes:
+        logger.error(f"Part ID {key[0]} with recipe type {key[1]} not found.")
+        node = UnitNode(None, ())
+        memo.units[key] = node
+    return node
+
+def resolve_unit_node(graph, selected_recipes, part_id, recipe_type, memo, visited=None):
+    """
+    Resolve the unit subtree of part_id made with recipe_type using an explicit stack.
+    Only keys in memo.cycle_reaching are tracked on the current path; an ingredient already on the path
+    gets CIRCULAR_NODE, exactly where the old recursive walk stopped.
     """
-    selected_recipe = db.session.execute(
-        text(selected_recipe_query), {"user_id": current_user.id, "part_id": part_id}
-    ).fetchone()
+    visited = set(visited or ())
+    root_key = (part_id, recipe_type)
+    if root_key in visited:
+        logger.error(f"Circular dependency detected for part_id {part_id} with recipe_name {recipe_type}")
+        return CIRCULAR_NODE
+    node = _unit_node_or_none(graph, memo, root_key)
+    if node is not None:
+        return node
+
+    # Each frame is [key, recipe, next ingredient index, children resolved so far]
+    stack = [[root_key, graph.recipes[root_key], 0, []]]
+    if root_key in memo.cycle_reaching:
+        visited.add(root_key)
+    while True:
+        frame = stack[-1]
+        key, recipe, position, children = frame
+        if position < len(recipe.ingredients):
+            ingredient = recipe.ingredients[position]
+            frame[2] = position + 1
+            # Use the selected recipe or default to the current recipe name
+            final_recipe = selected_recipes.get(ingredient.part_id) or key[1]
+            child_key = (ingredient.part_id, final_recipe)
+            child_recipe = graph.get_recipe(ingredient.part_id, final_recipe)
+            if child_key in visited:
+                logger.error(f"Circular dependency detected for part_id {ingredient.part_id} with recipe_name {final_recipe}")
+                children.append(UnitChild(ingredient, final_recipe, child_recipe, CIRCULAR_NODE))
+                continue
+            child_node = _unit_node_or_none(graph, memo, child_key)
+            if child_node is not None:
+                children.append(UnitChild(ingredient, final_recipe, child_recipe, child_node))
+                continue
+            if child_key in memo.cycle_reaching:
+                visited.add(child_key)
+            stack.append([child_key, child_recipe, 0, []])
+            continue
 
-    recipe_type = selected_recipe.recipe_name if selected_recipe else recipe_name
-    if visited is None:
+        stack.pop()
+        visited.discard(key)
+        node = UnitNode(recipe, tuple(children))
+        if key not in memo.cycle_reaching:
+            memo.units[key] = node
+        if not stack:
+            return node
+        parent = stack[-1]
+        ingredient = parent[1].ingredients[parent[2] - 1]
+        parent[3].append(UnitChild(ingredient, recipe.recipe_name, recipe, node))
+
+def materialize_subtree(node, parent_total_quantity, parent_required_rate, depth=None):
+    """
+    Scale a unit subtree to its parent's quantity and rate and return the nested Subtree dict.
+    With depth, only that many levels of ingredients are included; entries cut off there get an empty
+    Subtree and "Expandable": True (see expand_tree_node).
+    """
+    root_subtree = {}
+    stack = [(node, parent_total_quantity, parent_required_rate, root_subtree, 1)]
+    while stack:
+        node, parent_total_quantity, parent_required_rate, subtree, level = stack.pop()
+        for child in node.children:
+            ingredient = child.ingredient
+            child_required_quantity = parent_total_quantity * ingredient.ingredient_demand_quantity
+            child_required_rate = parent_required_rate * ingredient.ingredient_demand_quantity
+            child_timeframe = (child_required_quantity / child_required_rate
+                            if child_required_rate else 0)
+            child_supply_pm = child.child_recipe.part_supply_pm if child.child_recipe else None
+            child_machines = (child_required_rate / child_supply_pm
+                            if child_supply_pm else 0)
+
+            # Attach the ingredient's subtree to the current node; it is filled in when its entry comes off the stack
+            child_subtree = {}
+            subtree[ingredient.part_name] = {
+                "Required Quantity": child_required_quantity,
+                "Required Parts PM": child_required_rate,
+                "Timeframe": child_timeframe,
+                "Produced In": child.child_recipe.produced_in if child.child_recipe else None,
+                "No. of Machines": child_machines,
+                "Recipe": child.final_recipe,
+                "Part Supply PM": node.recipe.part_supply_pm,
+                "Part Supply Quantity": node.recipe.part_supply_quantity,
+                "Ingredient Demand PM": ingredient.ingredient_demand_pm,
+                "Ingredient Demand Quantity": ingredient.ingredient_demand_quantity,
+                "Ingredient Supply PM": child_supply_pm,
+                "Ingredient Supply Quantity": child_supply_pm,  # The original lookup returned part_supply_pm here too
+                "Subtree": child_subtree,
+            }
+            if not child.node.children:
+                continue
+            if depth is None or level < depth:
+                stack.append((child.node, child_required_quantity, child_required_rate, child_subtree, level + 1))
+            else:
+                subtree[ingredient.part_name]["Expandable"] = True
+    return root_subtree
+
+def calculate_target_rate(target_quantity, target_parts_pm, target_timeframe):
+    """Return the required parts per minute for a target, from target_parts_pm or else quantity / timeframe."""
+    if _to_float(target_parts_pm) > 0:
+        return _to_float(target_parts_pm)
+    elif _to_float(target_timeframe) > 0:
+        return target_quantity / _to_float(target_timeframe)
+    return 0
+
+def _resolve_root(part_id, recipe_name, graph, selected_recipes, visited=None):
+    """
+    Resolve the unit subtree of the requested part.
+    Returns (graph, part_id, recipe_type, node, error) where error is the {"Error": ...} response or None.
+    """
+    if graph is None:
+        graph = get_recipe_graph()
+    if selected_recipes is None:
+        selected_recipes = get_current_user_recipe_map()
+    part_id = int(part_id)
+
+    # Check for user-selected recipe
+    recipe_type = selected_recipes.get(part_id) or recipe_name
+    if not isinstance(visited, set):
         visited = set()
-    
-    if (part_id, recipe_type) in visited:
-        logging.error("Circular dependency detected for part_id %s with recipe_name %s", part_id, recipe_type)
-        return {"Error": f"Circular dependency detected for part_id {part_id} with recipe_name {recipe_type}"}
-    
-    visited.add((part_id, recipe_type))
-    
-    root_data = db.session.execute(
-            text("""
-            SELECT p.part_name, r.ingredient_demand_pm, r.part_supply_pm, r.recipe_name, r.produced_in_automated,
-                 r.ingredient_demand_quantity, r.part_supply_quantity, r.part_cycle_time_sec, 
-                 r.byproduct, r.byproduct_supply_pm, r.byproduct_supply_quantity
-            FROM part p
-            JOIN recipe r ON p.id = r.part_id
-            WHERE p.id = :part_id AND r.recipe_name = :recipe_name
-            """),
-            {"part_id": part_id, "recipe_name": recipe_type}
-        ).fetchone()
-
-    if not root_data:
-            logging.error("Part ID  with recipe type  not found.", part_id, recipe_type)
-            visited.remove((part_id, recipe_type))
-            return {"Error": f"Part ID {part_id} with recipe type {recipe_type} not found."}
-    
+
+    memo = get_subtree_memo(graph, selected_recipes)
+    node = resolve_unit_node(graph, selected_recipes, part_id, recipe_type, memo, visited)
+    error = None
+    if node is CIRCULAR_NODE:
+        error = {"Error": f"Circular dependency detected for part_id {part_id} with recipe_name {recipe_type}"}
+    elif not node.recipe:
+        error = {"Error": f"Part ID {part_id} with recipe type {recipe_type} not found."}
+    return graph, part_id, recipe_type, node, error
+
+def build_tree(part_id, recipe_name="_Standard", target_quantity=1, target_parts_pm=None, target_timeframe=None, visited=None, in_recursion=False, graph=None, selected_recipes=None, depth=None):
+    graph, part_id, recipe_type, node, error = _resolve_root(part_id, recipe_name, graph, selected_recipes, visited)
+    if error:
+        return error
+    root_data = node.recipe
+
+    parent_required_rate = calculate_target_rate(target_quantity, target_parts_pm, target_timeframe)
+    parent_total_quantity = target_quantity
+
     # Create the root or current node
     root_info = {
         "Recipe": recipe_name,
@@ -65,124 +218,210 @@ def build_tree(part_id, recipe_name="_Standard", target_quantity=1, target_parts
         "Required Parts PM": parent_required_rate,
         "Timeframe": (target_timeframe if target_timeframe is not None
                     else (target_quantity / parent_required_rate if parent_required_rate else 0)),
-        "Produced In": root_data.produced_in_automated,
-        #"No. of Machines": target_parts_pm / (root_data.part_supply_pm or 1),
+        "Produced In": root_data.produced_in,
         "Part Supply PM": root_data.part_supply_pm,
         "Part Supply Quantity": root_data.part_supply_quantity,
-        "Part Cycle Time": root_data.part_cycle_time_sec,        
-        "Subtree": {},  # Initialize empty Subtree
+        "Part Cycle Time": root_data.part_cycle_time_sec,
+        "Subtree": materialize_subtree(node, parent_total_quantity, parent_required_rate, depth),
     }
     if root_data.part_supply_pm and root_data.part_supply_pm > 0:
         root_info["No. of Machines"] = parent_required_rate / root_data.part_supply_pm
     else:
         root_info["No. of Machines"] = 0
-    
-    # Fetch all ingredients for the current recipe
-    ingredients = db.session.execute(
-        text("""
-        SELECT r.recipe_name, r.ingredient, r.source_level, r.ingredient_demand_pm, r.part_supply_pm, 
-             r.ingredient_demand_quantity, r.part_supply_quantity, r.part_cycle_time_sec, 
-             r.byproduct, r.byproduct_supply_pm, r.byproduct_supply_quantity
-        FROM recipe r
-        WHERE r.part_id = :part_id AND r.recipe_name = :recipe_name
-        """),
-        {"part_id": part_id, "recipe_name": recipe_type}
-    ).fetchall()
-
-    # Iterate over ingredient inputs for the given part
-    for row in ingredients:
-        ingredient_recipe = row.recipe_name
-        ingredient_input = row.ingredient
-        source_level = row.source_level
-        ingredient_demand_pm = row.ingredient_demand_pm
-        part_supply_pm = row.part_supply_pm
-        ingredient_demand_quantity = row.ingredient_demand_quantity or 0
-        part_supply_quantity = row.part_supply_quantity
-        child_required_quantity = parent_total_quantity * ingredient_demand_quantity
-        child_required_rate = parent_required_rate * ingredient_demand_quantity
-        byproduct = row.byproduct
-        byproduct_supply_pm = row.byproduct_supply_pm
-        byproduct_supply_quantity = row.byproduct_supply_quantity
-        child_timeframe = (child_required_quantity / child_required_rate
-                        if child_required_rate else 0)
-
-        # Skip parts with source_level == -2 or 11
-        if source_level == -2 or source_level == 11:
-            continue
-        
-        
-        # Look up the part_id for the ingredient_input and the machine it is produced in
-        ingredient_input_id = db.session.execute(
-            text("SELECT id FROM part WHERE part_name = :ingredient_input"),
-            {"ingredient_input": ingredient_input}
-        ).scalar()
-
-        if not ingredient_input_id:
-            #logging.error("Part ID not found for ingredient input ", ingredient_input)
-            continue
 
-        # Lookup the selected recipe for this ingredient from user_selected_recipe
-        selected_recipe_query = """
-            SELECT r.recipe_name
-            FROM user_selected_recipe usr
-            JOIN recipe r ON usr.recipe_id = r.id
-            WHERE usr.user_id = :user_id AND usr.part_id = :part_id
-        """
-        selected_recipe = db.session.execute(
-            text(selected_recipe_query),
-            {"user_id": current_user.id, "part_id": ingredient_input_id}
-        ).scalar()
-
-        # Use the selected recipe or default to the ingredient_recipe (from part_data)
-        final_recipe = selected_recipe if selected_recipe else ingredient_recipe
-
-        # Query the part_supply_pm for the ingredient_input_id and final_recipe
-        child_supply_pm = db.session.execute(
-            text("SELECT part_supply_pm FROM recipe WHERE part_id = :part_id AND recipe_name = :recipe_name"),
-            {"part_id": ingredient_input_id, "recipe_name": final_recipe}
-        ).scalar()
-
-        # Query the part_supply_pm for the ingredient_input_id and final_recipe
-        child_supply_quantity = db.session.execute(
-            text("SELECT part_supply_pm, part_supply_quantity FROM recipe WHERE part_id = :part_id AND recipe_name = :recipe_name"),
-            {"part_id": ingredient_input_id, "recipe_name": final_recipe}
-        ).scalar()
-        
-        child_machines = (child_required_rate / child_supply_pm
-                        if child_supply_pm else 0)
-        
-        # Query the machine that produces the ingredient_input_id and final_recipe
-        ingredient_production_machine = db.session.execute(
-            text("SELECT produced_in_automated FROM recipe WHERE part_id = :ingredient_part_id AND recipe_name = :recipe_name"),
-            {"ingredient_part_id": ingredient_input_id, "recipe_name": final_recipe}
-        ).scalar()
-
-        # Recursively call build_tree for each ingredient_input
-        subtree = build_tree(
-            part_id=ingredient_input_id,
-            recipe_name=final_recipe,
-            target_quantity=child_required_quantity,
-            target_parts_pm=child_required_rate,
-            target_timeframe=child_timeframe,
-            visited=visited,
-            in_recursion=True
+    return {graph.get_part_name(part_id): root_info} if not in_recursion else root_info
+
+def expand_tree_node(part_id, recipe_name, path, required_quantity, required_parts_pm, depth=None, graph=None, selected_recipes=None):
+    """
+    Return the Subtree of one entry of the tree for part_id, so a tree built with depth can be expanded lazily.
+    path is the list of ingredient names from the root to the entry and required_quantity / required_parts_pm are the
+    entry's own values (its scale). Returns {"Error": ...} if the path does not exist.
+    """
+    graph, part_id, recipe_type, node, error = _resolve_root(part_id, recipe_name, graph, selected_recipes)
+    if error:
+        return error
+
+    for part_name in path:
+        # Later ingredients with the same name replace earlier ones in the nested tree, so the last match is the one shown
+        matches = [child for child in node.children if child.ingredient.part_name == part_name]
+        if not matches:
+            return {"Error": f"Ingredient {part_name} not found in the tree for part_id {part_id}"}
+        node = matches[-1].node
+
+    return {
+        "Path": list(path),
+        "Subtree": materialize_subtree(node, _to_float(required_quantity), _to_float(required_parts_pm), depth),
+    }
+
+def get_tree_part_ids(part_id, recipe_name="_Standard", graph=None, selected_recipes=None):
+    """Return the set of part ids that appear anywhere in the tree for part_id, including the root."""
+    graph, part_id, recipe_type, node, error = _resolve_root(part_id, recipe_name, graph, selected_recipes)
+    part_ids = {part_id}
+    seen = {id(node)}
+    stack = [node]
+    while stack:
+        unit = stack.pop()
+        for child in unit.children:
+            part_ids.add(child.ingredient.part_id)
+            if id(child.node) not in seen:
+                seen.add(id(child.node))
+                stack.append(child.node)
+    return part_ids
+
+def _topological_order(root):
+    """Return the distinct unit nodes under root (that have children), each one after every node that uses it."""
+    order = []
+    seen = {id(root)}
+    stack = [(root, iter(root.children))]
+    while stack:
+        node, children = stack[-1]
+        for child in children:
+            if child.node.children and id(child.node) not in seen:
+                seen.add(id(child.node))
+                stack.append((child.node, iter(child.node.children)))
+                break
+        else:
+            stack.pop()
+            order.append(node)
+    order.reverse()
+    return order
+
+def build_flat_bom(part_id, recipe_name="_Standard", target_quantity=1, target_parts_pm=None, target_timeframe=None, graph=None, selected_recipes=None):
+    """
+    Return the bill of materials for the target as a list of rows aggregated per part, recipe and machine.
+    The totals equal summing every entry of the nested tree, but each distinct unit subtree is visited once,
+    so the work is proportional to the number of distinct parts rather than the size of the tree.
+    """
+    graph, part_id, recipe_type, node, error = _resolve_root(part_id, recipe_name, graph, selected_recipes)
+    if error:
+        return error
+
+    bom = {}  # (part_id, recipe_name, produced_in) -> row
+
+    def add_row(row_part_id, part_name, row_recipe, produced_in, quantity, rate, machines):
+        row = bom.get((row_part_id, row_recipe, produced_in))
+        if row is None:
+            row = {
+                "Part ID": row_part_id,
+                "Part Name": part_name,
+                "Recipe": row_recipe,
+                "Produced In": produced_in,
+                "Required Quantity": 0,
+                "Required Parts PM": 0,
+                "No. of Machines": 0,
+            }
+            bom[(row_part_id, row_recipe, produced_in)] = row
+        row["Required Quantity"] += quantity
+        row["Required Parts PM"] += rate
+        row["No. of Machines"] += machines
+
+    root_rate = calculate_target_rate(target_quantity, target_parts_pm, target_timeframe)
+    root_supply_pm = node.recipe.part_supply_pm
+    add_row(part_id, graph.get_part_name(part_id), recipe_type, node.recipe.produced_in, target_quantity, root_rate,
+            root_rate / root_supply_pm if root_supply_pm and root_supply_pm > 0 else 0)
+
+    # Push each node's total quantity and rate down to its ingredients, parents before children
+    totals = {id(node): [target_quantity, root_rate]}
+    for unit in _topological_order(node):
+        quantity, rate = totals.pop(id(unit))
+        for child in unit.children:
+            ingredient = child.ingredient
+            child_quantity = quantity * ingredient.ingredient_demand_quantity
+            child_rate = rate * ingredient.ingredient_demand_quantity
+            child_supply_pm = child.child_recipe.part_supply_pm if child.child_recipe else None
+            add_row(ingredient.part_id, ingredient.part_name, child.final_recipe,
+                    child.child_recipe.produced_in if child.child_recipe else None,
+                    child_quantity, child_rate, child_rate / child_supply_pm if child_supply_pm else 0)
+            if child.node.children:
+                child_totals = totals.setdefault(id(child.node), [0, 0])
+                child_totals[0] += child_quantity
+                child_totals[1] += child_rate
+    return list(bom.values())
+
+def build_tree_dag(part_id, recipe_name="_Standard", target_quantity=1, target_parts_pm=None, target_timeframe=None, graph=None, selected_recipes=None):
+    """
+    Return the tree as a DAG instead of nested dicts: a node table with one entry per distinct unit subtree and
+    edges carrying the ingredient multipliers. Nodes are at unit scale; the amount at any position of the nested
+    tree is the root's target times the product of the edge multipliers along the path.
+    """
+    graph, part_id, recipe_type, node, error = _resolve_root(part_id, recipe_name, graph, selected_recipes)
+    if error:
+        return error
+
+    nodes = []
+    edges = []
+    node_ids = {}
+
+    def add_node(unit, node_part_id, node_recipe_name, recipe):
+        # Missing and circular leaves share UnitNode objects, so they are told apart by part and recipe
+        key = id(unit) if unit.recipe else (node_part_id, node_recipe_name, unit is CIRCULAR_NODE)
+        if key in node_ids:
+            return node_ids[key], False
+        node_ids[key] = len(nodes)
+        nodes.append({
+            "Part ID": node_part_id,
+            "Part Name": graph.get_part_name(node_part_id),
+            "Recipe": node_recipe_name,
+            "Produced In": recipe.produced_in if recipe else None,
+            "Part Supply PM": recipe.part_supply_pm if recipe else None,
+            "Part Supply Quantity": recipe.part_supply_quantity if recipe else None,
+            "Part Cycle Time": recipe.part_cycle_time_sec if recipe else None,
+            "Circular": unit is CIRCULAR_NODE,
+        })
+        return node_ids[key], True
+
+    add_node(node, part_id, recipe_type, node.recipe)
+    stack = [node]
+    while stack:
+        unit = stack.pop()
+        from_id = node_ids[id(unit)]
+        for child in unit.children:
+            ingredient = child.ingredient
+            to_id, added = add_node(child.node, ingredient.part_id, child.final_recipe, child.child_recipe)
+            edges.append({
+                "From": from_id,
+                "To": to_id,
+                "Ingredient": ingredient.part_name,
+                "Multiplier": ingredient.ingredient_demand_quantity,
+                "Ingredient Demand PM": ingredient.ingredient_demand_pm,
+            })
+            if added and child.node.children:
+                stack.append(child.node)
+
+    required_rate = calculate_target_rate(target_quantity, target_parts_pm, target_timeframe)
+    root_supply_pm = node.recipe.part_supply_pm
+    return {
+        "Root": 0,
+        "Recipe": recipe_name,
+        "Required Quantity": target_quantity,
+        "Required Parts PM": required_rate,
+        "Timeframe": (target_timeframe if target_timeframe is not None
+                    else (target_quantity / required_rate if required_rate else 0)),
+        "No. of Machines": required_rate / root_supply_pm if root_supply_pm and root_supply_pm > 0 else 0,
+        "Nodes": nodes,
+        "Edges": edges,
+    }
+
+def build_trees(targets, builder=build_tree, graph=None, selected_recipes=None):
+    """
+    Build the trees for a list of targets ({part_id, recipe_name, target_quantity, target_parts_pm, target_timeframe})
+    in one pass. The graph and selection map are looked up once, so every target shares the same unit subtree memo.
+    builder can be build_flat_bom or build_tree_dag to change the shape of each result.
+    """
+    if graph is None:
+        graph = get_recipe_graph()
+    if selected_recipes is None:
+        selected_recipes = get_current_user_recipe_map()
+
+    return [
+        builder(
+            target["part_id"],
+            target.get("recipe_name") or "_Standard",
+            target.get("target_quantity", 1),
+            target.get("target_parts_pm"),
+            target.get("target_timeframe"),
+            graph=graph,
+            selected_recipes=selected_recipes,
         )
-        # Attach the ingredient's subtree to the current node
-        root_info["Subtree"][ingredient_input] = {
-            "Required Quantity": child_required_quantity,
-            "Required Parts PM": child_required_rate,
-            "Timeframe": child_timeframe,
-            "Produced In": ingredient_production_machine,
-            "No. of Machines": child_machines,
-            "Recipe": final_recipe,
-            "Part Supply PM": part_supply_pm,
-            "Part Supply Quantity": part_supply_quantity,
-            "Ingredient Demand PM": ingredient_demand_pm,
-            "Ingredient Demand Quantity": ingredient_demand_quantity,
-            "Ingredient Supply PM": child_supply_pm,
-            "Ingredient Supply Quantity": child_supply_quantity,            
-            "Subtree": subtree.get("Subtree", {}) if isinstance(subtree, dict) else {},
-        }
-    visited.remove((part_id, recipe_type))
-    
-    return {root_data.part_name: root_info} if not in_recursion else root_info
+        for target in targets
+    ]
@@ -0,0 +1,46 @@
+# Description: This module writes many rows to a table with chunked Core inserts.
+# Save ingestion produces tens of thousands of rows for a large factory. Building an ORM object per row and adding it
+# to the session costs far more than the insert itself, so ingestion collects plain tuples instead and writes them here
+# with one executemany per batch of INGEST_BATCH_SIZE rows. Column defaults (such as the created_at and updated_at
+# timestamps) are still applied by SQLAlchemy. Incremental re-ingest updates and deletes rows by id the same way.
+
+from itertools import islice
+from flask import current_app
+from sqlalchemy import bindparam
+from . import db
+
+
+def insert_rows(model, columns, rows, batch_size=None, values=None):
+    """
+    Insert rows (tuples of values in the order of columns) into the model's table and return the number inserted.
+    values holds columns that are the same for every row (such as the ingest generation).
+    Runs in the session's transaction; the caller commits.
+    """
+    params = (dict(zip(columns, row), **(values or {})) for row in rows)
+    return _execute_batches(model.__table__.insert(), params, batch_size)
+
+def update_rows(model, columns, rows, batch_size=None):
+    """Set columns from (id, values tuple) pairs on the model's table and return the number of rows updated. The caller commits."""
+    table = model.__table__
+    # Bind names must differ from the column names the statement sets
+    statement = table.update().where(table.c.id == bindparam("row_id")).values(
+        {column: bindparam(f"new_{column}") for column in columns})
+    params = (dict({f"new_{column}": value for column, value in zip(columns, values)}, row_id=row_id) for row_id, values in rows)
+    return _execute_batches(statement, params, batch_size)
+
+def delete_rows(model, ids, batch_size=None):
+    """Delete rows of the model's table by id and return the number deleted. The caller commits."""
+    table = model.__table__
+    return _execute_batches(table.delete().where(table.c.id == bindparam("row_id")), ({"row_id": row_id} for row_id in ids),
+                            batch_size)
+
+def _execute_batches(statement, params, batch_size):
+    batch_size = batch_size or current_app.config.get("INGEST_BATCH_SIZE", 5000)
+    params = iter(params)
+    executed = 0
+    while True:
+        batch = list(islice(params, batch_size))
+        if not batch:
+            return executed
+        db.session.execute(statement, batch)
+        executed += len(batch)
@@ -103,6 +103,45 @@ SYSTEM_TEST_NEW_USER_EMAIL = os.getenv("SYSTEM_TEST_NEW_USER_EMAIL")
 SYSTEM_TEST_NEW_USER_USERNAME = os.getenv("SYSTEM_TEST_NEW_USER_USERNAME")
 SYSTEM_TEST_NEW_USER_PASSWORD = os.getenv("SYSTEM_TEST_NEW_USER_PASSWORD")
 
+# Reference data tables. Writes to these through the admin table routes bump the reference data version,
+# which invalidates the in-process caches built from them (recipe graph, part names, conveyor speeds, machines).
+REFERENCE_TABLES = {'alternate_recipe', 'conveyor_level', 'conveyor_supply', 'icon', 'machine', 'part', 'pipeline_level',
+                    'pipeline_supply', 'recipe', 'recipe_mapping', 'resource_node'}
+# How often (in seconds) a worker re-reads a data version from the database to pick up changes made by other workers
+DATA_VERSION_POLL_SECONDS = float(os.getenv("DATA_VERSION_POLL_SECONDS", 5))
+# Number of (category, user) data versions a worker keeps in memory; the least recently read are dropped first
+DATA_VERSION_CACHE_SIZE = int(os.getenv("DATA_VERSION_CACHE_SIZE", 1024))
+# Number of users whose effective recipe map (part -> selected recipe) is kept in memory
+EFFECTIVE_RECIPE_CACHE_SIZE = int(os.getenv("EFFECTIVE_RECIPE_CACHE_SIZE", 256))
+# Number of distinct recipe selection sets whose memoized unit subtrees are kept per recipe graph (see build_tree.py)
+SUBTREE_MEMO_SELECTION_SETS = int(os.getenv("SUBTREE_MEMO_SELECTION_SETS", 64))
+# Number of users whose last tracker reports are kept for incremental updates (see tracker_reports.py)
+TRACKER_REPORT_CACHE_SIZE = int(os.getenv("TRACKER_REPORT_CACHE_SIZE", 64))
+# Worker processes that build tracker trees in parallel (see tree_workers.py). Below 2 the trees are built in the request thread
+TREE_WORKER_PROCESSES = int(os.getenv("TREE_WORKER_PROCESSES", 0))
+# Fewest tracked parts worth sending to the worker processes; smaller trackers are built in the request thread
+TREE_WORKER_MIN_TARGETS = int(os.getenv("TREE_WORKER_MIN_TARGETS", 16))
+# Worker threads used to read users' tracker targets and recipe selections
+TREE_WORKER_THREADS = int(os.getenv("TREE_WORKER_THREADS", 4))
+# Number of evaluated scenario results kept in memory (see scenarios.py)
+SCENARIO_CACHE_SIZE = int(os.getenv("SCENARIO_CACHE_SIZE", 128))
+# Worker threads per server process that ingest uploaded saves from the save_ingest_job table (see ingest_jobs.py)
+INGEST_WORKERS = int(os.getenv("INGEST_WORKERS", 1))
+# Start the ingest workers when the app is created. Set it in the environment of a WSGI server that imports the app
+# (e.g. the gunicorn service); run.py starts them itself. Off, a process only starts them once a save is uploaded to it
+INGEST_START_WORKERS = os.getenv("INGEST_START_WORKERS", "false").lower() == "true"
+# How often (in seconds) an idle ingest worker checks the job table for saves uploaded to other server processes
+INGEST_POLL_SECONDS = float(os.getenv("INGEST_POLL_SECONDS", 5))
+# Seconds after which a job still marked as processing is assumed lost (server restarted mid-ingest) and queued again
+INGEST_STALE_SECONDS = int(os.getenv("INGEST_STALE_SECONDS", 1800))
+# How often (in seconds) a worker marks its running job as alive; must be well below INGEST_STALE_SECONDS
+INGEST_HEARTBEAT_SECONDS = float(os.getenv("INGEST_HEARTBEAT_SECONDS", 60))
+# Rows written per executemany when ingestion inserts save data (see bulk_insert.py)
+INGEST_BATCH_SIZE = int(os.getenv("INGEST_BATCH_SIZE", 5000))
+# Re-uploads of a save the user already has are diffed against the stored rows and only the changes are written
+# (see incremental_ingest.py). When off, every upload is written in full under a new ingest generation
+INGEST_INCREMENTAL = os.getenv("INGEST_INCREMENTAL", "true").lower() == "true"
+
 # Table and column whitelist
 VALID_TABLES = {'admin_settings', 'alternate_recipe', 'conveyor_level', 'conveyor_supply', 'data_validation', 'icon', 'machine', 
                 'machine_level', 'miner_supply', 'node_purity', 'part', 'pipeline_level', 'pipeline_supply', 'power_shards', 
@@ -122,5 +161,5 @@ VALID_COLUMNS = {'id', 'setting_category', 'setting_key', 'setting_value', 'reci
                  'input_inventory', 'is_producing', 'machine_id', 'machine_power_modifier', 'output_inventory', 'production_duration', 'productivity_measurement_duration', 
                  'productivity_monitor_enabled', 'resource_node_id', 'sav_file_name', 'time_since_last_change', 'connected_component', 'connection_inventory', 'outer_path_name', 
                  'conveyor_first_belt', 'conveyor_last_belt', 'connection_points', 'fluid_type', 'instance_name', 'key', 'user_id', 'email_address', 'fav_satisfactory_thing', 
-                 'is_approved', 'reason', 'reviewed_at'
+                 'is_approved', 'reason', 'reviewed_at', 'ingest_generation', 'save_path_name'
                 }
\ No newline at end of file
@@ -0,0 +1,76 @@
+# Description: This module manages the version counters stored in the data_version table.
+# In-process caches record the version they were built from and reload only when the counter moves.
+# Bumps made by this worker are visible immediately; bumps made by other workers are picked up
+# the next time the counter is re-read (at most every DATA_VERSION_POLL_SECONDS).
+
+from collections import OrderedDict
+import threading
+import time
+from flask import current_app
+from sqlalchemy import text
+from sqlalchemy.exc import IntegrityError
+from . import db
+from .logging_util import setup_logger
+
+logger = setup_logger("data_version")
+
+REFERENCE_DATA = "reference_data"  # part, recipe, machine, conveyor tables etc. (see config.REFERENCE_TABLES)
+USER_SAVE = "user_save"  # per user: the save tables written by an upload (user_save, connections, conveyors, pipes...)
+USER_TRACKER = "user_tracker"  # per user: the tracker table
+
+_versions = OrderedDict()  # (category, user_id) -> (version, monotonic time it was read), least recently read first
+_versions_lock = threading.Lock()
+
+def _poll_seconds():
+    return current_app.config.get("DATA_VERSION_POLL_SECONDS", 5)
+
+def _remember_version(key, version, read_at):
+    max_keys = current_app.config.get("DATA_VERSION_CACHE_SIZE", 1024)
+    with _versions_lock:
+        _versions[key] = (version, read_at)
+        _versions.move_to_end(key)
+        while len(_versions) > max_keys:
+            _versions.popitem(last=False)
+
+def _read_version(category, user_id):
+    return db.session.execute(
+        text("SELECT version FROM data_version WHERE category = :category AND user_id = :user_id"),
+        {"category": category, "user_id": user_id}
+    ).scalar() or 0
+
+def get_data_version(category=REFERENCE_DATA, user_id=0):
+    """Return the current version for a category (and optionally a user)."""
+    key = (category, user_id)
+    cached = _versions.get(key)
+    now = time.monotonic()
+    if cached and now - cached[1] < _poll_seconds():
+        return cached[0]
+
+    version = _read_version(category, user_id)
+    _remember_version(key, version, now)
+    return version
+
+def bump_data_version(category=REFERENCE_DATA, user_id=0):
+    """Increment the version for a category (and optionally a user) and return the new value."""
+    params = {"category": category, "user_id": user_id}
+    update_query = text("""
+        UPDATE data_version SET version = version + 1, updated_at = CURRENT_TIMESTAMP
+        WHERE category = :category AND user_id = :user_id
+    """)
+    result = db.session.execute(update_query, params)
+    if result.rowcount == 0:
+        try:
+            db.session.execute(text("""
+                INSERT INTO data_version (category, user_id, version, created_at, updated_at)
+                VALUES (:category, :user_id, 1, CURRENT_TIMESTAMP, CURRENT_TIMESTAMP)
+            """), params)
+        except IntegrityError:
+            # Another worker created the row first
+            db.session.rollback()
+            db.session.execute(update_query, params)
+    db.session.commit()
+
+    version = _read_version(category, user_id)
+    _remember_version((category, user_id), version, time.monotonic())
+    logger.info(f"🔄 Data version {category} (user {user_id}) bumped to {version}")
+    return version
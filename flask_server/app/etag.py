@@ -0,0 +1,37 @@
+# Description: This module adds strong ETags and 304 Not Modified handling to computed GET endpoints.
+# The ETag is a hash of the data versions the response was built from plus the request parameters, so a repeat
+# request costs one version check instead of rebuilding and re-encoding the response.
+
+import hashlib
+import json
+from flask import request, make_response
+from .data_version import get_data_version, REFERENCE_DATA
+
+
+def compute_etag(*parts):
+    """Return a strong ETag value for the given version numbers and parameters."""
+    encoded = json.dumps(parts, sort_keys=True, default=str)
+    return hashlib.sha256(encoded.encode("utf-8")).hexdigest()
+
+def get_user_versions(user_id, *categories):
+    """Return the current versions of the reference data and the given per-user categories, in order."""
+    return [get_data_version(REFERENCE_DATA)] + [get_data_version(category, user_id) if user_id else 0 for category in categories]
+
+def conditional_response(etag, build_response):
+    """
+    Return 304 Not Modified if the client already has etag, otherwise call build_response() and tag its result.
+    build_response returns anything a view can return (e.g. jsonify(...) or (jsonify(...), 200)). Only complete 200
+    responses are tagged, so errors are never served from the browser cache. Streamed responses are left untagged:
+    their status is sent before the body is built, so they may still end in an error.
+    """
+    if request.if_none_match.contains(etag):
+        response = make_response("", 304)
+        response.set_etag(etag)
+        response.headers["Cache-Control"] = "private, no-cache"
+        return response
+
+    response = make_response(build_response())
+    if response.status_code == 200 and not response.is_streamed:
+        response.set_etag(etag)
+        response.headers["Cache-Control"] = "private, no-cache"
+    return response
@@ -0,0 +1,141 @@
+# Description: This module applies a re-uploaded save as a diff against the rows the user already has.
+# Most re-uploads are the same world a little later, so instead of writing every machine, connection, conveyor and pipe
+# again, the new rows are matched to the stored ones by stable keys (the machine and connection component path names
+# in the save) and only the inserts, updates and deletes are written. The derived connection graph is recomputed from
+# the updated rows and diffed the same way, but only when the machines, connections or pipes it is built from changed.
+# All changes go into the user's active generation in one transaction, so readers see either the old save or the new
+# one, never a mix.
+
+from collections import defaultdict, namedtuple
+from datetime import datetime, timezone
+from sqlalchemy import text
+from . import db
+from .bulk_insert import insert_rows, update_rows, delete_rows
+from .build_connection_graph import (collect_factory_graph, connection_data_rows, pipe_data_rows, CONNECTION_DATA_COLUMNS,
+                                     PIPE_DATA_COLUMNS)
+from .models import User_Connection_Data, User_Pipe_Data
+from .logging_util import setup_logger
+
+logger = setup_logger("incremental_ingest")
+
+# A save table as ingestion writes it: the row tuples hold columns in order, and rows are matched on key_columns.
+# ignored_columns are left out of the comparison, so a row that only differs in them is not rewritten.
+SaveTable = namedtuple("SaveTable", ["model", "columns", "key_columns", "ignored_columns"], defaults=((),))
+TableChanges = namedtuple("TableChanges", ["inserted", "updated", "deleted", "unchanged"])
+
+# Derived rows have no identity of their own, so they are matched on all of their values
+CONNECTION_DATA_TABLE = SaveTable(User_Connection_Data, CONNECTION_DATA_COLUMNS, CONNECTION_DATA_COLUMNS)
+PIPE_DATA_TABLE = SaveTable(User_Pipe_Data, PIPE_DATA_COLUMNS, PIPE_DATA_COLUMNS)
+
+
+def _normalize(values):
+    # MySQL FLOAT columns keep single precision, so floats read back are compared to 6 significant digits
+    return tuple(float(f"{value:.6g}") if isinstance(value, float) else int(value) if isinstance(value, bool) else value
+                 for value in values)
+
+def has_save_rows(user_id, generation):
+    """Return True if the user has machines stored in the given generation."""
+    return db.session.execute(text("SELECT 1 FROM user_save WHERE user_id = :user_id AND ingest_generation = :generation LIMIT 1"),
+                              {"user_id": user_id, "generation": generation}).first() is not None
+
+def _compared_columns(table):
+    return [column for column in table.columns if column not in table.ignored_columns]
+
+def load_current_rows(table, user_id, generation):
+    """Return the user's stored rows of the table as {key: [(id, normalized compared values)]}."""
+    compared_columns = _compared_columns(table)
+    key_indexes = [compared_columns.index(column) for column in table.key_columns]
+    rows = db.session.execute(text(f"""
+        SELECT id, {", ".join(compared_columns)} FROM {table.model.__tablename__}
+        WHERE user_id = :user_id AND ingest_generation = :generation
+    """), {"user_id": user_id, "generation": generation})
+    current = defaultdict(list)
+    for row in rows:
+        values = _normalize(row[1:])
+        current[tuple(values[index] for index in key_indexes)].append((row.id, values))
+    return current
+
+def diff_rows(table, current, new_rows):
+    """
+    Match new row tuples to the stored rows (from load_current_rows) with the same key.
+    Returns (inserts [values], updates [(id, values)], deletes [id], unchanged count). Rows whose compared values are
+    unchanged are paired first, so rows sharing a key (or without one) are only rewritten when they actually differ.
+    """
+    compared_indexes = [table.columns.index(column) for column in _compared_columns(table)]
+    key_indexes = [table.columns.index(column) for column in table.key_columns]
+    new_by_key = defaultdict(list)
+    for values in new_rows:
+        new_by_key[tuple(_normalize(values[index] for index in key_indexes))].append(values)
+
+    inserts, updates, deletes, unchanged = [], [], [], 0
+    for key in current.keys() | new_by_key.keys():
+        stored = defaultdict(list)
+        for row_id, values in current.get(key, ()):
+            stored[values].append(row_id)
+        changed = []
+        for values in new_by_key.get(key, ()):
+            row_ids = stored.get(_normalize(values[index] for index in compared_indexes))
+            if row_ids:
+                row_ids.pop()
+                unchanged += 1
+            else:
+                changed.append(values)
+        leftover_ids = [row_id for row_ids in stored.values() for row_id in row_ids]
+        updates.extend(zip(leftover_ids, changed))
+        inserts.extend(changed[len(leftover_ids):])
+        deletes.extend(leftover_ids[len(changed):])
+    return inserts, updates, deletes, unchanged
+
+def apply_table_changes(table, user_id, generation, new_rows):
+    """Make the user's rows of the table in generation equal to new_rows, writing only the differences. The caller commits."""
+    inserts, updates, deletes, unchanged = diff_rows(table, load_current_rows(table, user_id, generation), new_rows)
+    delete_rows(table.model, deletes)
+    update_rows(table.model, table.columns, updates)
+    insert_rows(table.model, table.columns, inserts, values={"ingest_generation": generation})
+    changes = TableChanges(len(inserts), len(updates), len(deletes), unchanged)
+    logger.info(f"🔄 {table.model.__tablename__} for user {user_id}: {changes.inserted} inserted, {changes.updated} updated, "
+                f"{changes.deleted} deleted, {changes.unchanged} unchanged")
+    return changes
+
+def sync_save_tables(user_id, generation, tables_rows):
+    """Apply [(SaveTable, new row tuples)] to the user's generation. Returns {table name: TableChanges}. The caller commits."""
+    return {table.model.__tablename__: apply_table_changes(table, user_id, generation, rows) for table, rows in tables_rows}
+
+def update_save_summary(user_id, generation, sav_file_name, save_changes):
+    """
+    Bring the save summary kept on every machine row up to date without rewriting the rows one by one: the file name,
+    and created_at (shown as when the save was processed) if the upload changed anything. save_changes is the result
+    of sync_save_tables. Returns True if the summary changed. The caller commits.
+    """
+    params = {"user_id": user_id, "generation": generation, "sav_file_name": sav_file_name}
+    renamed = db.session.execute(text("""
+        UPDATE user_save SET sav_file_name = :sav_file_name
+        WHERE user_id = :user_id AND ingest_generation = :generation AND sav_file_name <> :sav_file_name
+    """), params).rowcount
+    if not renamed and not _changed(save_changes, *save_changes):
+        return False
+    db.session.execute(text("""
+        UPDATE user_save SET created_at = :processed_at WHERE user_id = :user_id AND ingest_generation = :generation
+    """), dict(params, processed_at=datetime.now(timezone.utc)))
+    return True
+
+def _changed(changes, *table_names):
+    return any(changes[name].inserted or changes[name].updated or changes[name].deleted
+               for name in table_names if name in changes)
+
+def sync_factory_graph(user_id, generation, save_changes=None):
+    """
+    Recompute the connection graph from the user's (already updated) save rows and apply only the changed
+    user_connection_data and user_pipe_data rows. With save_changes (the result of sync_save_tables), a part whose
+    source rows did not change is skipped: the graph is built from machines and connections, the pipe data from pipes.
+    The graph is still traversed in full when it is rebuilt. Returns {table name: TableChanges}. The caller commits.
+    """
+    tables_rows = []
+    if save_changes is None or _changed(save_changes, "user_save", "user_save_connections"):
+        graph, metadata_map = collect_factory_graph(user_id, generation)
+        tables_rows.append((CONNECTION_DATA_TABLE, connection_data_rows(graph, metadata_map, user_id)))
+    if save_changes is None or _changed(save_changes, "user_save_pipes"):
+        tables_rows.append((PIPE_DATA_TABLE, pipe_data_rows(user_id, generation)))
+    if not tables_rows:
+        logger.info(f"✅ Factory graph for user {user_id} is unchanged")
+    return sync_save_tables(user_id, generation, tables_rows)
@@ -0,0 +1,90 @@
+# Description: This module measures how fast save ingestion writes connection rows to the database.
+# It builds a synthetic save's worth of factory connection components and inserts them into user_save_connections
+# twice: once the way ingestion used to (one ORM object added to the session per row, then a flush) and once with the
+# chunked Core inserts ingestion uses now (see bulk_insert.py). Both runs are rolled back, so nothing is stored.
+#   python -m app.ingest_benchmark --user-id 1 --connections 50000 --batch-size 5000
+
+import argparse
+import time
+from . import db
+from .bulk_insert import insert_rows
+from .models import User_Save_Connections
+from .read_save_file import connection_rows, CONNECTION_COLUMNS
+from .reference_data import get_conveyor_speeds
+
+
+def synthetic_connections(count):
+    """Return count connection components shaped like extract_connection_info output, mostly attached to belts."""
+    connections = []
+    for index in range(count):
+        machine = f"Persistent_Level:PersistentLevel.Build_ConstructorMk1_C_{index // 2}"
+        if index % 10 == 9:
+            connected = f"Persistent_Level:PersistentLevel.Build_ConveyorLiftMk{index % 6 + 1}_C_{index}"
+        else:
+            connected = f"Persistent_Level:PersistentLevel.Build_ConveyorBeltMk{index % 6 + 1}_C_{index}"
+        direction = "ConveyorAny0" if index % 2 else "ConveyorAny1"
+        connections.append({
+            "PathName": f"{machine}.{direction}",
+            "OuterPathName": machine,
+            "mConnectedComponent": connected,
+            "mConnectionInventory": f"{machine}.InputInventory" if index % 2 else None,
+            "mDirection": direction,
+        })
+    return connections
+
+def _time_orm_adds(rows):
+    start = time.perf_counter()
+    for row in rows:
+        db.session.add(User_Save_Connections(**dict(zip(CONNECTION_COLUMNS, row))))
+    db.session.flush()
+    return time.perf_counter() - start
+
+def _time_bulk_insert(rows, batch_size):
+    start = time.perf_counter()
+    insert_rows(User_Save_Connections, CONNECTION_COLUMNS, rows, batch_size)
+    return time.perf_counter() - start
+
+def run_benchmark(user_id, connections, batch_size, repeat=1):
+    """Return {"rows", "orm_rows_per_second", "bulk_rows_per_second", "speedup"} using the best of repeat runs each."""
+    rows = list(connection_rows(user_id, synthetic_connections(connections), get_conveyor_speeds()))
+    orm_seconds, bulk_seconds = [], []
+    for _ in range(repeat):
+        try:
+            orm_seconds.append(_time_orm_adds(rows))
+        finally:
+            db.session.rollback()
+        try:
+            bulk_seconds.append(_time_bulk_insert(rows, batch_size))
+        finally:
+            db.session.rollback()
+
+    orm_rate, bulk_rate = len(rows) / min(orm_seconds), len(rows) / min(bulk_seconds)
+    return {
+        "rows": len(rows),
+        "orm_rows_per_second": orm_rate,
+        "bulk_rows_per_second": bulk_rate,
+        "speedup": bulk_rate / orm_rate,
+    }
+
+
+def main(argv=None):
+    parser = argparse.ArgumentParser(description="Compare per-row ORM adds with chunked Core inserts for save ingestion.")
+    parser.add_argument("--user-id", type=int, required=True, help="user the synthetic rows belong to (rolled back)")
+    parser.add_argument("--connections", type=int, default=50000, help="synthetic connection components to insert")
+    parser.add_argument("--batch-size", type=int, help="rows per executemany (default INGEST_BATCH_SIZE)")
+    parser.add_argument("--repeat", type=int, default=3, help="runs of each method; the fastest is reported")
+    args = parser.parse_args(argv)
+
+    from . import create_app
+    app = create_app()
+    with app.app_context():
+        batch_size = args.batch_size or app.config.get("INGEST_BATCH_SIZE", 5000)
+        result = run_benchmark(args.user_id, args.connections, batch_size, max(1, args.repeat))
+
+    print(f"{result['rows']} connection rows, batch size {batch_size}")
+    print(f"  ORM adds:     {result['orm_rows_per_second']:>12,.0f} rows/s")
+    print(f"  Core inserts: {result['bulk_rows_per_second']:>12,.0f} rows/s")
+    print(f"  speedup:      {result['speedup']:>12.1f}x")
+
+if __name__ == "__main__":
+    main()
@@ -0,0 +1,164 @@
+# Description: This module runs save file ingestion as background jobs.
+# An upload is recorded as a row in save_ingest_job and the request returns straight away with the job id. Worker
+# threads in each server process claim queued jobs from the table, run process_save_file and write the current stage
+# and progress back to the row, so any server process can report a job's status and jobs survive a restart: a running
+# job's row is touched every INGEST_HEARTBEAT_SECONDS, so a job left in "processing" by a stopped server is queued again
+# once it has not been updated for INGEST_STALE_SECONDS, however long a stage of a live ingest takes.
+
+from datetime import datetime, timedelta, timezone
+import json
+import threading
+from flask import current_app
+from sqlalchemy import text
+from . import db
+from .read_save_file import process_save_file, INGEST_STAGES
+from .tracker_reports import warm_tracker_reports
+from .logging_util import setup_logger
+
+logger = setup_logger("ingest_jobs")
+
+JOB_QUEUED = "queued"
+JOB_PROCESSING = "processing"
+JOB_COMPLETED = "completed"
+JOB_FAILED = "failed"
+
+_workers = []  # worker threads of this process
+_workers_lock = threading.Lock()
+_wake = threading.Event()  # set when a job is submitted to this process
+
+
+def submit_ingest_job(job_id, user_id, file_path, sav_file_name):
+    """Queue an uploaded save for ingestion and wake a worker. Returns the job id."""
+    db.session.execute(text("""
+        INSERT INTO save_ingest_job (id, user_id, sav_file_name, file_path, status, progress, created_at, updated_at)
+        VALUES (:id, :user_id, :sav_file_name, :file_path, :status, 0, :now, :now)
+    """), {"id": job_id, "user_id": user_id, "sav_file_name": sav_file_name, "file_path": file_path,
+           "status": JOB_QUEUED, "now": datetime.now(timezone.utc)})
+    db.session.commit()
+    logger.info(f"📝 Queued ingest job {job_id} for user {user_id}: {sav_file_name}")
+    ensure_ingest_workers(current_app._get_current_object())
+    _wake.set()
+    return job_id
+
+def get_ingest_job(job_id, user_id=None):
+    """Return the job as a JSON-ready dict, or None if it does not exist (or belongs to another user than user_id)."""
+    row = db.session.execute(text("""
+        SELECT id, user_id, sav_file_name, status, stage, progress, error, timings, created_at, started_at, finished_at
+        FROM save_ingest_job WHERE id = :id
+    """), {"id": job_id}).fetchone()
+    if row is None or (user_id is not None and row.user_id != user_id):
+        return None
+    return {
+        "id": row.id,
+        "sav_file_name": row.sav_file_name,
+        "status": row.status,
+        "stage": row.stage,
+        "progress": row.progress or 0,
+        "error": row.error,
+        "timings": json.loads(row.timings) if row.timings else None,
+        "created_at": str(row.created_at) if row.created_at else None,
+        "started_at": str(row.started_at) if row.started_at else None,
+        "finished_at": str(row.finished_at) if row.finished_at else None,
+    }
+
+def _update_job(job_id, **fields):
+    # On its own connection, so progress is visible while the ingest's session still has uncommitted work
+    fields["updated_at"] = datetime.now(timezone.utc)
+    assignments = ", ".join(f"{name} = :{name}" for name in fields)
+    with db.engine.begin() as connection:
+        connection.execute(text(f"UPDATE save_ingest_job SET {assignments} WHERE id = :job_id"), dict(fields, job_id=job_id))
+
+def _requeue_stale_jobs():
+    cutoff = datetime.now(timezone.utc) - timedelta(seconds=current_app.config.get("INGEST_STALE_SECONDS", 1800))
+    result = db.session.execute(text("""
+        UPDATE save_ingest_job SET status = :queued, stage = NULL, progress = 0, updated_at = :now
+        WHERE status = :processing AND updated_at < :cutoff
+    """), {"queued": JOB_QUEUED, "processing": JOB_PROCESSING, "now": datetime.now(timezone.utc), "cutoff": cutoff})
+    db.session.commit()
+    if result.rowcount:
+        logger.info(f"🔄 Queued {result.rowcount} stale ingest job(s) again")
+
+def _claim_next_job():
+    """Mark the oldest queued job as processing and return it, or None if there is nothing to do."""
+    while True:
+        row = db.session.execute(text("""
+            SELECT id, user_id, file_path FROM save_ingest_job WHERE status = :queued ORDER BY created_at LIMIT 1
+        """), {"queued": JOB_QUEUED}).fetchone()
+        if row is None:
+            db.session.commit()
+            return None
+        now = datetime.now(timezone.utc)
+        # Only one worker (of any process) wins the conditional update
+        result = db.session.execute(text("""
+            UPDATE save_ingest_job SET status = :processing, started_at = :now, updated_at = :now
+            WHERE id = :id AND status = :queued
+        """), {"processing": JOB_PROCESSING, "queued": JOB_QUEUED, "now": now, "id": row.id})
+        db.session.commit()
+        if result.rowcount == 1:
+            return row
+
+def _heartbeat(app, job_id, stop):
+    # Keeps a running job's updated_at recent between stage updates, so it is never mistaken for a lost one
+    with app.app_context():
+        interval = app.config.get("INGEST_HEARTBEAT_SECONDS", 60)
+        while not stop.wait(interval):
+            try:
+                with db.engine.begin() as connection:
+                    connection.execute(text("""
+                        UPDATE save_ingest_job SET updated_at = :now WHERE id = :job_id AND status = :processing
+                    """), {"now": datetime.now(timezone.utc), "job_id": job_id, "processing": JOB_PROCESSING})
+            except Exception as e:
+                logger.error(f"❌ Error recording heartbeat of ingest job {job_id}: {e}")
+
+def _report_stage(job_id, stage):
+    _update_job(job_id, stage=stage, progress=INGEST_STAGES.index(stage) / len(INGEST_STAGES) if stage in INGEST_STAGES else 0)
+
+def run_ingest_job(job):
+    """Ingest a claimed job's save and record the outcome on the job row."""
+    logger.info(f"🔄 Running ingest job {job.id} for user {job.user_id}")
+    stop_heartbeat = threading.Event()
+    threading.Thread(target=_heartbeat, args=(current_app._get_current_object(), job.id, stop_heartbeat),
+                     name=f"save-ingest-heartbeat-{job.id}", daemon=True).start()
+    try:
+        timings = process_save_file(job.file_path, job.user_id, on_stage=lambda stage: _report_stage(job.id, stage),
+                                    raise_errors=True)
+    except Exception as e:
+        db.session.rollback()
+        _update_job(job.id, status=JOB_FAILED, error=str(e), finished_at=datetime.now(timezone.utc))
+        logger.error(f"❌ Ingest job {job.id} failed: {e}")
+        return
+    finally:
+        stop_heartbeat.set()
+
+    _update_job(job.id, status=JOB_COMPLETED, stage=None, progress=1, timings=json.dumps(timings),
+                finished_at=datetime.now(timezone.utc))
+    logger.info(f"✅ Ingest job {job.id} completed")
+    warm_tracker_reports(job.user_id)
+
+def _worker_loop(app):
+    with app.app_context():
+        poll_seconds = app.config.get("INGEST_POLL_SECONDS", 5)
+        while True:
+            try:
+                _requeue_stale_jobs()
+                job = _claim_next_job()
+                if job is not None:
+                    run_ingest_job(job)
+                    continue
+            except Exception as e:
+                logger.error(f"❌ Ingest worker error: {e}")
+            finally:
+                db.session.remove()
+            _wake.wait(poll_seconds)
+            _wake.clear()
+
+def ensure_ingest_workers(app):
+    """Start this process's INGEST_WORKERS worker threads, once."""
+    with _workers_lock:
+        if _workers:
+            return
+        for number in range(max(1, app.config.get("INGEST_WORKERS", 1))):
+            worker = threading.Thread(target=_worker_loop, args=(app,), name=f"save-ingest-worker-{number}", daemon=True)
+            worker.start()
+            _workers.append(worker)
+        logger.info(f"✅ Started {len(_workers)} save ingest worker(s)")
@@ -167,6 +167,11 @@ class User_Save(db.Model, TimestampMixin):
     productivity_measurement_duration = db.Column(db.Float, nullable=True)  # Measurement duration
     productivity_monitor_enabled = db.Column(db.Boolean)  # Whether monitoring is enabled
     is_producing = db.Column(db.Boolean)  # Whether the machine is actively producing
+    save_path_name = db.Column(db.String(300), nullable=True)  # Machine's path name in the save, stable across uploads
+    ingest_generation = db.Column(db.Integer, nullable=False, default=0, server_default='0')  # see save_generation.py
+    __table_args__ = (
+        db.Index('ix_user_save_generation', 'user_id', 'ingest_generation'),
+    )
 	
 class Machine(db.Model):
     """Machine model for storing machine information."""
@@ -259,6 +264,11 @@ class User_Save_Connections(db.Model):
     connection_inventory = db.Column(db.String(300), nullable=True)
     direction = db.Column(db.String(300), nullable=True)
     conveyor_speed = db.Column(db.Float, nullable=True)
+    save_path_name = db.Column(db.String(300), nullable=True)  # Connection component's path name in the save, stable across uploads
+    ingest_generation = db.Column(db.Integer, nullable=False, default=0, server_default='0')  # see save_generation.py
+    __table_args__ = (
+        db.Index('ix_user_save_connections_generation', 'user_id', 'ingest_generation'),
+    )
 
 class User_Save_Conveyors(db.Model):
     """User Save Conveyors model for storing user save conveyors."""    
@@ -267,6 +277,10 @@ class User_Save_Conveyors(db.Model):
     user_id = db.Column(db.Integer, db.ForeignKey('user.id'), nullable=False)
     conveyor_first_belt = db.Column(db.String(300), nullable=True)
     conveyor_last_belt = db.Column(db.String(300), nullable=True)
+    ingest_generation = db.Column(db.Integer, nullable=False, default=0, server_default='0')  # see save_generation.py
+    __table_args__ = (
+        db.Index('ix_user_save_conveyors_generation', 'user_id', 'ingest_generation'),
+    )
 
 class Icon(db.Model):
     """Icon model for storing icon information."""
@@ -311,6 +325,10 @@ class User_Save_Pipes(db.Model):
     instance_name = db.Column(db.String(300), nullable=False)  # Unique pipe network identifier
     fluid_type = db.Column(db.String(300), nullable=True)  # Type of fluid
     connection_points = db.Column(db.Text, nullable=True)  # JSON list of connections
+    ingest_generation = db.Column(db.Integer, nullable=False, default=0, server_default='0')  # see save_generation.py
+    __table_args__ = (
+        db.Index('ix_user_save_pipes_generation', 'user_id', 'ingest_generation'),
+    )
 
 class Project_Assembly_Phases(db.Model):
     """Project Assembly Phases model for storing project assembly phases."""
@@ -345,8 +363,10 @@ class User_Connection_Data(db.Model, TimestampMixin):
     produced_item = db.Column(db.String(200), nullable=True)  # Item being transported
     conveyor_speed = db.Column(db.Float, nullable=True)  # Conveyor belt speed if applicable
     direction = db.Column(db.String(50), nullable=True)  # Direction of the connection
+    ingest_generation = db.Column(db.Integer, nullable=False, default=0, server_default='0')  # see save_generation.py
     __table_args__ = (
         db.Index('idx_user_connection', 'user_id', 'source_component', 'target_component'),        
+        db.Index('ix_user_connection_data_generation', 'user_id', 'ingest_generation'),
     )
 
 class User_Pipe_Data(db.Model, TimestampMixin):
@@ -364,8 +384,10 @@ class User_Pipe_Data(db.Model, TimestampMixin):
     connection_type = db.Column(db.String(50), nullable=False)  # "Pipe"
     produced_item = db.Column(db.String(200), nullable=True)  # Item being transported
     pipe_flow_rate = db.Column(db.Float, nullable=True)  # pipe flow rate if applicable
+    ingest_generation = db.Column(db.Integer, nullable=False, default=0, server_default='0')  # see save_generation.py
     __table_args__ = (
         db.Index('idx_user_connection', 'user_id', 'source_component', 'target_component'),        
+        db.Index('ix_user_pipe_data_generation', 'user_id', 'ingest_generation'),
     )
 
 class User_Tester_Registrations(db.Model, TimestampMixin):
@@ -473,6 +495,64 @@ class AppliedSQLScripts(db.Model, TimestampMixin):
     id = db.Column(db.Integer, primary_key=True)
     script_name = db.Column(db.String(200), nullable=False, unique=True)
     app_version = db.Column(db.String(50), nullable=False)
+
+class Data_Version(db.Model, TimestampMixin):
+    """Data Version model for storing version counters used to invalidate in-process caches."""
+    __tablename__ = 'data_version'
+    id = db.Column(db.Integer, primary_key=True)
+    category = db.Column(db.String(100), nullable=False)  # e.g. "reference_data"
+    user_id = db.Column(db.Integer, nullable=False, default=0)  # 0 for global counters
+    version = db.Column(db.Integer, nullable=False, default=0)
+    __table_args__ = (
+        db.UniqueConstraint('category', 'user_id', name='unique_data_version'),
+    )
+
+class User_Scenario(db.Model, TimestampMixin):
+    """User Scenario model for storing named what-if recipe selections."""
+    __tablename__ = 'user_scenario'
+    id = db.Column(db.Integer, primary_key=True)
+    user_id = db.Column(db.Integer, db.ForeignKey('user.id'), nullable=False)
+    scenario_name = db.Column(db.String(100), nullable=False)
+    __table_args__ = (
+        db.UniqueConstraint('user_id', 'scenario_name', name='unique_user_scenario'),
+    )
+
+class User_Scenario_Recipe(db.Model, TimestampMixin):
+    """User Scenario Recipe model for storing the recipe a scenario uses for a part instead of the user's selection."""
+    __tablename__ = 'user_scenario_recipe'
+    id = db.Column(db.Integer, primary_key=True)
+    scenario_id = db.Column(db.Integer, db.ForeignKey('user_scenario.id', ondelete='CASCADE'), nullable=False)
+    part_id = db.Column(db.Integer, db.ForeignKey('part.id'), nullable=False)
+    recipe_id = db.Column(db.Integer, db.ForeignKey('recipe.id'), nullable=False)
+    __table_args__ = (
+        db.UniqueConstraint('scenario_id', 'part_id', name='unique_scenario_part'),
+    )
+
+class User_Save_Generation(db.Model, TimestampMixin):
+    """User Save Generation model for storing which ingest generation of a user's save data is active."""
+    __tablename__ = 'user_save_generation'
+    user_id = db.Column(db.Integer, db.ForeignKey('user.id'), primary_key=True)
+    active_generation = db.Column(db.Integer, nullable=False, default=0)  # generation readers use
+    latest_generation = db.Column(db.Integer, nullable=False, default=0)  # last generation handed to an ingest
+
+class Save_Ingest_Job(db.Model, TimestampMixin):
+    """Save Ingest Job model for storing uploaded saves waiting for, or going through, ingestion."""
+    __tablename__ = 'save_ingest_job'
+    id = db.Column(db.String(36), primary_key=True)  # uuid4, returned to the client as the processing id
+    user_id = db.Column(db.Integer, db.ForeignKey('user.id'), nullable=False)
+    sav_file_name = db.Column(db.String(200), nullable=False)
+    file_path = db.Column(db.String(500), nullable=False)
+    status = db.Column(db.String(20), nullable=False, default='queued')  # queued, processing, completed, failed
+    stage = db.Column(db.String(100), nullable=True)  # current ingestion stage (see read_save_file.INGEST_STAGES)
+    progress = db.Column(db.Float, nullable=False, default=0)  # 0 to 1
+    error = db.Column(db.Text, nullable=True)
+    timings = db.Column(db.Text, nullable=True)  # JSON {stage: seconds}
+    started_at = db.Column(db.DateTime, nullable=True)
+    finished_at = db.Column(db.DateTime, nullable=True)
+    __table_args__ = (
+        db.Index('ix_save_ingest_job_status', 'status', 'created_at'),
+        db.Index('ix_save_ingest_job_user', 'user_id'),
+    )
     
 # TODO: backref vs. back_populates: For simple one-to-many or many-to-one relationships, backref is concise. For more complex scenarios, especially many-to-many or if you want more explicit control, defining db.relationship on both sides of the relationship using the back_populates argument is often preferred. It makes the relationship definition more explicit in both models. This isn't strictly necessary here but something to keep in mind.
 # TODO@ String Lengths: Review if the specified lengths for db.String columns (e.g., 100, 150, 200, 300) are sufficient for the expected data. For fields like User_Save.input_inventory or User_Save_Pipes.connection_points that might store larger or structured data (like JSON), consider using db.Text or SQLAlchemy's JSON type if appropriate for your database dialect.
\ No newline at end of file
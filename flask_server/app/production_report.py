@@ -0,0 +1,131 @@
+# Description: This module builds the target-vs-actual production and machine usage reports from stored data.
+# Targets are the flat bill of materials totals of the user's tracked parts, actuals are aggregated from the user's
+# save data with SQL GROUP BY, so neither the trees nor the save rows have to be sent back by the client.
+
+from sqlalchemy import text
+from . import db
+from .build_tree import build_trees, build_flat_bom
+from .recipe_graph import get_recipe_graph
+from .recipe_selection import get_effective_recipe_map
+from .tracker_reports import load_tracker_targets
+from .save_generation import get_active_generation
+from .models import User_Save, Part, Recipe, Machine, Machine_Level, Node_Purity, Resource_Node
+from .logging_util import setup_logger
+
+logger = setup_logger("production_report")
+
+
+def load_user_save_rows(user_id):
+    """Return the user's save data rows (one per machine) as JSON-ready dicts."""
+    user_saves = (
+        db.session.query(
+            User_Save.id,
+            Part.part_name,
+            Recipe.recipe_name,
+            Recipe.part_supply_pm,
+            User_Save.machine_id,
+            Machine.machine_name,
+            Machine_Level.machine_level,
+            Node_Purity.node_purity,
+            User_Save.machine_power_modifier,
+            User_Save.created_at,
+            User_Save.sav_file_name,
+        )
+        .join(Recipe, User_Save.recipe_id == Recipe.id, isouter=True)
+        .join(Part, Recipe.part_id == Part.id, isouter=True)
+        .join(Machine, User_Save.machine_id == Machine.id, isouter=True)
+        .join(Machine_Level, Machine.machine_level_id == Machine_Level.id, isouter=True)
+        .join(Resource_Node, User_Save.resource_node_id == Resource_Node.id, isouter=True)
+        .join(Node_Purity, Resource_Node.node_purity_id == Node_Purity.id, isouter=True)
+        .filter(User_Save.user_id == user_id)
+        .filter(User_Save.ingest_generation == get_active_generation(user_id))
+        #.filter(User_Save.sav_file_name == sav_file_name)  # ✅ Only return records for the relevant save file
+        .all()
+    )
+
+    #logger.info(f"User Saves: {user_saves}")
+    return [
+        {
+            "id": us.id,
+            "part_name": us.part_name,
+            "recipe_name": us.recipe_name,
+            "machine_id": us.machine_id,
+            "machine_name": us.machine_name,
+            "machine_level": us.machine_level,
+            "node_purity": us.node_purity,
+            "machine_power_modifier": us.machine_power_modifier or 1,
+            "part_supply_pm": us.part_supply_pm or 0,
+            "actual_ppm": (us.part_supply_pm or 0) * (us.machine_power_modifier or 1),
+            "created_at": us.created_at.strftime("%Y-%m-%d %H:%M:%S"),
+            "sav_file_name": us.sav_file_name,
+        } for us in user_saves
+    ]
+
+def load_actual_production(user_id):
+    """Return {part_name: actual parts per minute} from the user's save data (supply rate times power modifier)."""
+    query = """
+        SELECT p.part_name, SUM(COALESCE(r.part_supply_pm, 0) * COALESCE(us.machine_power_modifier, 1)) AS actual_ppm
+        FROM user_save us
+        JOIN recipe r ON us.recipe_id = r.id
+        JOIN part p ON r.part_id = p.id
+        WHERE us.user_id = :user_id AND us.ingest_generation = :generation
+        GROUP BY p.part_name
+    """
+    params = {"user_id": user_id, "generation": get_active_generation(user_id)}
+    return {row.part_name: row.actual_ppm or 0 for row in db.session.execute(text(query), params)}
+
+def load_actual_machine_usage(user_id):
+    """Return {machine_name: machines in use} from the user's save data, each machine weighted by its power modifier."""
+    query = """
+        SELECT m.machine_name, SUM(COALESCE(us.machine_power_modifier, 1)) AS machines
+        FROM user_save us
+        JOIN machine m ON us.machine_id = m.id
+        WHERE us.user_id = :user_id AND us.ingest_generation = :generation
+        GROUP BY m.machine_name
+    """
+    params = {"user_id": user_id, "generation": get_active_generation(user_id)}
+    return {row.machine_name: row.machines or 0 for row in db.session.execute(text(query), params)}
+
+def build_target_boms(user_id, targets=None, graph=None, selected_recipes=None):
+    """Return the flat bill of materials of each tracked part. Targets whose tree cannot be built are left out."""
+    if targets is None:
+        targets = load_tracker_targets(user_id)
+    if graph is None:
+        graph = get_recipe_graph()
+    if selected_recipes is None:
+        selected_recipes = get_effective_recipe_map(user_id)
+    boms = build_trees(targets, builder=build_flat_bom, graph=graph, selected_recipes=selected_recipes)
+    return [bom for bom in boms if isinstance(bom, list)]
+
+def _merge_report(report, key, target=0, actual=0):
+    entry = report.setdefault(key, {"target": 0, "actual": 0})
+    entry["target"] += target
+    entry["actual"] += actual
+
+def build_production_report(user_id, boms=None):
+    """Return {part_name: {"target": parts per minute, "actual": parts per minute}} for the user."""
+    if boms is None:
+        boms = build_target_boms(user_id)
+
+    report = {}
+    for bom in boms:
+        for row in bom:
+            _merge_report(report, row["Part Name"], target=row["Required Parts PM"])
+    for part_name, actual_ppm in load_actual_production(user_id).items():
+        _merge_report(report, part_name, actual=actual_ppm)
+    return report
+
+def build_machine_usage_report(user_id, boms=None):
+    """Return {machine_name: {"target": machines, "actual": machines}} for the user."""
+    if boms is None:
+        boms = build_target_boms(user_id)
+
+    report = {}
+    for bom in boms:
+        for row in bom:
+            if row["Produced In"] is not None:
+                _merge_report(report, str(row["Produced In"]), target=row["No. of Machines"])
+    for machine_name, machines in load_actual_machine_usage(user_id).items():
+        if machine_name is not None:
+            _merge_report(report, str(machine_name), actual=machines)
+    return report
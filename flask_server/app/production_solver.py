@@ -0,0 +1,173 @@
+# Description: This module solves whole-factory production plans with NumPy and SciPy instead of building nested trees.
+# Every (part_id, recipe) reachable from the targets becomes a row of a sparse recipe matrix A where A[i, j] is the amount of
+# node j consumed per unit of node i (the same ingredient_demand_quantity multiplier build_tree uses), and B[i, j] is the
+# byproduct of node i credited to node j (byproduct_supply_pm / part_supply_pm per unit).
+# The required amounts x for all targets d come from solving (I - A^T + B^T) x = d with a sparse LU solve, once for parts
+# per minute and once for quantities. A recipe has a handful of ingredients, so the matrix holds a few entries per row
+# however many nodes a whole-factory plan reaches. Recipe choice follows build_tree: the selected recipe, else the
+# parent's recipe name.
+
+import warnings
+import numpy as np
+from scipy.sparse import coo_matrix, identity
+from scipy.sparse.linalg import MatrixRankWarning, spsolve
+from .logging_util import setup_logger
+from .recipe_graph import get_recipe_graph
+from .recipe_selection import get_current_user_recipe_map
+from .build_tree import calculate_target_rate
+
+logger = setup_logger("production_solver")
+
+def _collect_nodes(graph, selected_recipes, root_keys):
+    """Return the (part_id, recipe_name) keys reachable from root_keys, in discovery order, and their ingredient edges."""
+    keys = []
+    index = {}
+    edges = []  # (parent index, child index, multiplier)
+    stack = []
+    for key in root_keys:
+        if key not in index:
+            index[key] = len(keys)
+            keys.append(key)
+            stack.append(key)
+    while stack:
+        key = stack.pop()
+        recipe = graph.recipes.get(key)
+        if recipe is None:
+            continue
+        for ingredient in recipe.ingredients:
+            child_key = (ingredient.part_id, selected_recipes.get(ingredient.part_id) or key[1])
+            if child_key not in index:
+                index[child_key] = len(keys)
+                keys.append(child_key)
+                stack.append(child_key)
+            edges.append((index[key], index[child_key], ingredient.ingredient_demand_quantity))
+    return keys, index, edges
+
+def _byproduct_credits(graph, keys):
+    """Return [(producer index, consumer index or None, byproduct part_id, units per unit of output)]."""
+    producers = {}  # part_id -> first node index producing it
+    for position, (part_id, recipe_name) in enumerate(keys):
+        if (part_id, recipe_name) in graph.recipes:
+            producers.setdefault(part_id, position)
+
+    credits = []
+    for position, key in enumerate(keys):
+        recipe = graph.recipes.get(key)
+        if not recipe or not recipe.byproduct or not recipe.byproduct_supply_pm or not recipe.part_supply_pm:
+            continue
+        byproduct_part_id = graph.get_part_id(recipe.byproduct)
+        if byproduct_part_id is None:
+            continue
+        credits.append((position, producers.get(byproduct_part_id), byproduct_part_id,
+                        recipe.byproduct_supply_pm / recipe.part_supply_pm))
+    return credits
+
+def _solve_with_byproducts(system, demand):
+    """
+    Solve (I - system) x = demand for a sparse CSR system. Nodes whose whole demand is covered by byproducts come out
+    negative; they are pinned to zero and the rest re-solved. Returns None if the system cannot be solved.
+    """
+    size = len(demand)
+    active = np.ones(size, dtype=bool)
+    required = np.zeros(size)
+    for _ in range(size):
+        rows = np.flatnonzero(active)
+        matrix = (identity(len(rows), format="csc") - system[rows][:, rows]).tocsc()
+        try:
+            # A singular matrix gives a warning and NaNs rather than an exception
+            with warnings.catch_warnings():
+                warnings.simplefilter("ignore", MatrixRankWarning)
+                solution = np.atleast_1d(spsolve(matrix, demand[rows]))
+        except RuntimeError:
+            return None
+        if not np.isfinite(solution).all():
+            return None
+        required[:] = 0
+        required[rows] = solution
+        negative = rows[solution < -1e-9]
+        if not len(negative):
+            break
+        active[negative] = False
+    return np.clip(required, 0, None)
+
+def solve_production(targets, graph=None, selected_recipes=None):
+    """
+    Solve the combined plan for a list of targets ({part_id, recipe_name, target_quantity, target_parts_pm, target_timeframe}).
+    Returns {"Parts": [...], "Surplus": [...]} with one part row per (part, recipe), or {"Error": ...} if the plan
+    cannot be solved (e.g. a recipe loop that consumes more than it makes).
+    """
+    if graph is None:
+        graph = get_recipe_graph()
+    if selected_recipes is None:
+        selected_recipes = get_current_user_recipe_map()
+
+    root_keys = []
+    demands = []  # (part key, parts per minute, quantity)
+    for target in targets:
+        part_id = int(target["part_id"])
+        recipe_type = selected_recipes.get(part_id) or target.get("recipe_name") or "_Standard"
+        target_quantity = target.get("target_quantity", 1) or 0
+        rate = calculate_target_rate(target_quantity, target.get("target_parts_pm"), target.get("target_timeframe"))
+        root_keys.append((part_id, recipe_type))
+        demands.append(((part_id, recipe_type), rate, target_quantity))
+
+    keys, index, edges = _collect_nodes(graph, selected_recipes, root_keys)
+    size = len(keys)
+    if not size:
+        return {"Parts": [], "Surplus": []}
+
+    demand = np.zeros((size, 2))
+    for key, rate, quantity in demands:
+        demand[index[key]] += (rate, float(quantity))
+
+    # system[j, i] is how much of node j one unit of node i needs (positive) or gives back as a byproduct (negative);
+    # duplicate entries are summed when the matrix is built
+    credits = _byproduct_credits(graph, keys)
+    entries = [(child, parent, multiplier) for parent, child, multiplier in edges]
+    entries += [(consumer, producer, -units) for producer, consumer, _, units in credits if consumer is not None]
+    rows, columns, values = zip(*entries) if entries else ((), (), ())
+    system = coo_matrix((np.array(values, dtype=float), (np.array(rows, dtype=int), np.array(columns, dtype=int))),
+                        shape=(size, size)).tocsr()
+
+    required = np.zeros((size, 2))
+    for column in range(2):
+        solution = _solve_with_byproducts(system, demand[:, column])
+        if solution is None:
+            logger.error(f"❌ Production plan could not be solved for {len(targets)} targets")
+            return {"Error": "Production plan could not be solved. Check for recipe loops that consume more than they produce."}
+        required[:, column] = solution
+
+    # Gross demand per node, before byproduct credits, to report what is left over
+    consumed = demand + system.maximum(0) @ required
+    surplus = {}
+    for producer, consumer, byproduct_part_id, units in credits:
+        produced = required[producer] * units
+        entry = surplus.setdefault(byproduct_part_id, [np.zeros(2), consumer])
+        entry[0] += produced
+    surplus_rows = []
+    for byproduct_part_id, (produced, consumer) in surplus.items():
+        left_over = produced - (consumed[consumer] if consumer is not None else 0)
+        if (left_over > 1e-9).any():
+            surplus_rows.append({
+                "Part ID": byproduct_part_id,
+                "Part Name": graph.get_part_name(byproduct_part_id),
+                "Surplus Parts PM": max(float(left_over[0]), 0.0),
+                "Surplus Quantity": max(float(left_over[1]), 0.0),
+            })
+
+    parts = []
+    for position, (part_id, recipe_name) in enumerate(keys):
+        recipe = graph.recipes.get((part_id, recipe_name))
+        rate, quantity = (float(value) for value in required[position])
+        supply_pm = recipe.part_supply_pm if recipe else None
+        parts.append({
+            "Part ID": part_id,
+            "Part Name": graph.get_part_name(part_id),
+            "Recipe": recipe_name,
+            "Produced In": recipe.produced_in if recipe else None,
+            "Required Parts PM": rate,
+            "Required Quantity": quantity,
+            "No. of Machines": rate / supply_pm if supply_pm else 0,
+            "Raw Resource": not (recipe and recipe.ingredients),
+        })
+    return {"Parts": parts, "Surplus": surplus_rows}
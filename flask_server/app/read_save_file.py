@@ -1,20 +1,35 @@
+from collections import OrderedDict
+from contextlib import contextmanager
 from pathlib import Path
 import os
 import json
+import time
 import satisfactory_save as s
 import re
+from flask import current_app
 from . import db
 from .logging_util import setup_logger
 from .build_connection_graph import build_factory_graph
-from .models import Machine, Recipe_Mapping, Resource_Node, User_Save, User_Save_Conveyors, User_Save_Connections, Recipe, Part, Conveyor_Level, Conveyor_Supply, User_Save_Pipes, User_Connection_Data, User_Pipe_Data
+from .data_version import bump_data_version, USER_SAVE
+from .incremental_ingest import SaveTable, has_save_rows, sync_save_tables, sync_factory_graph, update_save_summary
+from .save_generation import (get_active_generation, lock_generation, allocate_generation, activate_generation,
+                              schedule_generation_cleanup)
+from .reference_data import (get_machine_class_map, get_recipe_mappings, get_resource_nodes, get_resource_node_parts,
+                             get_raw_resource_recipes, get_conveyor_speeds)
+from .bulk_insert import insert_rows
+from .models import User_Save, User_Save_Conveyors, User_Save_Connections, User_Save_Pipes
 
 logger = setup_logger("read_save_file")
 
+# What satisfactory_save raises when asked for a class the save has no objects of
+MISSING_CLASS_ERROR = "invalid unordered_map<K, T> key"
+
 def extract_connection_info(connection_obj):
     """
     Extract connectivity information from an FGFactoryConnectionComponent instance.
     
     Returns a dictionary with:
+      - PathName: Path name of the connection component itself (obtained from BaseHeader), stable across saves.
       - instanceName: Identifier of the connection component (obtained from BaseHeader).
       - mConnectedComponent: The pathName the component is connected to.
       - mConnectionInventory: (Optional) The inventory reference if available.
@@ -25,6 +40,7 @@ def extract_connection_info(connection_obj):
     outer_path_name = str(outer_path_name) if outer_path_name is not None else None
 
     connection_data = {
+        "PathName": getattr(connection_obj.BaseHeader.Reference, "PathName", None),
         "OuterPathName": outer_path_name,
         "mConnectedComponent": None,
         "mConnectionInventory": None,
@@ -46,61 +62,76 @@ def extract_connection_info(connection_obj):
             
     return connection_data
 
-def process_connection_components(save_file_path):
+def get_save_objects(save, class_name):
+    """Return the parsed SaveGame's objects of class_name; a class the save has no objects of gives an empty list."""
+    try:
+        return save.getObjectsByClass(class_name)
+    except Exception as e:
+        if str(e) == MISSING_CLASS_ERROR:
+            return []
+        raise
+
+def extract_connection_components(save, raise_errors=False):
+    """
+    Return the connectivity information of every FGFactoryConnectionComponent in a parsed SaveGame.
+    With raise_errors, a component that cannot be read fails the extraction instead of being left out.
+    """
+    connection_components = []
+
+    # Retrieve all objects of type FGFactoryConnectionComponent.
+    try:
+        connection_objects = get_save_objects(save, "/Script/FactoryGame.FGFactoryConnectionComponent")
+        #logger.info(f"******************************Found {len(connection_objects)} FGFactoryConnectionComponent objects.")
+    except Exception as e:
+        #logger.error(f"Error extracting connection info: {e}")
+        if raise_errors:
+            raise
+        return connection_components
+
+    # Process each connection component
+    for obj in connection_objects:
+        try:
+            conn_info = extract_connection_info(obj)
+            connection_components.append(conn_info)
+        except Exception as e:
+            logger.error(f"❌ Error extracting connection info: {e}")
+            if raise_errors:
+                raise
+            continue
+    return connection_components
+
+def process_connection_components(save_file_path, save=None, raise_errors=False):
     """
-    Process a .sav file to extract all FGFactoryConnectionComponent instances and
+    Process a .sav file (or its already parsed SaveGame) to extract all FGFactoryConnectionComponent instances and
     output a JSON file with their connectivity information.
+    Errors give an empty list, or are raised with raise_errors (an incremental ingest must not diff against it).
     """
     #logger.info(f"PROCESSING connections from save file: {save_file_path}")
     
     try:
-        # Load the save file using the satisfactory_save library
-        save = s.SaveGame(save_file_path)
-        connection_components = []
-        
-        # Retrieve all objects of type FGFactoryConnectionComponent.
-        try:
-            connection_objects = save.getObjectsByClass("/Script/FactoryGame.FGFactoryConnectionComponent")
-            #logger.info(f"******************************Found {len(connection_objects)} FGFactoryConnectionComponent objects.")
-        except Exception as e:
-            #logger.error(f"Error extracting connection info: {e}")
-            return connection_components
-        
-        
-        # Process each connection component
-        for obj in connection_objects:
-            try:
-                conn_info = extract_connection_info(obj)
-                connection_components.append(conn_info)
-            except Exception as e:
-                logger.error(f"❌ Error extracting connection info: {e}")
-                continue
+        if save is None:
+            # Load the save file using the satisfactory_save library
+            save = s.SaveGame(save_file_path)
+        connection_components = extract_connection_components(save, raise_errors)
 
         # Write the extracted connection data to a JSON file for reference.
-        output_dir = Path("output")
-        output_dir.mkdir(parents=True, exist_ok=True)
-        output_file_path = output_dir / f"{os.path.basename(save_file_path)}_connections.json"
-        
-        try:
-            with open(output_file_path, 'w') as outfile:
-                json.dump(connection_components, outfile, indent=4)
-            #logger.info(f"✅ Connection data JSON saved to {output_file_path}")
-        except Exception as e:
-            logger.error(f"❌ Error saving connection JSON output: {e}")
-        
+        write_output_json(save_file_path, "_connections", connection_components)
         return connection_components
         
     except Exception as e:
         logger.error(f"❌ Error processing save file for connection components: {e}")
+        if raise_errors:
+            raise
         return []
     
-def extract_conveyor_chain_info(chain_obj):
+def extract_conveyor_chain_info(chain_obj, raise_errors=False):
     """
     Extract connectivity information from an FGConveyorChainActor instance.
     
     Returns a dictionary with:
         - first_belt: The pathName of the first conveyor belt in the chain.
         - last_belt: The pathName of the last conveyor belt in the chain.
+    or None if the chain cannot be read (raised instead with raise_errors).
     """
 
     output_data = {
@@ -115,54 +146,116 @@ def extract_conveyor_chain_info(chain_obj):
         return output_data
     except Exception as e:
         logger.error(f"❌ Error extracting conveyor chain info: Error {e}")
+        if raise_errors:
+            raise
         return None
 
-def process_conveyor_chain_components(save_file_path):
+def extract_conveyor_chain_components(save, raise_errors=False):
     """
-    Process a .sav file to extract all FGConveyorChainActor instances and
-    output a JSON file with their connectivity information.
+    Return the first and last belt of every FGConveyorChainActor in a parsed SaveGame.
+    With raise_errors, a chain that cannot be read fails the extraction instead of being left out.
     """
-    #logger.info(f"PROCESSING conveyor chains from save file: {save_file_path}")
-    
+    conveyor_chains = []
+
     try:
-        
-        save = s.SaveGame(save_file_path)
-        conveyor_chains = []
-        
+        chain_objects = get_save_objects(save, "/Script/FactoryGame.FGConveyorChainActor")
+    except Exception as e:
+        logger.error(f"❌ Error extracting conveyor chain info: {e}")
+        if raise_errors:
+            raise
+        return conveyor_chains
+
+    for obj in chain_objects:
         try:
-            chain_objects = save.getObjectsByClass("/Script/FactoryGame.FGConveyorChainActor")
+            #logger.info(f"Processing conveyor chain: {obj}")
+            chain_info = extract_conveyor_chain_info(obj, raise_errors)
+            if chain_info is not None:
+                conveyor_chains.append(chain_info)
         except Exception as e:
             logger.error(f"❌ Error extracting conveyor chain info: {e}")
-            return conveyor_chains
+            if raise_errors:
+                raise
+            continue
+    return conveyor_chains
 
-
-        for obj in chain_objects:
-            try:
-                #logger.info(f"Processing conveyor chain: {obj}")
-                chain_info = extract_conveyor_chain_info(obj)
-                if chain_info is not None:
-                    conveyor_chains.append(chain_info)
-            except Exception as e:
-                logger.error(f"❌ Error extracting conveyor chain info: {e}")
-                continue
-
-        output_dir = Path("output")
-        output_dir.mkdir(parents=True, exist_ok=True)
-        output_file_path = output_dir / f"{os.path.basename(save_file_path)}_conveyor_chains.json"
-        
-        try:
-            with open(output_file_path, 'w') as outfile:
-                json.dump(conveyor_chains, outfile, indent=4)
-            #logger.info(f"✅ Conveyor chain data JSON saved to {output_file_path}")
-        except Exception as e:
-            logger.error(f"❌ Error saving conveyor chain JSON output: {e}")
-        
+def process_conveyor_chain_components(save_file_path, save=None, raise_errors=False):
+    """
+    Process a .sav file (or its already parsed SaveGame) to extract all FGConveyorChainActor instances and
+    output a JSON file with their connectivity information.
+    Errors give an empty list, or are raised with raise_errors.
+    """
+    #logger.info(f"PROCESSING conveyor chains from save file: {save_file_path}")
+    
+    try:
+        if save is None:
+            save = s.SaveGame(save_file_path)
+        conveyor_chains = extract_conveyor_chain_components(save, raise_errors)
+        write_output_json(save_file_path, "_conveyor_chains", conveyor_chains)
         return conveyor_chains
         
     except Exception as e:
         logger.error(f"❌ Error processing save file for conveyor chains: {e}")
+        if raise_errors:
+            raise
         return []
 
+def extract_pipe_networks(save, raise_errors=False):
+    """
+    Return the instance name, fluid and connected components of every FGPipeNetwork in a parsed SaveGame.
+    With raise_errors, a network that cannot be read fails the extraction instead of being left out.
+    """
+    pipe_networks = []
+    pipe_objects = get_save_objects(save, "/Script/FactoryGame.FGPipeNetwork")
+
+    if not pipe_objects:
+        logger.info("🚫 No pipe networks found."
+                    "Skipping pipe network extraction.")
+    else:
+        logger.info(f"🔍 Found {len(pipe_objects)} pipe networks.")
+        for obj in pipe_objects:
+            pipe_data = extract_pipe_network_data(obj, raise_errors)
+            if pipe_data["instance_name"]:  # Ensure valid data
+                pipe_networks.append(pipe_data)
+    return pipe_networks
+
+def process_pipe_network_components(save_file_path, save=None, raise_errors=False):
+    """
+    Process a .sav file (or its already parsed SaveGame) to extract all FGPipeNetwork instances and
+    output a JSON file with them for debugging.
+    Errors give an empty list, or are raised with raise_errors.
+    """
+    try:
+        if save is None:
+            save = s.SaveGame(save_file_path)
+        pipe_networks = extract_pipe_networks(save, raise_errors)
+
+        # Save extracted pipe data to a JSON file for debugging
+        output_file_path = write_output_json(save_file_path, "_pipes", pipe_networks)
+        logger.info(f"✅ Pipe network data saved to {output_file_path}")
+        return pipe_networks
+
+    except Exception as e:
+        if str(e) == MISSING_CLASS_ERROR:
+            #logger.debug("Skipping pipe network extraction due to invalid key.")
+            pass
+        else: 
+            logger.error(f"❌ Error extracting pipe network data: {e}")
+            if raise_errors:
+                raise
+        return []
+
+def write_output_json(save_file_path, suffix, data):
+    """Write extracted data to output/<save file name><suffix>.json for reference and return the path."""
+    output_dir = Path("output")
+    output_dir.mkdir(parents=True, exist_ok=True)
+    output_file_path = output_dir / f"{os.path.basename(save_file_path)}{suffix}.json"
+    try:
+        with open(output_file_path, 'w') as outfile:
+            json.dump(data, outfile, indent=4)
+    except Exception as e:
+        logger.error(f"❌ Error saving JSON output {output_file_path}: {e}")
+    return output_file_path
+
 def extract_machine_info(machine_obj, machines, recipe_mappings, resource_nodes):
     """
     Extract machine-specific information from the parsed save object and return it as a dictionary.
@@ -172,6 +265,7 @@ def extract_machine_info(machine_obj, machines, recipe_mappings, resource_nodes)
 
     machine_data = {
         "ClassName": class_name,
+        "PathName": getattr(machine_obj.BaseHeader.Reference, "PathName", None),
         "Machine_ID": machines.get(class_name),  # Fetch machine_id from DB
         "CurrentRecipe": None,
         "Recipe_ID": None,
@@ -218,250 +312,270 @@ def extract_machine_info(machine_obj, machines, recipe_mappings, resource_nodes)
 
     return machine_data
 
-def process_save_file(save_file_path, current_user):
+# The stages of process_save_file in the order they run, used to report ingestion progress
+# (a full ingest runs the insert_* stages, an incremental one sync_save_rows)
+INGEST_STAGES = ("prepare_generation", "load_reference_data", "parse_save", "machines", "connections", "conveyor_chains",
+                 "pipe_networks", "insert_connections_and_conveyors", "insert_pipe_networks", "sync_save_rows",
+                 "factory_graph", "activate_generation")
+
+class IngestTimings:
+    """Wall time of each save ingestion stage, in the order the stages ran."""
+
+    def __init__(self, on_stage=None):
+        self.stages = OrderedDict()  # stage name -> seconds
+        self.on_stage = on_stage  # called with the stage name as each stage starts
+
+    @contextmanager
+    def stage(self, name):
+        if self.on_stage is not None:
+            try:
+                self.on_stage(name)
+            except Exception as e:
+                logger.error(f"❌ Error reporting ingest stage {name}: {e}")
+        start = time.perf_counter()
+        try:
+            yield
+        finally:
+            self.stages[name] = self.stages.get(name, 0) + time.perf_counter() - start
+
+    def summary(self):
+        total = sum(self.stages.values())
+        return ", ".join(f"{name} {seconds:.2f}s" for name, seconds in self.stages.items()) + f" (total {total:.2f}s)"
+
+# Columns of the rows built for each save table, in the order of the row tuples
+USER_SAVE_COLUMNS = ("user_id", "machine_id", "recipe_id", "resource_node_id", "machine_power_modifier", "sav_file_name",
+                     "current_progress", "input_inventory", "output_inventory", "time_since_last_change",
+                     "production_duration", "productivity_measurement_duration", "productivity_monitor_enabled",
+                     "is_producing", "save_path_name")
+CONNECTION_COLUMNS = ("user_id", "outer_path_name", "connected_component", "connection_inventory", "direction",
+                      "conveyor_speed", "save_path_name")
+CONVEYOR_COLUMNS = ("user_id", "conveyor_first_belt", "conveyor_last_belt")
+PIPE_COLUMNS = ("user_id", "instance_name", "fluid_type", "connection_points")
+
+# How an incremental re-ingest matches new rows to stored ones: machines and connection components by their path name
+# in the save, conveyor chains by their end belts and pipe networks by their instance name.
+# A machine is not rewritten for a new file name (set with one UPDATE instead) or for its production counters, which
+# change on every tick; the counters are refreshed when the machine is rewritten for another change.
+MACHINE_VOLATILE_COLUMNS = ("sav_file_name", "current_progress", "time_since_last_change", "production_duration",
+                            "productivity_measurement_duration")
+MACHINE_TABLE = SaveTable(User_Save, USER_SAVE_COLUMNS, ("save_path_name",), MACHINE_VOLATILE_COLUMNS)
+CONNECTION_TABLE = SaveTable(User_Save_Connections, CONNECTION_COLUMNS, ("save_path_name",))
+CONVEYOR_TABLE = SaveTable(User_Save_Conveyors, CONVEYOR_COLUMNS, ("conveyor_first_belt", "conveyor_last_belt"))
+PIPE_TABLE = SaveTable(User_Save_Pipes, PIPE_COLUMNS, ("instance_name",))
+
+def machine_row(user_id, machine_info, recipe_id, sav_file_name):
+    """Return the user_save row (see USER_SAVE_COLUMNS) of one extracted machine."""
+    return (user_id, machine_info["Machine_ID"], recipe_id, machine_info["Resource_Node_ID"], machine_info["CurrentPotential"],
+            sav_file_name, machine_info["CurrentManufacturingProgress"], machine_info["InputInventory"],
+            machine_info["OutputInventory"], machine_info["TimeSinceStartStopProducing"],
+            machine_info["CurrentProductivityMeasurementProduceDuration"],
+            machine_info["CurrentProductivityMeasurementDuration"], machine_info["ProductivityMonitorEnabled"],
+            machine_info["IsProducing"], machine_info["PathName"])
+
+def connection_rows(user_id, connection_data, conveyor_speeds):
+    """Yield the user_save_connections rows (see CONNECTION_COLUMNS) of the extracted connection components."""
+    for conn in connection_data:
+        if conn["mConnectedComponent"] and "ConveyorBelt" in conn["mConnectedComponent"]:
+            conveyor_speed = conveyor_speeds.get(get_conveyor_mk_level(conn["mConnectedComponent"]), 60)  # Default to MK1 speed
+        else:
+            conveyor_speed = None  # No conveyor, no speed
+        yield (user_id, conn["OuterPathName"], conn["mConnectedComponent"], conn["mConnectionInventory"], conn["mDirection"],
+               conveyor_speed, conn.get("PathName"))
+
+def conveyor_rows(user_id, conveyor_data):
+    """Yield the user_save_conveyors rows (see CONVEYOR_COLUMNS) of the extracted conveyor chains."""
+    for conveyor in conveyor_data:
+        yield (user_id, conveyor["first_belt"], conveyor["last_belt"])
+
+def pipe_rows(user_id, pipe_networks):
+    """Yield the user_save_pipes rows (see PIPE_COLUMNS) of the extracted pipe networks."""
+    for pipe in pipe_networks:
+        yield (user_id, pipe["instance_name"], pipe["fluid_type"], json.dumps(pipe["connections"]))  # Store as JSON
+
+def process_save_file(save_file_path, current_user, on_stage=None, raise_errors=False):
     """
-    Process a .sav file, extract machine data (including additional properties),
-    insert into the user_save table, and save a JSON output for reference.
+    Process a .sav file in stages: the save is parsed once and the same SaveGame is handed to every extractor
+    (machines, factory connections, conveyor chains and pipe networks). The results are inserted into the user's
+    save tables under a new ingest generation, JSON outputs are saved for reference and the factory graph is rebuilt.
+    Readers keep seeing the previous generation until the new one is complete and activated (see save_generation.py);
+    the previous generation's rows are then deleted in the background.
+    If the user already has a save and INGEST_INCREMENTAL is on, only the differences from the stored rows are written
+    instead, in one transaction (see incremental_ingest.py).
+    on_stage(name) is called as each of INGEST_STAGES starts. Errors are logged, and re-raised if raise_errors is set.
+    With raise_errors, or in an incremental ingest, an object that cannot be extracted fails the ingest; otherwise it is
+    left out.
+    Returns {stage: seconds} with the wall time of each stage.
     """
   
     logger.info(f"📝 PROCESSING save file: {save_file_path}")
     progress = "Starting"
+    timings = IngestTimings(on_stage)
+    generation, activated, incremental = None, False, False
     try:
         user_id = current_user
         logger.info(f"👤 Processing save file for user {user_id}")
         if user_id is None:
             logger.error("❌ ERROR: `current_user` is None or missing `id` attribute!")
-            return  # Stop execution
-
-        # ✅ DELETE OLD RECORDS FIRST
-        db.session.query(User_Save_Conveyors).filter(User_Save_Conveyors.user_id == user_id).delete()
-        db.session.commit()
-        logger.info(f"🗑️ Deleted old User_Save_Conveyors records for user {user_id}")
-
-        db.session.query(User_Save_Connections).filter(User_Save_Connections.user_id == user_id).delete()
-        db.session.commit()
-        logger.info(f"🗑️ Deleted old User_Save_Connections records for user {user_id}")
-                
-        db.session.query(User_Save).filter(User_Save.user_id == user_id).delete()
-        db.session.commit()
-        logger.info(f"🗑️ Deleted old User_Save for user {user_id}")
-        
-        db.session.query(User_Connection_Data).filter(User_Connection_Data.user_id == user_id).delete()
-        db.session.commit()
-        logger.info(f"🗑️ Deleted old User_Connection_Data records for user {user_id}")
-
-        db.session.query(User_Save_Pipes).filter(User_Save_Pipes.user_id == user_id).delete()
-        db.session.commit()
-        logger.info(f"🗑️ Deleted old User_Save_Pipes records for user {user_id}")
-
-        db.session.query(User_Pipe_Data).filter(User_Pipe_Data.user_id == user_id).delete()
-        db.session.commit()
-        logger.info(f"🗑️ Deleted old User_Pipe_Data records for user {user_id}")
-
-        progress = "Deleted old records"
+            return timings.stages  # Stop execution
+
+        # ✅ DIFF AGAINST THE STORED SAVE, OR WRITE UNDER A NEW GENERATION; THE OLD RECORDS STAY VISIBLE UNTIL THE END
+        with timings.stage("prepare_generation"):
+            generation = get_active_generation(user_id)
+            incremental = current_app.config.get("INGEST_INCREMENTAL", True) and has_save_rows(user_id, generation)
+            if incremental:
+                logger.info(f"🔄 Applying changes to save generation {generation} for user {user_id}")
+            else:
+                generation = allocate_generation(user_id)
+                logger.info(f"🔄 Writing save generation {generation} for user {user_id}")
+            new_rows = {"ingest_generation": generation}
+            # Anything left out of an incremental ingest's extraction would be deleted from the stored save, so an
+            # extraction error fails it instead
+            strict = raise_errors or incremental
+        progress = f"Prepared generation {generation}"
         
-        # Fetch all machine class names from the database
-        machines = {m.save_file_class_name: m.id for m in Machine.query.all()}
-        progress = "Fetched machine class names"
-
-        # Fetch all recipe mappings from `recipe_mapping`
-        recipe_mappings = {rm.save_file_recipe: rm.recipe_id for rm in Recipe_Mapping.query.all()}
-        progress = "Fetched recipe mappings"
-
-        # Fetch all resource node mappings
-        resource_nodes = {rn.save_file_path_name: rn.id for rn in Resource_Node.query.all()}
-        progress = "Fetched resource node mappings"
-
-        # Fetch all the parts id's from the Resource_Node table based on resource_node_id
-        raw_parts = {p.id: p.part_id for p in Resource_Node.query.all()}
-        progress = "Fetched raw parts"
-
-        # Fetch all the recipe id's from the Recipe table based on the part id's from raw_parts and where the recipe_name = '_Standard'
-        raw_recipes = {r.part_id: r.id for r in Recipe.query.filter(Recipe.part_id.in_(raw_parts.values())).filter(Recipe.recipe_name == '_Standard').all()}
-        progress = "Fetched raw recipes"
-        # logger.debug(f"🔍 Raw Recipes: {raw_recipes}")
-
-        # Load the save file using the satisfactory_save library
-        save = s.SaveGame(save_file_path)
+        with timings.stage("load_reference_data"):
+            # Fetch all machine class names (cached reference data)
+            machines = get_machine_class_map()
+            # Fetch all recipe mappings from `recipe_mapping`
+            recipe_mappings = get_recipe_mappings()
+            # Fetch all resource node mappings
+            resource_nodes = get_resource_nodes()
+            # Fetch all the parts id's from the Resource_Node table based on resource_node_id
+            raw_parts = get_resource_node_parts()
+            # Fetch the _Standard recipe id for each of the raw parts
+            raw_recipes = get_raw_resource_recipes()
+            # Fetch conveyor supply rates
+            conveyor_speeds = get_conveyor_speeds()
+        progress = "Fetched reference data"
+
+        # Load the save file using the satisfactory_save library. This is the only parse of the file.
+        with timings.stage("parse_save"):
+            save = s.SaveGame(save_file_path)
         output_data = []
+        machine_rows = []
+        sav_file_name = os.path.basename(save_file_path)
         progress = "Loaded save file"
 
-        # Iterate through each machine class and extract data
-        for class_name in machines.keys():
-            progress = f"Extracting objects for class {class_name}"
-            try:
-                objects = save.getObjectsByClass(class_name)
-                for obj in objects:
-                    progress = f"Extracting object {obj}"
-                    machine_info = extract_machine_info(obj, machines, recipe_mappings, resource_nodes)
-                    output_data.append(machine_info)
-
-                    # Use the recipe_id from the machine_info unless it is blank then look up the recipe_id from the raw_recipes based on the part_id from raw_parts where the part_id = machine_info["Resource_Node_ID"]
-                    recipe_id = machine_info["Recipe_ID"] if machine_info["Recipe_ID"] else raw_recipes.get(raw_parts.get(machine_info["Resource_Node_ID"])) if raw_parts.get(machine_info["Resource_Node_ID"]) else None
-                    progress = f"Got the recipe_id {recipe_id}"
-
-                    # logger.debug(f"🔍 Recipe ID: {recipe_id}")
-                    
-                    new_entry = User_Save(
-                        user_id=current_user,
-                        machine_id=machine_info["Machine_ID"],
-                        recipe_id=recipe_id,
-                        resource_node_id=machine_info["Resource_Node_ID"],
-                        machine_power_modifier=machine_info["CurrentPotential"],
-                        sav_file_name=os.path.basename(save_file_path),
-                        current_progress=machine_info["CurrentManufacturingProgress"],
-                        input_inventory=machine_info["InputInventory"],
-                        output_inventory=machine_info["OutputInventory"],
-                        time_since_last_change=machine_info["TimeSinceStartStopProducing"],
-                        production_duration=machine_info["CurrentProductivityMeasurementProduceDuration"],
-                        productivity_measurement_duration=machine_info["CurrentProductivityMeasurementDuration"],
-                        productivity_monitor_enabled=machine_info["ProductivityMonitorEnabled"],
-                        is_producing=machine_info["IsProducing"]
-                    )
-                    db.session.add(new_entry)
-                progress = f"Inserted objects for class {class_name}"
-                    # logger.debug(f"✅ New entry {new_entry}")
-            except Exception as e:
-                if str(e) == "invalid unordered_map<K, T> key":
-                    continue  # Skip this class if the key is invalid
-                else:
-                    logger.error(f"❌ Error extracting objects for class {class_name}, Progress {progress}: {e}")
-                
-       
-        try:
-            db.session.commit()
-            logger.info("✅ Database commit successful for user save data!")
-            progress = "Database commit successful"
-        except Exception as e:
-            logger.error(f"❌ ERROR DURING COMMIT: {e}")
-
-        # Save extracted data to JSON for reference
-        #logger.info("📝 Saving output data to JSON...")
-        output_dir = Path("output")
-        output_dir.mkdir(parents=True, exist_ok=True)
-        output_file_path = output_dir / f"{os.path.basename(save_file_path)}.json"
-        try:
-            with open(output_file_path, 'w') as outfile:
-                json.dump(output_data, outfile, indent=4)
-            #logger.info(f"✅ Output JSON saved to {output_file_path}")
+        with timings.stage("machines"):
+            # Iterate through each machine class and extract data
+            for class_name in machines.keys():
+                progress = f"Extracting objects for class {class_name}"
+                try:
+                    objects = save.getObjectsByClass(class_name)
+                    for obj in objects:
+                        progress = f"Extracting object {obj}"
+                        machine_info = extract_machine_info(obj, machines, recipe_mappings, resource_nodes)
+                        output_data.append(machine_info)
+
+                        # Use the recipe_id from the machine_info unless it is blank then look up the recipe_id from the raw_recipes based on the part_id from raw_parts where the part_id = machine_info["Resource_Node_ID"]
+                        recipe_id = machine_info["Recipe_ID"] if machine_info["Recipe_ID"] else raw_recipes.get(raw_parts.get(machine_info["Resource_Node_ID"])) if raw_parts.get(machine_info["Resource_Node_ID"]) else None
+                        progress = f"Got the recipe_id {recipe_id}"
+
+                        machine_rows.append(machine_row(current_user, machine_info, recipe_id, sav_file_name))
+                    progress = f"Inserted objects for class {class_name}"
+                except Exception as e:
+                    if str(e) == MISSING_CLASS_ERROR:
+                        continue  # Skip this class if the key is invalid
+                    else:
+                        logger.error(f"❌ Error extracting objects for class {class_name}, Progress {progress}: {e}")
+                        if strict:
+                            raise
+
+            if not incremental:
+                # A failed insert fails the ingest, so a generation without its machines is never activated
+                insert_rows(User_Save, USER_SAVE_COLUMNS, machine_rows, values=new_rows)
+                db.session.commit()
+                logger.info(f"✅ Database commit successful for {len(machine_rows)} user save rows!")
+                progress = "Database commit successful"
+
+            # Save extracted data to JSON for reference
+            write_output_json(save_file_path, "", output_data)
             progress = "Saved output JSON"
-        except Exception as e:
-            logger.error(f"❌ Error saving JSON output: {e}")
 
-        # Extract connection and conveyor data
+        # Extract connection, conveyor and pipe data from the same parsed save
         progress = "Extracting connection and conveyor data"
-        connection_data = process_connection_components(save_file_path)
-        conveyor_data = process_conveyor_chain_components(save_file_path)
-
-        # Fetch conveyor supply rates
-        progress = "Fetching conveyor levels and speeds"
-        conveyor_levels = {cl.id: cl.conveyor_level for cl in Conveyor_Level.query.all()}
-        conveyor_speeds = {cs.conveyor_level_id: cs.supply_pm for cs in Conveyor_Supply.query.all()}
-        # logger.debug(f"Conveyor Levels: {conveyor_levels} | Conveyor Speeds: {conveyor_speeds}")
-                    
-        # Insert connection data into the database
-        progress = "Inserting Connections data"
-        for conn in connection_data:
-            if conn["mConnectedComponent"] and "ConveyorBelt" in conn["mConnectedComponent"]:
-                conveyor_mk = get_conveyor_mk_level(conn["mConnectedComponent"])
-                conveyor_speed = conveyor_speeds.get(conveyor_mk, 60)  # Default to MK1 speed
-                # logger.debug(f"Conveyor MK Level: {conveyor_mk}, Speed: {conveyor_speed}")
-            else:
-                conveyor_mk = None
-                conveyor_speed = None  # No conveyor, no speed
-            # logger.debug(f"Conveyor MK Level: {conveyor_mk}, Speed: {conveyor_speed}")
-            
-            progress = "Inserting Connections data {conn}, {current_user}, {conveyor_speed}"
-            new_connection = User_Save_Connections(
-                user_id=current_user,
-                outer_path_name=conn["OuterPathName"],
-                connected_component=conn["mConnectedComponent"],
-                connection_inventory=conn["mConnectionInventory"],
-                direction=conn["mDirection"],
-                conveyor_speed=conveyor_speed
-            )
-            db.session.add(new_connection)
-        progress = "Inserted Connections data"
-
-        # Insert conveyor chain data into the database
-        progress = "Inserting Conveyors data"
-        for conveyor in conveyor_data:
-            progress= "Inserting Conveyors data {conveyor}"
-            new_conveyor = User_Save_Conveyors(
-                user_id=current_user,
-                conveyor_first_belt=conveyor["first_belt"],
-                conveyor_last_belt=conveyor["last_belt"]
-            )
-            db.session.add(new_conveyor)
-        progress = "Inserted Conveyors data"
-
-        # Commit changes
-        db.session.commit()
-        logger.info("✅ Database commit successful for connections and conveyors!")
-        progress = "Database commit successful for connections and conveyors"
-
-        # Extract all pipe networks
-        try:
-            pipe_networks = []
-            save = s.SaveGame(save_file_path)
-            pipe_objects = save.getObjectsByClass("/Script/FactoryGame.FGPipeNetwork")
-
-        
-            if not pipe_objects:
-                logger.info("🚫 No pipe networks found."
-                            "Skipping pipe network extraction.")
-            else:
-                logger.info(f"🔍 Found {len(pipe_objects)} pipe networks.")
-                for obj in pipe_objects:
-                    pipe_data = extract_pipe_network_data(obj)
-                    if pipe_data["instance_name"]:  # Ensure valid data
-                        pipe_networks.append(pipe_data)
-
-            # Save extracted pipe data to a JSON file for debugging
-            output_dir = Path("output")
-            output_dir.mkdir(parents=True, exist_ok=True)
-            output_file_path = output_dir / f"{os.path.basename(save_file_path)}_pipes.json"
-            with open(output_file_path, 'w') as outfile:
-                json.dump(pipe_networks, outfile, indent=4)
-
-            logger.info(f"✅ Pipe network data saved to {output_file_path}")
-
-        except Exception as e:
-            if str(e) == "invalid unordered_map<K, T> key":
-                #logger.debug("Skipping pipe network extraction due to invalid key.")
-                pass
-            else: 
-                logger.error(f"❌ Error extracting pipe network data: {e}")
-
-        # Insert pipe networks into the database
-        try:
-            db.session.query(User_Save_Pipes).filter(User_Save_Pipes.user_id == current_user).delete()
-            db.session.commit()
-
-            for pipe in pipe_networks:
-                new_pipe = User_Save_Pipes(
-                    user_id=current_user,
-                    instance_name=pipe["instance_name"],
-                    fluid_type=pipe["fluid_type"],
-                    connection_points=json.dumps(pipe["connections"]),  # Store as JSON
-                )
-                db.session.add(new_pipe)
-
-            db.session.commit()
-            logger.info(f"✅ Pipe network data saved to database.")
-
-        except Exception as e:
-            logger.error(f"❌ Error saving pipe network data: {e}")
-
-        try:
-            # Build the factory graph and store it in the user_connection_data table
-            build_factory_graph(current_user)
-            logger.info("✅ Stored processed connections in user_connection_data")
-        except Exception as e:
-            logger.error(f"❌ Error building and saving factory graph: {e}")
+        with timings.stage("connections"):
+            connection_data = process_connection_components(save_file_path, save, strict)
+        with timings.stage("conveyor_chains"):
+            conveyor_data = process_conveyor_chain_components(save_file_path, save, strict)
+        progress = "Extracting pipe networks"
+        with timings.stage("pipe_networks"):
+            pipe_networks = process_pipe_network_components(save_file_path, save, strict)
+        # Every extractor has run, so release the parsed save before the inserts
+        del save
+
+        if incremental:
+            with timings.stage("sync_save_rows"):
+                # Other ingests of this user wait from here until the commit, and the diff sees their changes
+                db.session.commit()
+                generation = lock_generation(current_user)
+                progress = f"Applying save changes to generation {generation}"
+                save_changes = sync_save_tables(current_user, generation, [
+                    (MACHINE_TABLE, machine_rows),
+                    (CONNECTION_TABLE, connection_rows(current_user, connection_data, conveyor_speeds)),
+                    (CONVEYOR_TABLE, conveyor_rows(current_user, conveyor_data)),
+                    (PIPE_TABLE, pipe_rows(current_user, pipe_networks)),
+                ])
+                update_save_summary(current_user, generation, sav_file_name, save_changes)
+
+            with timings.stage("factory_graph"):
+                progress = "Applying factory graph changes"
+                sync_factory_graph(current_user, generation, save_changes)
+
+            with timings.stage("activate_generation"):
+                # Every change is committed at once, so readers go straight from the old save to the new one
+                db.session.commit()
+                activated = True
+                progress = f"Committed changes to generation {generation}"
+                bump_data_version(USER_SAVE, current_user)
+                logger.info(f"✅ Applied save changes to generation {generation} for user {current_user}")
+        else:
+            with timings.stage("insert_connections_and_conveyors"):
+                # Insert connection data into the database
+                progress = "Inserting Connections data"
+                inserted = insert_rows(User_Save_Connections, CONNECTION_COLUMNS, connection_rows(current_user, connection_data, conveyor_speeds), values=new_rows)
+                progress = f"Inserted {inserted} Connections rows"
+
+                # Insert conveyor chain data into the database
+                progress = "Inserting Conveyors data"
+                inserted = insert_rows(User_Save_Conveyors, CONVEYOR_COLUMNS, conveyor_rows(current_user, conveyor_data), values=new_rows)
+                progress = f"Inserted {inserted} Conveyors rows"
+
+                # Commit changes
+                db.session.commit()
+                logger.info("✅ Database commit successful for connections and conveyors!")
+                progress = "Database commit successful for connections and conveyors"
+
+            # Insert pipe networks into the database
+            with timings.stage("insert_pipe_networks"):
+                insert_rows(User_Save_Pipes, PIPE_COLUMNS, pipe_rows(current_user, pipe_networks), values=new_rows)
+                db.session.commit()
+                logger.info(f"✅ Pipe network data saved to database.")
+
+            with timings.stage("factory_graph"):
+                # Build the factory graph and store it in the user_connection_data table
+                build_factory_graph(current_user, generation=generation, raise_errors=True)
+                logger.info("✅ Stored processed connections in user_connection_data")
+
+            with timings.stage("activate_generation"):
+                # One UPDATE switches readers to the new save; the old generation is deleted in the background
+                if not activate_generation(current_user, generation):
+                    raise RuntimeError(f"Save generation {generation} was superseded by a newer ingest")
+                activated = True
+                progress = f"Activated generation {generation}"
+                schedule_generation_cleanup(current_user)
 
     except Exception as e:
         logger.error(f"❌ Error processing file {save_file_path}, Progress: {progress}: {e}")
+        db.session.rollback()
+        if generation is not None and not activated and not incremental:
+            # Readers never saw the partly written (or superseded) generation; just drop its rows
+            schedule_generation_cleanup(current_user, failed_generation=generation)
+        if raise_errors:
+            raise
+    finally:
+        logger.info(f"⏱️ Ingest timings for {save_file_path}: {timings.summary()}")
+    return dict(timings.stages)
 
 def process_multiple_save_files(save_file_path, current_user):
     """
@@ -495,9 +609,10 @@ def get_conveyor_mk_level(connected_component):
     match = re.search(r'Mk(\d+)', connected_component)
     return int(match.group(1)) if match else None
 
-def extract_pipe_network_data(pipe_obj):
+def extract_pipe_network_data(pipe_obj, raise_errors=False):
     """
     Extracts relevant data from an FGPipeNetwork object.
+    A network that cannot be read gives an empty entry, or is raised with raise_errors.
     """
     try:
         # Get the instance name from BaseHeader
@@ -528,6 +643,8 @@ def extract_pipe_network_data(pipe_obj):
 
     except Exception as e:
         print(f"❌ Error extracting pipe network data: {e}")
+        if raise_errors:
+            raise
         return {
             "instance_name": None,
             "fluid_type": None,
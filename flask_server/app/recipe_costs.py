@@ -0,0 +1,91 @@
+# Description: This module precomputes the raw-resource cost of every (part_id, recipe) in the recipe graph.
+# For one unit of output it records the transitive raw resources consumed and the machine-seconds spent, assuming every
+# ingredient is made with its _Standard recipe. The table is rebuilt when the reference data version changes, so totals
+# and alternate-recipe comparisons become a lookup and a multiply instead of a tree walk.
+
+from collections import namedtuple
+from .logging_util import setup_logger
+from .recipe_graph import get_recipe_graph, find_strongly_connected_components
+from .reference_data import get_reference_data
+
+logger = setup_logger("recipe_costs")
+
+STANDARD_RECIPE = "_Standard"
+
+# raw_resources is {part_id: units per unit of output}, machine_seconds_by_machine is {machine name: seconds per unit}
+RecipeCost = namedtuple("RecipeCost", ["raw_resources", "machine_seconds", "machine_seconds_by_machine"])
+
+def build_recipe_costs(graph):
+    """
+    Return {(part_id, recipe_name): RecipeCost}. Recipes without ingredients are raw resources (a cost of one unit of
+    themselves). Ingredients without a _Standard recipe are counted as raw resources too. Recipes that are part of, or
+    lead into, a circular dependency under _Standard ingredients have no cost (None).
+    """
+    successors = {
+        key: [(ingredient.part_id, STANDARD_RECIPE) for ingredient in entry.ingredients
+              if (ingredient.part_id, STANDARD_RECIPE) in graph.recipes]
+        for key, entry in graph.recipes.items()
+    }
+
+    costs = {}
+    # Components come out ingredients first, so every ingredient's cost is known before the recipes using it
+    for component in find_strongly_connected_components(successors):
+        if len(component) > 1 or component[0] in successors[component[0]]:
+            for key in component:
+                costs[key] = None
+            continue
+
+        key = component[0]
+        entry = graph.recipes[key]
+        own_seconds = 60 / entry.part_supply_pm if entry.part_supply_pm else 0
+        machine_seconds_by_machine = {entry.produced_in: own_seconds} if own_seconds else {}
+        if not entry.ingredients:
+            costs[key] = RecipeCost({entry.part_id: 1.0}, own_seconds, machine_seconds_by_machine)
+            continue
+
+        raw_resources = {}
+        machine_seconds = own_seconds
+        for ingredient in entry.ingredients:
+            units = ingredient.ingredient_demand_quantity
+            child_key = (ingredient.part_id, STANDARD_RECIPE)
+            if child_key not in graph.recipes:
+                raw_resources[ingredient.part_id] = raw_resources.get(ingredient.part_id, 0) + units
+                continue
+            child_cost = costs[child_key]
+            if child_cost is None:
+                break
+            for raw_part_id, raw_units in child_cost.raw_resources.items():
+                raw_resources[raw_part_id] = raw_resources.get(raw_part_id, 0) + units * raw_units
+            for machine, seconds in child_cost.machine_seconds_by_machine.items():
+                machine_seconds_by_machine[machine] = machine_seconds_by_machine.get(machine, 0) + units * seconds
+            machine_seconds += units * child_cost.machine_seconds
+        else:
+            costs[key] = RecipeCost(raw_resources, machine_seconds, machine_seconds_by_machine)
+            continue
+        costs[key] = None
+
+    logger.info(f"✅ Recipe costs built for {len(costs)} recipes ({sum(cost is None for cost in costs.values())} circular)")
+    return costs
+
+def get_recipe_costs():
+    """Return the cached {(part_id, recipe_name): RecipeCost} table for the current reference data version."""
+    return get_reference_data("recipe_costs", lambda: build_recipe_costs(get_recipe_graph()))
+
+def get_recipe_cost(part_id, recipe_name=STANDARD_RECIPE):
+    """Return the RecipeCost for one recipe, or None if the recipe does not exist or is circular."""
+    return get_recipe_costs().get((int(part_id), recipe_name))
+
+def scale_recipe_cost(cost, quantity, graph=None):
+    """Return the cost of producing quantity units as a JSON-ready dict."""
+    if graph is None:
+        graph = get_recipe_graph()
+    return {
+        "Raw Resources": [
+            {"Part ID": part_id, "Part Name": graph.get_part_name(part_id), "Quantity": units * quantity}
+            for part_id, units in cost.raw_resources.items()
+        ],
+        "Machine Seconds": cost.machine_seconds * quantity,
+        "Machine Seconds By Machine": {
+            str(machine): seconds * quantity for machine, seconds in cost.machine_seconds_by_machine.items()
+        },
+    }
@@ -0,0 +1,205 @@
+# Description: This module holds the in-memory recipe graph used by build_tree.
+# The graph is loaded once per process from the part and recipe tables and reloaded when the reference data version changes.
+# Each recipe is keyed by (part_id, recipe_name) and its ingredients are resolved to part ids up front,
+# so walking a production tree needs no database round-trips.
+
+from collections import namedtuple, OrderedDict
+import threading
+from sqlalchemy import text
+from . import db
+from .reference_data import get_reference_data
+from .logging_util import setup_logger
+
+logger = setup_logger("recipe_graph")
+
+# Ingredients with these source levels are not part of the production chain (see build_tree)
+SKIPPED_SOURCE_LEVELS = (-2, 11)
+
+RecipeEntry = namedtuple("RecipeEntry", [
+    "part_id",
+    "recipe_name",
+    "produced_in",
+    "part_supply_pm",
+    "part_supply_quantity",
+    "part_cycle_time_sec",
+    "byproduct",
+    "byproduct_supply_pm",
+    "byproduct_supply_quantity",
+    "ingredients",
+])
+
+Ingredient = namedtuple("Ingredient", [
+    "part_id",
+    "part_name",
+    "source_level",
+    "ingredient_demand_pm",
+    "ingredient_demand_quantity",
+])
+
+
+class RecipeGraph:
+    """Recipes keyed by (part_id, recipe_name) with ingredients resolved to part ids."""
+
+    def __init__(self, part_rows, recipe_rows):
+        self.part_names = {}  # part_id -> part_name
+        self.part_ids = {}  # part_name -> part_id (lowest id wins, as the old name lookup did)
+        self.recipes = {}  # (part_id, recipe_name) -> RecipeEntry
+        self.subtree_memos = OrderedDict()  # selection set -> unit subtrees built from this graph (see build_tree)
+        self.subtree_memos_lock = threading.Lock()
+
+        for row in part_rows:
+            self.part_names[row.id] = row.part_name
+            self.part_ids.setdefault(row.part_name, row.id)
+
+        for row in recipe_rows:
+            if row.part_id not in self.part_names:
+                continue
+            key = (row.part_id, row.recipe_name)
+            entry = self.recipes.get(key)
+            if entry is None:
+                # The first row of a recipe carries the recipe-level values
+                entry = RecipeEntry(
+                    part_id=row.part_id,
+                    recipe_name=row.recipe_name,
+                    produced_in=row.produced_in_automated,
+                    part_supply_pm=row.part_supply_pm,
+                    part_supply_quantity=row.part_supply_quantity,
+                    part_cycle_time_sec=row.part_cycle_time_sec,
+                    byproduct=row.byproduct,
+                    byproduct_supply_pm=row.byproduct_supply_pm,
+                    byproduct_supply_quantity=row.byproduct_supply_quantity,
+                    ingredients=[],
+                )
+                self.recipes[key] = entry
+
+            if row.source_level in SKIPPED_SOURCE_LEVELS:
+                continue
+            ingredient_part_id = self.part_ids.get(row.ingredient)
+            if not ingredient_part_id:
+                continue
+            entry.ingredients.append(Ingredient(
+                part_id=ingredient_part_id,
+                part_name=row.ingredient,
+                source_level=row.source_level,
+                ingredient_demand_pm=row.ingredient_demand_pm,
+                ingredient_demand_quantity=row.ingredient_demand_quantity or 0,
+            ))
+
+        logger.info(f"✅ Recipe graph loaded: {len(self.part_names)} parts, {len(self.recipes)} recipes")
+
+    def __getstate__(self):
+        # Worker processes get the recipes only; memos are rebuilt there and locks cannot be pickled
+        state = self.__dict__.copy()
+        del state["subtree_memos"], state["subtree_memos_lock"]
+        return state
+
+    def __setstate__(self, state):
+        self.__dict__.update(state)
+        self.subtree_memos = OrderedDict()
+        self.subtree_memos_lock = threading.Lock()
+
+    def get_recipe(self, part_id, recipe_name):
+        """Return the RecipeEntry for (part_id, recipe_name) or None if it does not exist."""
+        return self.recipes.get((part_id, recipe_name))
+
+    def get_part_name(self, part_id):
+        return self.part_names.get(part_id)
+
+    def get_part_id(self, part_name):
+        return self.part_ids.get(part_name)
+
+    def get_successors(self, selected_recipes):
+        """
+        Return {(part_id, recipe_name): [(ingredient part_id, recipe_name), ...]} for every recipe,
+        following build_tree's rule that an ingredient uses its selected recipe or else its parent's recipe name.
+        Ingredients whose recipe does not exist are left out (they are leaves).
+        """
+        successors = {}
+        for key, entry in self.recipes.items():
+            children = []
+            for ingredient in entry.ingredients:
+                child_key = (ingredient.part_id, selected_recipes.get(ingredient.part_id) or key[1])
+                if child_key in self.recipes:
+                    children.append(child_key)
+            successors[key] = children
+        return successors
+
+    def find_cycle_reaching_keys(self, selected_recipes):
+        """
+        Return the set of (part_id, recipe_name) keys that are part of, or lead into, a circular dependency
+        under the given recipe selections. Everything else expands to the same subtree wherever it appears.
+        """
+        successors = self.get_successors(selected_recipes)
+        cycle_reaching = set()
+        # Components come out successors first, so each one only needs to look at components already seen
+        for component in find_strongly_connected_components(successors):
+            members = set(component)
+            cyclic = len(component) > 1 or component[0] in successors[component[0]]
+            if cyclic or any(child in cycle_reaching for key in component for child in successors[key] if child not in members):
+                cycle_reaching.update(members)
+        return cycle_reaching
+
+
+def find_strongly_connected_components(successors):
+    """Tarjan's algorithm with an explicit stack. Returns the components in reverse topological order."""
+    index = {}
+    lowlink = {}
+    stack = []
+    on_stack = set()
+    components = []
+
+    for start in successors:
+        if start in index:
+            continue
+        index[start] = lowlink[start] = len(index)
+        stack.append(start)
+        on_stack.add(start)
+        work = [(start, iter(successors[start]))]
+        while work:
+            node, children = work[-1]
+            descended = False
+            for child in children:
+                if child not in index:
+                    index[child] = lowlink[child] = len(index)
+                    stack.append(child)
+                    on_stack.add(child)
+                    work.append((child, iter(successors[child])))
+                    descended = True
+                    break
+                if child in on_stack:
+                    lowlink[node] = min(lowlink[node], index[child])
+            if descended:
+                continue
+
+            work.pop()
+            if work:
+                parent = work[-1][0]
+                lowlink[parent] = min(lowlink[parent], lowlink[node])
+            if lowlink[node] == index[node]:
+                component = []
+                while True:
+                    member = stack.pop()
+                    on_stack.discard(member)
+                    component.append(member)
+                    if member == node:
+                        break
+                components.append(component)
+    return components
+
+
+def load_recipe_graph():
+    """Read the part and recipe tables and build a RecipeGraph."""
+    part_rows = db.session.execute(text("SELECT id, part_name FROM part ORDER BY id")).fetchall()
+    recipe_rows = db.session.execute(text("""
+        SELECT part_id, recipe_name, ingredient, source_level, ingredient_demand_pm, ingredient_demand_quantity,
+               part_supply_pm, part_supply_quantity, part_cycle_time_sec, produced_in_automated,
+               byproduct, byproduct_supply_pm, byproduct_supply_quantity
+        FROM recipe
+        ORDER BY id
+    """)).fetchall()
+    return RecipeGraph(part_rows, recipe_rows)
+
+
+def get_recipe_graph():
+    """Return the process-wide RecipeGraph, reloading it when the reference data version changes."""
+    return get_reference_data("recipe_graph", load_recipe_graph)
@@ -0,0 +1,65 @@
+# Description: This module provides each user's effective recipe map ({part_id: recipe_name}).
+# The map is loaded from user_selected_recipe in a single query and cached per user (least recently used users are evicted).
+# It is invalidated when the user changes a selection through /api/selected_recipes or when the reference data version changes.
+
+from collections import OrderedDict
+import threading
+from flask import current_app
+from sqlalchemy import text
+from . import db
+from .data_version import get_data_version, bump_data_version
+from .reference_data import get_reference_data_version
+from .logging_util import setup_logger
+
+logger = setup_logger("recipe_selection")
+
+USER_SELECTION = "user_selection"  # data_version category, one counter per user
+
+_effective_recipe_maps = OrderedDict()  # user_id -> (selection version, reference data version, {part_id: recipe_name})
+_effective_recipe_maps_lock = threading.Lock()
+
+def load_effective_recipe_map(user_id):
+    """Load the user's selected recipes as {part_id: recipe_name}. The first selection per part wins."""
+    selected_recipe_query = """
+        SELECT usr.part_id, r.recipe_name
+        FROM user_selected_recipe usr
+        JOIN recipe r ON usr.recipe_id = r.id
+        WHERE usr.user_id = :user_id
+        ORDER BY usr.id
+    """
+    effective_recipes = {}
+    for row in db.session.execute(text(selected_recipe_query), {"user_id": user_id}):
+        effective_recipes.setdefault(row.part_id, row.recipe_name)
+    return effective_recipes
+
+def get_effective_recipe_map(user_id):
+    """
+    Return the cached {part_id: recipe_name} map for the user.
+    The returned dict is shared between requests and must not be modified.
+    """
+    versions = (get_data_version(USER_SELECTION, user_id), get_reference_data_version())
+    with _effective_recipe_maps_lock:
+        cached = _effective_recipe_maps.get(user_id)
+        if cached and cached[:2] == versions:
+            _effective_recipe_maps.move_to_end(user_id)
+            return cached[2]
+
+    effective_recipes = load_effective_recipe_map(user_id)
+    max_users = current_app.config.get("EFFECTIVE_RECIPE_CACHE_SIZE", 256)
+    with _effective_recipe_maps_lock:
+        _effective_recipe_maps[user_id] = versions + (effective_recipes,)
+        _effective_recipe_maps.move_to_end(user_id)
+        while len(_effective_recipe_maps) > max_users:
+            _effective_recipe_maps.popitem(last=False)
+    return effective_recipes
+
+def get_current_user_recipe_map():
+    """Return the effective recipe map of the logged-in user (request handlers only)."""
+    from flask_login import current_user
+    return get_effective_recipe_map(current_user.id)
+
+def invalidate_effective_recipe_map(user_id):
+    """Drop the user's cached map and bump their selection version so other workers reload it too."""
+    with _effective_recipe_maps_lock:
+        _effective_recipe_maps.pop(user_id, None)
+    return bump_data_version(USER_SELECTION, user_id)
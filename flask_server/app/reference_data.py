@@ -0,0 +1,121 @@
+# Description: This module caches reference data (parts, machines, conveyor and pipeline speeds etc.) in memory.
+# Each cached value is tagged with the reference data version it was loaded at and is reloaded only when
+# an admin write bumps that version (see data_version.py).
+
+import threading
+from sqlalchemy import text
+from . import db
+from .data_version import get_data_version, REFERENCE_DATA
+from .logging_util import setup_logger
+
+logger = setup_logger("reference_data")
+
+_cache = {}  # name -> (version, value)
+_cache_lock = threading.RLock()  # re-entrant so a loader can read other reference data (e.g. recipe_costs reads the recipe graph)
+
+def get_reference_data(name, loader):
+    """Return the cached value for name, calling loader() if it is missing or out of date."""
+    version = get_data_version(REFERENCE_DATA)
+    cached = _cache.get(name)
+    if cached and cached[0] == version:
+        return cached[1]
+
+    with _cache_lock:
+        cached = _cache.get(name)
+        if cached and cached[0] == version:
+            return cached[1]
+        value = loader()
+        _cache[name] = (version, value)
+    logger.info(f"🔄 Loaded reference data '{name}' at version {version}")
+    return value
+
+def get_reference_data_version():
+    """Return the reference data version the caches are keyed on."""
+    return get_data_version(REFERENCE_DATA)
+
+def _load_part_name_index():
+    rows = db.session.execute(text("SELECT id, part_name FROM part ORDER BY id")).fetchall()
+    index = {}
+    for row in rows:
+        index.setdefault(row.part_name, row.id)
+    return index
+
+def get_part_name_index():
+    """Return {part_name: part_id}."""
+    return get_reference_data("part_name_index", _load_part_name_index)
+
+def get_machine_class_map():
+    """Return {save_file_class_name: machine_id}."""
+    return get_reference_data("machine_class_map", lambda: {
+        row.save_file_class_name: row.id
+        for row in db.session.execute(text("SELECT id, save_file_class_name FROM machine ORDER BY id"))
+    })
+
+def get_machine_names():
+    """Return {machine_id: machine_name}."""
+    return get_reference_data("machine_names", lambda: {
+        row.id: row.machine_name
+        for row in db.session.execute(text("SELECT id, machine_name FROM machine ORDER BY id"))
+    })
+
+def get_recipe_mappings():
+    """Return {save_file_recipe: recipe_id}."""
+    return get_reference_data("recipe_mappings", lambda: {
+        row.save_file_recipe: row.recipe_id
+        for row in db.session.execute(text("SELECT save_file_recipe, recipe_id FROM recipe_mapping ORDER BY id"))
+    })
+
+def get_resource_nodes():
+    """Return {save_file_path_name: resource_node_id}."""
+    return get_reference_data("resource_nodes", lambda: {
+        row.save_file_path_name: row.id
+        for row in db.session.execute(text("SELECT id, save_file_path_name FROM resource_node ORDER BY id"))
+    })
+
+def get_resource_node_parts():
+    """Return {resource_node_id: part_id}."""
+    return get_reference_data("resource_node_parts", lambda: {
+        row.id: row.part_id
+        for row in db.session.execute(text("SELECT id, part_id FROM resource_node ORDER BY id"))
+    })
+
+def get_raw_resource_recipes():
+    """Return {part_id: recipe_id} of the _Standard recipe for every part mined from a resource node."""
+    return get_reference_data("raw_resource_recipes", lambda: {
+        row.part_id: row.id
+        for row in db.session.execute(text("""
+            SELECT r.id, r.part_id
+            FROM recipe r
+            WHERE r.recipe_name = '_Standard'
+            AND r.part_id IN (SELECT part_id FROM resource_node)
+            ORDER BY r.id
+        """))
+    })
+
+def get_conveyor_levels():
+    """Return {conveyor_level_id: conveyor_level}."""
+    return get_reference_data("conveyor_levels", lambda: {
+        row.id: row.conveyor_level
+        for row in db.session.execute(text("SELECT id, conveyor_level FROM conveyor_level ORDER BY id"))
+    })
+
+def get_conveyor_speeds():
+    """Return {conveyor_level_id: supply_pm}."""
+    return get_reference_data("conveyor_speeds", lambda: {
+        row.conveyor_level_id: row.supply_pm
+        for row in db.session.execute(text("SELECT conveyor_level_id, supply_pm FROM conveyor_supply ORDER BY id"))
+    })
+
+def get_pipeline_flow_rates():
+    """Return {pipeline_level: supply_pm}, keeping the first supply row per level."""
+    def load():
+        rates = {}
+        for row in db.session.execute(text("""
+            SELECT pl.pipeline_level, ps.supply_pm
+            FROM pipeline_supply ps
+            JOIN pipeline_level pl ON ps.pipeline_level_id = pl.id
+            ORDER BY ps.id
+        """)):
+            rates.setdefault(row.pipeline_level, row.supply_pm)
+        return rates
+    return get_reference_data("pipeline_flow_rates", load)
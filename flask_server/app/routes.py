@@ -32,10 +32,26 @@ from .models import (User,
                      SupportResponse,
                      SupportDraft,
                      UserActionTokens)
-from sqlalchemy.exc import SQLAlchemyError
+from sqlalchemy.exc import SQLAlchemyError, IntegrityError
 from . import db
-from .build_tree import build_tree
+from .build_tree import build_tree, build_flat_bom, build_tree_dag, build_trees, expand_tree_node
+from .production_solver import solve_production
+from .tracker_reports import (get_cached_tracker_reports, get_report_versions, iter_tracker_reports, refresh_tracker_reports,
+                              warm_tracker_reports)
+from .single_flight import single_flight
+from .etag import compute_etag, get_user_versions, conditional_response
+from .production_report import build_production_report, build_machine_usage_report, load_user_save_rows
+from .tracker_dashboard import build_tracker_dashboard, iter_dashboard_sections
+from .streaming import wants_ndjson, ndjson_response
+from .recipe_costs import get_recipe_costs, scale_recipe_cost
+from .scenarios import (load_scenarios, load_scenario, save_scenario, delete_scenario, evaluate_scenario, compare_scenarios,
+                        ScenarioError)
 from .build_connection_graph import format_graph_for_frontend, build_factory_graph
+from .save_generation import get_active_generation, active_generation_clause
+from .data_version import bump_data_version, USER_SAVE, USER_TRACKER
+from .reference_data import get_machine_names
+from .recipe_graph import get_recipe_graph
+from .recipe_selection import get_effective_recipe_map, invalidate_effective_recipe_map, USER_SELECTION
 from werkzeug.security import check_password_hash, generate_password_hash
 from werkzeug.utils import secure_filename
 from itsdangerous import URLSafeTimedSerializer
@@ -110,9 +126,6 @@ API_KEY = config.RECAPTCHA_API_KEY
 UPLOAD_FOLDER = config.UPLOAD_FOLDER
 ALLOWED_EXTENSIONS = config.ALLOWED_EXTENSIONS
 
-# Simulated processing tracker
-PROCESSING_STATUS = {}
-
 #logger.info(f"UPLOAD_FOLDER: {UPLOAD_FOLDER}")
 if not os.path.exists(UPLOAD_FOLDER):
     os.makedirs(UPLOAD_FOLDER)
@@ -419,15 +432,221 @@ def build_tree_route():
     target_parts_pm = request.args.get('target_parts_pm')
     target_timeframe = request.args.get('target_timeframe')
     visited = request.args.get('visited')
+    mode = request.args.get('mode', 'tree')
+    response_format = request.args.get('format', 'nested')
+    depth = request.args.get('depth', type=int)
 
     if not part_id:
         logger.error("❌ part_id is required")
         return jsonify({"error": "part_id is required"}), 400
-    
-    result = build_tree(part_id, recipe_name, target_quantity, target_parts_pm, target_timeframe, visited)
-    #logger.info(f"Build Tree Result: {result}")
+    if depth is not None and depth < 1:
+        return jsonify({"error": "depth must be at least 1"}), 400
+    
+    def compute():
+        if mode == 'flat':
+            # Aggregated bill of materials: one row per part, recipe and machine
+            return build_flat_bom(part_id, recipe_name, target_quantity, target_parts_pm, target_timeframe)
+        elif response_format == 'dag':
+            # Shared intermediates are listed once as nodes, linked by edges carrying the ingredient multipliers
+            return build_tree_dag(part_id, recipe_name, target_quantity, target_parts_pm, target_timeframe)
+        return build_tree(part_id, recipe_name, target_quantity, target_parts_pm, target_timeframe, visited, depth=depth)
+
+    # Identical requests that arrive while this one is computing wait for it and share the result
+    user_id = getattr(current_user, "id", None)
+    etag = compute_etag("build_tree", get_user_versions(user_id, USER_SELECTION), request.args.to_dict(flat=False))
+    return conditional_response(etag, lambda: jsonify(single_flight(user_id, "build_tree", request.args, compute)))
+
+@main.route('/api/build_tree/node', methods=['GET'])
+def build_tree_node_route():
+    """Expand one entry of a tree built with depth. path is repeated once per ingredient name from the root."""
+    part_id = request.args.get('part_id')
+    recipe_name = request.args.get('recipe_name', '_Standard')
+    path = request.args.getlist('path')
+    required_quantity = request.args.get('required_quantity')
+    required_parts_pm = request.args.get('required_parts_pm')
+    depth = request.args.get('depth', type=int)
+
+    if not part_id or not path:
+        logger.error("❌ part_id and path are required")
+        return jsonify({"error": "part_id and path are required"}), 400
+    if depth is not None and depth < 1:
+        return jsonify({"error": "depth must be at least 1"}), 400
+
+    result = expand_tree_node(part_id, recipe_name, path, required_quantity, required_parts_pm, depth)
+    if "Error" in result:
+        return jsonify(result), 404
     return jsonify(result)
 
+@main.route('/api/build_trees', methods=['POST'])
+def build_trees_route():
+    """Build the trees for a list of targets in one pass, sharing the selection map and subtree memoization."""
+    data = request.get_json(silent=True) or {}
+    targets = data.get("targets") if isinstance(data, dict) else None
+    mode = request.args.get('mode', 'tree')
+    response_format = request.args.get('format', 'nested')
+
+    if not isinstance(targets, list) or not targets:
+        logger.error("❌ targets are required")
+        return jsonify({"error": "targets are required"}), 400
+    if any(not isinstance(target, dict) or not target.get("part_id") for target in targets):
+        logger.error("❌ part_id is required for every target")
+        return jsonify({"error": "part_id is required for every target"}), 400
+
+    if mode == 'flat':
+        builder = build_flat_bom
+    elif response_format == 'dag':
+        builder = build_tree_dag
+    else:
+        builder = build_tree
+
+    try:
+        results = single_flight(getattr(current_user, "id", None), "build_trees", {"args": request.args.to_dict(flat=False), "targets": targets},
+                                lambda: build_trees(targets, builder))
+    except (TypeError, ValueError) as e:
+        logger.error(f"❌ Invalid build_trees target: {e}")
+        return jsonify({"error": "Invalid target values"}), 400
+    return jsonify(results)
+
+@main.route('/api/production_plan', methods=['POST'])
+@login_required
+def production_plan():
+    """
+    Solve one combined production plan with the matrix solver.
+    Body: {"targets": [...], "include_tracker": bool, "phase_ids": [...]} - tracked parts and assembly phase parts are added to the targets.
+    """
+    data = request.get_json(silent=True) or {}
+    targets = list(data.get("targets") or [])
+
+    if data.get("include_tracker"):
+        tracked_parts = db.session.execute(text("""
+            SELECT t.part_id, t.target_quantity, t.target_parts_pm, t.target_timeframe, r.recipe_name
+            FROM tracker t
+            JOIN recipe r ON t.recipe_id = r.id
+            WHERE t.user_id = :user_id
+        """), {"user_id": current_user.id}).fetchall()
+        targets += [{
+            "part_id": part.part_id,
+            "recipe_name": part.recipe_name,
+            "target_quantity": part.target_quantity,
+            "target_parts_pm": part.target_parts_pm,
+            "target_timeframe": part.target_timeframe,
+        } for part in tracked_parts]
+
+    phase_ids = data.get("phase_ids") or []
+    if phase_ids:
+        phase_parts = Project_Assembly_Parts.query.filter(Project_Assembly_Parts.phase_id.in_(phase_ids)).all()
+        targets += [{
+            "part_id": part.phase_part_id,
+            "target_quantity": part.phase_part_quantity,
+            "target_parts_pm": part.phase_target_parts_pm,
+            "target_timeframe": part.phase_target_timeframe,
+        } for part in phase_parts]
+
+    if not targets:
+        return jsonify({"error": "No targets to solve"}), 400
+    if any(not isinstance(target, dict) or not target.get("part_id") for target in targets):
+        logger.error("❌ part_id is required for every target")
+        return jsonify({"error": "part_id is required for every target"}), 400
+
+    try:
+        plan = solve_production(targets)
+    except (TypeError, ValueError) as e:
+        logger.error(f"❌ Invalid production plan target: {e}")
+        return jsonify({"error": "Invalid target values"}), 400
+    if "Error" in plan:
+        return jsonify(plan), 422
+    return jsonify(plan)
+
+@main.route('/api/scenarios', methods=['GET'])
+@login_required
+def get_scenarios():
+    """List the user's recipe scenarios with their overrides."""
+    return jsonify(load_scenarios(current_user.id))
+
+@main.route('/api/scenarios', methods=['POST'])
+@main.route('/api/scenarios/<int:scenario_id>', methods=['PUT'])
+@login_required
+def save_scenario_route(scenario_id=None):
+    """Create or replace a scenario. Body: {"scenario_name": str, "overrides": [{"part_id", "recipe_id"}]}."""
+    data = request.get_json(silent=True) or {}
+    try:
+        saved_id = save_scenario(current_user.id, data.get("scenario_name"), data.get("overrides") or [], scenario_id)
+    except ScenarioError as e:
+        db.session.rollback()
+        return jsonify({"error": str(e)}), 400
+    except IntegrityError:
+        db.session.rollback()
+        return jsonify({"error": "A scenario with this name already exists"}), 409
+    if saved_id is None:
+        return jsonify({"error": "Scenario not found"}), 404
+    return jsonify(load_scenario(current_user.id, saved_id)), 200 if scenario_id else 201
+
+@main.route('/api/scenarios/<int:scenario_id>', methods=['DELETE'])
+@login_required
+def delete_scenario_route(scenario_id):
+    if not delete_scenario(current_user.id, scenario_id):
+        return jsonify({"error": "Scenario not found"}), 404
+    return jsonify({"message": "Scenario deleted successfully"}), 200
+
+@main.route('/api/scenarios/<int:scenario_id>/evaluate', methods=['GET'])
+@login_required
+def evaluate_scenario_route(scenario_id):
+    """
+    Build the user's tracked parts with the scenario's overrides applied on top of their selections.
+    mode=flat returns flat bills of materials instead of nested trees. Selections are not changed.
+    """
+    mode = request.args.get('mode', 'tree')
+    if mode not in ('tree', 'flat'):
+        return jsonify({"error": "mode must be tree or flat"}), 400
+    result = evaluate_scenario(current_user.id, scenario_id, mode)
+    if result is None:
+        return jsonify({"error": "Scenario not found"}), 404
+    return jsonify(result)
+
+@main.route('/api/scenarios/compare', methods=['POST'])
+@login_required
+def compare_scenarios_route():
+    """
+    Compare scenarios with the current selections by machine counts and raw resources.
+    Body: {"scenario_ids": [...], "targets": [...] (optional, defaults to the tracked parts)}.
+    """
+    data = request.get_json(silent=True) or {}
+    scenario_ids = data.get("scenario_ids") or []
+    targets = data.get("targets")
+    if not scenario_ids:
+        return jsonify({"error": "scenario_ids is required"}), 400
+    if targets is not None and any(not isinstance(target, dict) or not target.get("part_id") for target in targets):
+        return jsonify({"error": "part_id is required for every target"}), 400
+
+    try:
+        comparison = compare_scenarios(current_user.id, [int(scenario_id) for scenario_id in scenario_ids], targets)
+    except (TypeError, ValueError) as e:
+        logger.error(f"❌ Invalid scenario comparison request: {e}")
+        return jsonify({"error": "Invalid scenario ids or target values"}), 400
+    if comparison is None:
+        return jsonify({"error": "Scenario not found"}), 404
+    return jsonify(comparison)
+
+@main.route('/api/recipe_costs/<int:part_id>', methods=['GET'])
+def recipe_costs(part_id):
+    """Compare the raw-resource and machine cost of every recipe for a part, scaled to quantity (default 1)."""
+    quantity = request.args.get('quantity', 1, type=float)
+    graph = get_recipe_graph()
+    costs = get_recipe_costs()
+
+    results = []
+    for (cost_part_id, recipe_name), cost in costs.items():
+        if cost_part_id != part_id:
+            continue
+        result = {"Recipe": recipe_name, "Circular": cost is None}
+        if cost is not None:
+            result.update(scale_recipe_cost(cost, quantity, graph))
+        results.append(result)
+
+    if not results:
+        return jsonify({"error": f"No recipes found for part_id {part_id}"}), 404
+    return jsonify(results)
+
 @main.route('/api/get_system_status', methods=['GET'])
 @login_required
 def system_status():
@@ -513,6 +732,8 @@ def update_row(table_name, row_id):
     update_query = text(f"UPDATE {table_name} SET {', '.join(f'{key} = :{key}' for key in data.keys())} WHERE id = :id")
     db.session.execute(update_query, {**data, "id": row_id})
     db.session.commit()
+    if table_name in config.REFERENCE_TABLES:
+        bump_data_version()
     return jsonify({"message": "Row updated successfully"})
 
 # Adding a POST route for creating a new row
@@ -539,6 +760,8 @@ def create_row(table_name):
     try:
         db.session.execute(query, data)
         db.session.commit()
+        if table_name in config.REFERENCE_TABLES:
+            bump_data_version()
         return jsonify({"message": "Row created successfully"}), 201
     except Exception as e:
         db.session.rollback()
@@ -555,6 +778,8 @@ def delete_row(table_name, row_id):
         delete_query = text(f"DELETE FROM {table_name} WHERE id = :id")
         db.session.execute(delete_query, {"id": row_id})
         db.session.commit()
+        if table_name in config.REFERENCE_TABLES:
+            bump_data_version()
         return jsonify({"message": "Row deleted successfully"})
     except Exception as e:
         db.session.rollback()
@@ -642,42 +867,19 @@ def get_tracker_reports():
     user_id = current_user.id
 
     try:
-        # Query the tracker table for the user's tracked parts
-        query = """
-            SELECT t.part_id, t.recipe_id, t.target_quantity, t.target_parts_pm, t.target_timeframe ,p.part_name, r.recipe_name
-            FROM tracker t
-            JOIN part p ON t.part_id = p.id
-            JOIN recipe r ON t.recipe_id = r.id
-            WHERE t.user_id = :user_id
-        """
-        tracked_parts = db.session.execute(text(query), {"user_id": user_id}).fetchall()
-        logging.info(f"Tracked parts: {tracked_parts}")
-
-        # Generate dependency trees for each tracked part
-        reports = []
-        for part in tracked_parts:
-            part_id = part.part_id
-            recipe_name = part.recipe_name
-            target_quantity = part.target_quantity
-            target_ppm = part.target_parts_pm
-            target_timeframe = part.target_timeframe
-
-            logging.info(f"Generating tracker report for part_id: {part_id}, recipe_name: {recipe_name}, target_quantity: {target_quantity}, target_parts_pm: {target_ppm}, target_timeframe: {target_timeframe}")
-
-            # Call build_tree for each tracked part
-            logging.info(f"Building tree for part_id: {part_id}, recipe_name: {recipe_name}, target_quantity: {target_quantity}, target_parts_pm: {target_ppm}, target_timeframe: {target_timeframe}")
-            tree = build_tree(part_id, recipe_name, target_quantity, target_ppm, target_timeframe)
-            reports.append({
-                "part_id": part_id,
-                "part_name": part.part_name,
-                "recipe_name": recipe_name,
-                "target_quantity": target_quantity,
-                "target_parts_pm": target_ppm,
-                "target_timeframe": target_timeframe,
-                "tree": tree
-            })
-
-        return jsonify(reports), 200
+        def build_response():
+            # Served from the per-user cache unless the tracker, selections, save or reference data changed
+            reports = single_flight(user_id, "tracker_reports", request.args, lambda: get_cached_tracker_reports(user_id),
+                                    versions=get_report_versions(user_id))
+            logging.info(f"Tracked parts: {[(report['part_id'], report['recipe_name']) for report in reports]}")
+            return jsonify(reports), 200
+
+        # With Accept: application/x-ndjson each report is sent on its own line as soon as its tree is built.
+        # Streams are not revalidated with an ETag, since they may end in an error line after the 200 was sent.
+        if wants_ndjson():
+            return ndjson_response(iter_tracker_reports(user_id), "Failed to generate tracker reports")
+        etag = compute_etag("tracker_reports", get_user_versions(user_id, USER_SELECTION, USER_TRACKER), request.args.to_dict(flat=False))
+        return conditional_response(etag, build_response)
     except Exception as e:
         logger.error(f"❌ Error generating tracker reports: {e}")
         return jsonify({"error": "Failed to generate tracker reports"}), 500
@@ -726,6 +928,7 @@ def add_to_tracker():
     #logger.info(f"New tracker entry: {new_tracker_entry}")
     db.session.add(new_tracker_entry)
     db.session.commit()
+    bump_data_version(USER_TRACKER, current_user.id)
     #logger.info(f"Part and recipe added to tracker successfully, {part_id}, {recipe_id}")
     return jsonify({"message": "Part and recipe added to tracker successfully"}), 200
 
@@ -760,6 +963,7 @@ def delete_tracker_item(tracker_id):
 
         db.session.delete(tracker_item)
         db.session.commit()
+        bump_data_version(USER_TRACKER, current_user.id)
         return jsonify({"message": "Tracker item deleted successfully"}), 200
     except Exception as e:
         logger.error(f"Error deleting tracker item: {e}")
@@ -787,6 +991,7 @@ def update_tracker_item(tracker_id):
         tracker_item.target_timeframe = target_timeframe  # NEW
 
         db.session.commit()
+        bump_data_version(USER_TRACKER, current_user.id)
         return jsonify({"message": "Tracker item updated successfully"}), 200
     except Exception as e:
         logger.error(f"❌ Error updating tracker item: {e}")
@@ -810,6 +1015,14 @@ def get_selected_recipes():
         logger.error(f"❌ Error fetching selected recipes: {e}")
         return jsonify({"error": "Failed to fetch selected recipes"}), 500
     
+def get_tracker_changes(user_id):
+    """Return the tracker tree branches affected by the user's latest selection change, or None if they could not be built."""
+    try:
+        return refresh_tracker_reports(user_id)
+    except Exception as e:
+        logger.error(f"❌ Error refreshing tracker reports for user {user_id}: {e}")
+        return None
+
 @main.route('/api/selected_recipes', methods=['POST'])
 @login_required
 def add_or_update_selected_recipe():
@@ -831,7 +1044,8 @@ def add_or_update_selected_recipe():
         """
         db.session.execute(text(query), {"user_id": user_id, "part_id": part_id, "recipe_id": recipe_id})
         db.session.commit()
-        return jsonify({"message": "Selected recipe updated successfully"}), 200
+        invalidate_effective_recipe_map(user_id)
+        return jsonify({"message": "Selected recipe updated successfully", "tracker_changes": get_tracker_changes(user_id)}), 200
     except Exception as e:
         logger.error(f"❌ Error updating selected recipe: {e}")
         return jsonify({"error": "Failed to update selected recipe"}), 500
@@ -850,10 +1064,8 @@ def delete_selected_recipe(recipe_id):
         
         db.session.execute(text(query), {"user_id": user_id, "recipe_id": recipe_id})
         db.session.commit()
-        
-        # logger.info(f"Selected recipe deleted successfully: Recipe {recipe_id}, User {user_id}")
-        
-        return jsonify({"message": "Selected recipe deleted successfully"}), 200
+        invalidate_effective_recipe_map(user_id)
+        return jsonify({"message": "Selected recipe deleted successfully", "tracker_changes": get_tracker_changes(user_id)}), 200
     except Exception as e:
         logger.error(f"❌ Error deleting selected recipe: {e}")
         return jsonify({"error": "Failed to delete selected recipe"}), 500
@@ -897,7 +1109,7 @@ def log_message():
 
 @main.route("/api/upload_sav", methods=["POST"])
 def upload_sav():
-    from app.read_save_file import process_save_file  # Move import inside the function to avoid circular import
+    from app.ingest_jobs import submit_ingest_job  # Move import inside the function to avoid circular import
     if "file" not in request.files:
         return jsonify({"error": "No file part"}), 400
 
@@ -906,78 +1118,44 @@ def upload_sav():
     if file.filename == "":
         return jsonify({"error": "No selected file"}), 400
 
-    if file and allowed_file(file.filename):
-        filename = secure_filename(file.filename)
-        filepath = os.path.join(UPLOAD_FOLDER, filename)
-        file.save(filepath)
+    if not allowed_file(file.filename):
+        return jsonify({"error": "Invalid file type"}), 400
 
-          # Assign processing ID
-        processing_id = str(uuid.uuid4())
-        PROCESSING_STATUS[processing_id] = "processing"
+    # Assign processing ID. Each upload gets its own folder, so saves with the same name cannot overwrite a queued one
+    processing_id = str(uuid.uuid4())
+    filename = secure_filename(file.filename)
+    upload_dir = os.path.join(UPLOAD_FOLDER, processing_id)
+    os.makedirs(upload_dir, exist_ok=True)
+    filepath = os.path.join(upload_dir, filename)
+    file.save(filepath)
 
-        # Process file in a background task
-        try:
-            user_id = current_user.id  
-            # logger.info(f"BEFORE PROCESS_SAVE_FILE CALL - Processing file: {filename} for user ID: {user_id}")
-            process_save_file(filepath, user_id)
-            PROCESSING_STATUS[processing_id] = "completed"
-        except Exception as e:
-            PROCESSING_STATUS[processing_id] = "failed"
-            return jsonify({"error": f"Error processing file: {str(e)}"}), 500
+    # Process file in a background worker; the client polls /api/processing_status/<processing_id>
+    try:
+        submit_ingest_job(processing_id, current_user.id, filepath, filename)
+    except Exception as e:
+        db.session.rollback()
+        logger.error(f"❌ Error queueing save file {filename}: {e}")
+        return jsonify({"error": f"Error queueing file: {str(e)}"}), 500
 
-    return jsonify({"message": f"File '{filename}' uploaded successfully!", "processing_id": processing_id}), 200
+    return jsonify({"message": f"File '{filename}' uploaded successfully!", "processing_id": processing_id}), 202
 
 @main.route("/api/processing_status/<processing_id>", methods=["GET"])
+@login_required
 def get_processing_status(processing_id):
-    status = PROCESSING_STATUS.get(processing_id, "unknown")
-    return jsonify({"status": status})
+    from app.ingest_jobs import get_ingest_job
+    job = get_ingest_job(processing_id, current_user.id)
+    if job is None:
+        return jsonify({"status": "unknown"}), 404
+    return jsonify(job)
 
 @main.route("/api/user_save", methods=["GET"])
 def get_user_save():
     user_id = current_user.id
-    user_saves = (
-        db.session.query(
-            User_Save.id,
-            Part.part_name,
-            Recipe.recipe_name,
-            Recipe.part_supply_pm,
-            User_Save.machine_id,
-            Machine.machine_name,
-            Machine_Level.machine_level,
-            Node_Purity.node_purity,
-            User_Save.machine_power_modifier,
-            User_Save.created_at,
-            User_Save.sav_file_name,
-        )
-        .join(Recipe, User_Save.recipe_id == Recipe.id, isouter=True)
-        .join(Part, Recipe.part_id == Part.id, isouter=True)
-        .join(Machine, User_Save.machine_id == Machine.id, isouter=True)
-        .join(Machine_Level, Machine.machine_level_id == Machine_Level.id, isouter=True)
-        .join(Resource_Node, User_Save.resource_node_id == Resource_Node.id, isouter=True)
-        .join(Node_Purity, Resource_Node.node_purity_id == Node_Purity.id, isouter=True)
-        .filter(User_Save.user_id == user_id)
-        #.filter(User_Save.sav_file_name == sav_file_name)  # ✅ Only return records for the relevant save file
-        .all()
-    )
+    etag = compute_etag("user_save", get_user_versions(user_id, USER_SAVE), request.args.to_dict(flat=False))
+    return conditional_response(etag, lambda: _build_user_save_response(user_id))
 
-    #logger.info(f"User Saves: {user_saves}")
-    return jsonify([
-        {
-            "id": us.id,
-            "part_name": us.part_name,
-            "recipe_name": us.recipe_name,
-            "machine_id": us.machine_id,
-            "machine_name": us.machine_name,
-            "machine_level": us.machine_level,
-            "node_purity": us.node_purity,
-            "machine_power_modifier": us.machine_power_modifier or 1,
-            "part_supply_pm": us.part_supply_pm or 0,
-            "actual_ppm": (us.part_supply_pm or 0) * (us.machine_power_modifier or 1), 
-            "created_at": us.created_at.strftime("%Y-%m-%d %H:%M:%S"),
-            "sav_file_name": us.sav_file_name,
-        } for us in user_saves
-        
-    ])
+def _build_user_save_response(user_id):
+    return jsonify(load_user_save_rows(user_id))
     
 # API: Get user settings
 @main.route('/api/user_settings', methods=['GET'])
@@ -1018,6 +1196,50 @@ def update_user_settings():
         db.session.rollback()
         return jsonify({"error": str(e)}), 500
     
+@main.route('/api/tracker_dashboard', methods=['GET'])
+@login_required
+def get_tracker_dashboard():
+    """
+    The tracker reports, production and machine usage comparisons and save data in one response.
+    With Accept: application/x-ndjson each section is streamed as a {"section", "data"} line as soon as it is ready.
+    """
+    user_id = current_user.id
+    # Streams are not revalidated with an ETag, since they may end in an error line after the 200 was sent
+    if wants_ndjson():
+        return ndjson_response(({"section": section, "data": data} for section, data in iter_dashboard_sections(user_id)),
+                               "Failed to generate tracker dashboard")
+
+    etag = compute_etag("tracker_dashboard", get_user_versions(user_id, USER_SELECTION, USER_TRACKER, USER_SAVE))
+    try:
+        return conditional_response(etag, lambda: (jsonify(build_tracker_dashboard(user_id)), 200))
+    except Exception as e:
+        logger.error(f"❌ Error generating tracker dashboard: {e}")
+        return jsonify({"error": "Failed to generate tracker dashboard"}), 500
+
+@main.route('/api/production_report', methods=['GET'])
+@login_required
+def get_stored_production_report():
+    """Target vs actual parts per minute computed from the stored tracker, recipe selections and save data."""
+    user_id = current_user.id
+    try:
+        etag = compute_etag("production_report", get_user_versions(user_id, USER_SELECTION, USER_TRACKER, USER_SAVE))
+        return conditional_response(etag, lambda: (jsonify(build_production_report(user_id)), 200))
+    except Exception as e:
+        logger.error(f"❌ Error generating production report: {e}")
+        return jsonify({"error": "Failed to generate production report"}), 500
+
+@main.route('/api/machine_usage_report', methods=['GET'])
+@login_required
+def get_stored_machine_usage_report():
+    """Target vs actual machine counts computed from the stored tracker, recipe selections and save data."""
+    user_id = current_user.id
+    try:
+        etag = compute_etag("machine_usage_report", get_user_versions(user_id, USER_SELECTION, USER_TRACKER, USER_SAVE))
+        return conditional_response(etag, lambda: (jsonify(build_machine_usage_report(user_id)), 200))
+    except Exception as e:
+        logger.error(f"❌ Error generating machine usage report: {e}")
+        return jsonify({"error": "Failed to generate machine usage report"}), 500
+
 @main.route('/api/production_report', methods=['POST'])
 @login_required
 def get_production_report():
@@ -1116,12 +1338,7 @@ def get_machine_usage_report():
                 extract_machines(report["tree"])
         # Debugging
         #logger.debug("Processing saveData for actual machine usage")
-        query = """
-            SELECT id, machine_name FROM machine
-        """
-        # Debugging
-        #logger.info(f"Mapping machines - Machine Query: {query}")
-        machine_map = {row.id: row.machine_name for row in db.session.execute(text(query))}
+        machine_map = get_machine_names()
         
         # Debugging
         #logger.info(f"Machine Map: {machine_map}")
@@ -1187,14 +1404,14 @@ def get_conveyor_supplies():
 @main.route('/api/user_save_connections', methods=['GET'])
 def get_user_save_connections():
     """Fetch all user save connections."""
-    query = text("SELECT * FROM user_save_connections")
+    query = text(f"SELECT * FROM user_save_connections usc WHERE {active_generation_clause('usc')}")
     connections = db.session.execute(query).fetchall()
     return jsonify([dict(row._mapping) for row in connections])
 
 @main.route('/api/user_save_conveyors', methods=['GET'])
 def get_user_save_conveyors():
     """Fetch all user save conveyor chains."""
-    query = text("SELECT * FROM user_save_conveyors")
+    query = text(f"SELECT * FROM user_save_conveyors usv WHERE {active_generation_clause('usv')}")
     conveyors = db.session.execute(query).fetchall()
     return jsonify([dict(row._mapping) for row in conveyors])
 
@@ -1202,7 +1419,7 @@ def get_user_save_conveyors():
 def get_machine_connections():
     """Fetch machine connections with production details."""
     try:
-        query = text("""
+        query = text(f"""
             WITH conveyor_data AS (
                 SELECT 
                     usc.connected_component, 
@@ -1216,9 +1433,11 @@ def get_machine_connections():
                     usc.conveyor_speed
                 FROM user_save_connections usc
                 LEFT JOIN user_save us ON usc.connection_inventory = us.output_inventory
+                    AND us.user_id = usc.user_id AND us.ingest_generation = usc.ingest_generation
                 LEFT JOIN machine m ON us.machine_id = m.id
                 LEFT JOIN recipe r ON us.recipe_id = r.id
                 LEFT JOIN part p ON r.part_id = p.id
+                WHERE {active_generation_clause('usc')}
             ),
             deduplicated_conveyors AS (
                 SELECT 
@@ -1247,9 +1466,11 @@ def get_machine_connections():
 def get_connection_graph():
     """Fetches the machine connection graph based on actual item flow."""
     try:
-        user_id = current_user.id,
+        user_id = current_user.id
         #logger.info(f"Generating machine connections for user ID: {user_id}")
-        graph, metadata = build_factory_graph(user_id)
+        graph, metadata = build_factory_graph(user_id, raise_errors=True)
+        # The graph was written to user_connection_data and user_pipe_data, so readers cached from them must reload
+        bump_data_version(USER_SAVE, user_id)
         formatted_graph = format_graph_for_frontend(graph, metadata)
 
         #logger.debug(f"Formatted Graph {formatted_graph}")
@@ -1263,7 +1484,7 @@ def get_connection_graph():
 def get_machine_metadata():
     """Fetch machine metadata including the produced item, base supply, and conveyor speed."""
     try:
-        query = text("""
+        query = text(f"""
             SELECT us.output_inventory, m.machine_name, p.part_name AS produced_item, 
                      r.part_supply_pm, cs.supply_pm AS conveyor_speed, i.icon_path AS icon_path
             FROM user_save us
@@ -1271,8 +1492,10 @@ def get_machine_metadata():
             JOIN recipe r ON us.recipe_id = r.id
             JOIN part p ON r.part_id = p.id
             LEFT JOIN user_save_connections usc ON us.output_inventory = usc.connection_inventory
+                AND usc.user_id = us.user_id AND usc.ingest_generation = us.ingest_generation
             LEFT JOIN conveyor_supply cs ON usc.conveyor_speed = cs.supply_pm
             LEFT JOIN icon i ON m.icon_id = i.id
+            WHERE {active_generation_clause('us')}
         """)
 
         # logger.debug(f"Machine Metadata Query: {query}")
@@ -1292,7 +1515,7 @@ def get_pipe_network():
     """
     try:
         user_id = current_user.id  # Ensure we filter by user
-        pipes = User_Save_Pipes.query.filter_by(user_id=user_id).all()
+        pipes = User_Save_Pipes.query.filter_by(user_id=user_id, ingest_generation=get_active_generation(user_id)).all()
 
         pipe_data = [
             {
@@ -1313,10 +1536,14 @@ def get_pipe_network():
 @login_required
 def get_user_connection_data():
     """Fetches stored processed connection data for the logged-in user."""
+    user_id = current_user.id
+    etag = compute_etag("user_connection_data", get_user_versions(user_id, USER_SAVE), request.args.to_dict(flat=False))
+    return conditional_response(etag, lambda: _build_user_connection_data_response(user_id))
+
+def _build_user_connection_data_response(user_id):
     try:
-        user_id = current_user.id
-        query = text("SELECT * FROM user_connection_data WHERE user_id = :user_id order by id")
-        connections = db.session.execute(query, {"user_id": user_id}).fetchall()
+        query = text("SELECT * FROM user_connection_data WHERE user_id = :user_id AND ingest_generation = :generation order by id")
+        connections = db.session.execute(query, {"user_id": user_id, "generation": get_active_generation(user_id)}).fetchall()
 
         #logger.debug(f"🔍 Connection data for user {user_id}: {connections}")
         # Ensure API response structure matches frontend expectation
@@ -1339,12 +1566,16 @@ def get_user_connection_data():
 @login_required
 def get_user_pipe_data():
     """Fetches stored processed pipe network data for the logged-in user."""
+    user_id = current_user.id
+    etag = compute_etag("user_pipe_data", get_user_versions(user_id, USER_SAVE), request.args.to_dict(flat=False))
+    return conditional_response(etag, lambda: _build_user_pipe_data_response(user_id))
+
+def _build_user_pipe_data_response(user_id):
     try:
-        user_id = current_user.id
         query = text("""
-            SELECT * FROM user_pipe_data WHERE user_id = :user_id ORDER BY id
+            SELECT * FROM user_pipe_data WHERE user_id = :user_id AND ingest_generation = :generation ORDER BY id
         """)
-        pipes = db.session.execute(query, {"user_id": user_id}).fetchall()
+        pipes = db.session.execute(query, {"user_id": user_id, "generation": get_active_generation(user_id)}).fetchall()
 
         # Ensure API response structure matches frontend expectation
         response_data = {
@@ -1659,34 +1890,20 @@ def get_assembly_phases():
 def get_assembly_phases_parts(phase_id):
     results = []
     requests = Project_Assembly_Parts.query.filter_by(phase_id=phase_id).all()
+    graph = get_recipe_graph()
+    effective_recipes = get_effective_recipe_map(current_user.id)
     
     for req in requests:
         ingredient_input_id = req.phase_part_id
         ingredient_recipe = "_Standard"
-        # Lookup the selected recipe for this ingredient from user_selected_recipe
-        selected_recipe_query = """
-            SELECT r.recipe_name
-            FROM user_selected_recipe usr
-            JOIN recipe r ON usr.recipe_id = r.id
-            WHERE usr.user_id = :user_id AND usr.part_id = :part_id
-        """
-        selected_recipe = db.session.execute(
-            text(selected_recipe_query),
-            {"user_id": current_user.id, "part_id": ingredient_input_id}
-        ).scalar()
-
-        # Use the selected recipe or default to the ingredient_recipe (from part_data)
-        final_recipe = selected_recipe if selected_recipe else ingredient_recipe
 
-        logging.debug(f"Final Recipe: {final_recipe}")
+        # Use the user's selected recipe or default to the ingredient_recipe
+        final_recipe = effective_recipes.get(ingredient_input_id) or ingredient_recipe
 
-        # Query the part_supply_pm for the ingredient_input_id and final_recipe
-        final_ingredient_supply_pm = db.session.execute(
-            text("SELECT part_supply_pm FROM recipe WHERE part_id = :part_id AND recipe_name = :recipe_name"),
-            {"part_id": ingredient_input_id, "recipe_name": final_recipe}
-        ).scalar()
+        # Look up the part_supply_pm for the ingredient_input_id and final_recipe
+        recipe = graph.get_recipe(ingredient_input_id, final_recipe)
+        final_ingredient_supply_pm = recipe.part_supply_pm if recipe else None
         logging.debug(f"get_assembly_phases_parts - ingredient_input_id: {ingredient_input_id}, final_recipe: {final_recipe} Final Ingredient Supply PM: {final_ingredient_supply_pm}")
-        logging.debug(f"SENDING BACK - id {req.id} phase_id {req.phase_id} phase_part_id {req.phase_part_id} phase_part_quantity {req.phase_part_quantity} phase_target_parts_pm {final_ingredient_supply_pm} phase_target_timeframe {req.phase_part_quantity / final_ingredient_supply_pm}")
         results.append({
             "id": req.id,
             "phase_id": req.phase_id,
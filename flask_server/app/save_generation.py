@@ -0,0 +1,120 @@
+# Description: This module keeps each user's save data consistent while a new save is being ingested.
+# Every row of the six per-user save tables carries an ingest_generation. An ingest allocates a new generation, writes
+# all of its rows under it while readers keep using the active one, and then makes it active with a single UPDATE of
+# user_save_generation. Readers therefore never see an empty or half-built factory, and the rows of superseded (or
+# failed) generations are deleted afterwards on a background thread.
+
+import threading
+from flask import current_app
+from sqlalchemy import text
+from sqlalchemy.exc import IntegrityError
+from . import db
+from .data_version import bump_data_version, USER_SAVE
+from .logging_util import setup_logger
+
+logger = setup_logger("save_generation")
+
+SAVE_TABLES = ("user_save", "user_save_connections", "user_save_conveyors", "user_connection_data", "user_save_pipes",
+               "user_pipe_data")
+
+
+def active_generation_clause(alias):
+    """SQL condition limiting rows of a save table (by alias) to their user's active generation, for queries over all users."""
+    return (f"{alias}.ingest_generation = COALESCE((SELECT g.active_generation FROM user_save_generation g "
+            f"WHERE g.user_id = {alias}.user_id), 0)")
+
+def get_active_generation(user_id):
+    """Return the generation of the user's save rows that readers should use (0 before the first generational ingest)."""
+    generation = db.session.execute(text("SELECT active_generation FROM user_save_generation WHERE user_id = :user_id"),
+                                    {"user_id": user_id}).scalar()
+    return generation or 0
+
+def allocate_generation(user_id):
+    """Reserve a new generation for an ingest of the user's save and return it. Commits."""
+    params = {"user_id": user_id}
+    update_query = text("""
+        UPDATE user_save_generation SET latest_generation = latest_generation + 1, updated_at = CURRENT_TIMESTAMP
+        WHERE user_id = :user_id
+    """)
+    result = db.session.execute(update_query, params)
+    if result.rowcount == 0:
+        try:
+            db.session.execute(text("""
+                INSERT INTO user_save_generation (user_id, active_generation, latest_generation, created_at, updated_at)
+                VALUES (:user_id, 0, 1, CURRENT_TIMESTAMP, CURRENT_TIMESTAMP)
+            """), params)
+        except IntegrityError:
+            # Another ingest created the row first
+            db.session.rollback()
+            db.session.execute(update_query, params)
+    # Read before committing, so a concurrent allocation cannot be mistaken for ours
+    generation = db.session.execute(text("SELECT latest_generation FROM user_save_generation WHERE user_id = :user_id"),
+                                    params).scalar()
+    db.session.commit()
+    return generation
+
+def lock_generation(user_id):
+    """
+    Lock the user's user_save_generation row until the session's transaction ends and return the active generation.
+    Ingests that change the active generation in place hold it from their first read to their commit, so two of them
+    for the same user run one after the other instead of diffing the same rows. Start a new transaction first, so the
+    rows read after the lock include the previous ingest's changes.
+    """
+    params = {"user_id": user_id}
+    # An UPDATE locks the row in every database, unlike SELECT ... FOR UPDATE
+    lock_query = text("UPDATE user_save_generation SET updated_at = CURRENT_TIMESTAMP WHERE user_id = :user_id")
+    if db.session.execute(lock_query, params).rowcount == 0:
+        try:
+            db.session.execute(text("""
+                INSERT INTO user_save_generation (user_id, active_generation, latest_generation, created_at, updated_at)
+                VALUES (:user_id, 0, 0, CURRENT_TIMESTAMP, CURRENT_TIMESTAMP)
+            """), params)
+        except IntegrityError:
+            # Another ingest created the row first
+            db.session.rollback()
+            db.session.execute(lock_query, params)
+    return get_active_generation(user_id)
+
+def activate_generation(user_id, generation):
+    """
+    Make a fully written generation the one readers use, in one transaction, and invalidate responses built from the
+    previous one. Returns False if a newer generation was activated in the meantime.
+    """
+    result = db.session.execute(text("""
+        UPDATE user_save_generation SET active_generation = :generation, updated_at = CURRENT_TIMESTAMP
+        WHERE user_id = :user_id AND active_generation < :generation
+    """), {"user_id": user_id, "generation": generation})
+    db.session.commit()
+    if result.rowcount == 0:
+        logger.info(f"⚠️ Generation {generation} for user {user_id} was superseded before it could be activated")
+        return False
+    bump_data_version(USER_SAVE, user_id)
+    logger.info(f"✅ Activated save generation {generation} for user {user_id}")
+    return True
+
+def cleanup_generations(user_id, failed_generation=None):
+    """Delete the user's rows from generations older than the active one, and those of failed_generation."""
+    active_generation = get_active_generation(user_id)
+    for table in SAVE_TABLES:
+        result = db.session.execute(text(f"""
+            DELETE FROM {table}
+            WHERE user_id = :user_id AND (ingest_generation < :active_generation OR ingest_generation = :failed_generation)
+        """), {"user_id": user_id, "active_generation": active_generation, "failed_generation": failed_generation})
+        # One transaction per table keeps each delete short; readers never look at these rows anyway
+        db.session.commit()
+        if result.rowcount:
+            logger.info(f"🗑️ Deleted {result.rowcount} old {table} rows for user {user_id}")
+
+def schedule_generation_cleanup(user_id, failed_generation=None):
+    """Run cleanup_generations on a background thread so the ingest (and readers) never wait for the deletes."""
+    app = current_app._get_current_object()
+
+    def cleanup():
+        with app.app_context():
+            try:
+                cleanup_generations(user_id, failed_generation)
+            except Exception as e:
+                db.session.rollback()
+                logger.error(f"❌ Error deleting old save generations for user {user_id}: {e}")
+
+    threading.Thread(target=cleanup, name=f"save-generation-cleanup-{user_id}", daemon=True).start()
@@ -0,0 +1,232 @@
+# Description: This module manages recipe scenarios: named per-user override maps {part_id: recipe} that are applied
+# on top of the user's selected recipes when evaluating their tracked parts. Scenarios never touch user_selected_recipe,
+# so users can try alternate recipes without changing (and then reverting) their selections.
+# Each evaluation is cached until the scenario, the user's selections or tracker, or the reference data change, and
+# scenarios can be compared against the current selections by machine counts and raw resources.
+
+from collections import OrderedDict
+import json
+import threading
+from flask import current_app
+from sqlalchemy import text
+from . import db
+from .build_tree import build_trees, build_tree, build_flat_bom
+from .data_version import get_data_version, bump_data_version, USER_TRACKER
+from .recipe_graph import get_recipe_graph
+from .recipe_selection import get_effective_recipe_map, USER_SELECTION
+from .reference_data import get_reference_data_version
+from .tracker_reports import load_tracker_targets
+from .logging_util import setup_logger
+
+logger = setup_logger("scenarios")
+
+USER_SCENARIO = "user_scenario"  # data_version category, one counter per user
+
+BUILDERS = {"tree": build_tree, "flat": build_flat_bom}
+
+_scenario_results = OrderedDict()  # (user_id, scenario_id, mode, targets) -> (versions, result)
+_scenario_results_lock = threading.Lock()
+
+
+class ScenarioError(ValueError):
+    """Raised when a scenario cannot be saved (unknown recipe, recipe of another part...)."""
+
+
+def load_scenarios(user_id):
+    """Return the user's scenarios as [{"id", "scenario_name", "overrides": [{"part_id", "recipe_id", "recipe_name"}]}]."""
+    scenarios = OrderedDict()
+    for row in db.session.execute(text("SELECT id, scenario_name FROM user_scenario WHERE user_id = :user_id ORDER BY id"),
+                                  {"user_id": user_id}):
+        scenarios[row.id] = {"id": row.id, "scenario_name": row.scenario_name, "overrides": []}
+
+    override_query = """
+        SELECT usr.scenario_id, usr.part_id, usr.recipe_id, r.recipe_name
+        FROM user_scenario_recipe usr
+        JOIN user_scenario us ON usr.scenario_id = us.id
+        JOIN recipe r ON usr.recipe_id = r.id
+        WHERE us.user_id = :user_id
+        ORDER BY usr.id
+    """
+    for row in db.session.execute(text(override_query), {"user_id": user_id}):
+        scenarios[row.scenario_id]["overrides"].append(
+            {"part_id": row.part_id, "recipe_id": row.recipe_id, "recipe_name": row.recipe_name})
+    return list(scenarios.values())
+
+def load_scenario(user_id, scenario_id):
+    """Return one of the user's scenarios (as load_scenarios does) or None if it does not exist."""
+    return next((scenario for scenario in load_scenarios(user_id) if scenario["id"] == scenario_id), None)
+
+def _resolve_overrides(overrides):
+    """Check [{"part_id", "recipe_id"}] against the recipe table and return {part_id: recipe_id}."""
+    resolved = {}
+    for override in overrides:
+        part_id, recipe_id = override.get("part_id"), override.get("recipe_id")
+        if not part_id or not recipe_id:
+            raise ScenarioError("Each override needs a part_id and a recipe_id")
+        recipe_part_id = db.session.execute(text("SELECT part_id FROM recipe WHERE id = :recipe_id"),
+                                            {"recipe_id": recipe_id}).scalar()
+        if recipe_part_id is None:
+            raise ScenarioError(f"Recipe {recipe_id} not found")
+        if recipe_part_id != int(part_id):
+            raise ScenarioError(f"Recipe {recipe_id} does not produce part {part_id}")
+        resolved[int(part_id)] = int(recipe_id)
+    return resolved
+
+def save_scenario(user_id, scenario_name, overrides, scenario_id=None):
+    """
+    Create a scenario, or replace the name and overrides of scenario_id, and return its id.
+    Returns None if scenario_id is not one of the user's scenarios. Raises ScenarioError for invalid overrides.
+    """
+    if not scenario_name:
+        raise ScenarioError("scenario_name is required")
+    resolved = _resolve_overrides(overrides)
+
+    if scenario_id is None:
+        db.session.execute(text("""
+            INSERT INTO user_scenario (user_id, scenario_name, created_at, updated_at)
+            VALUES (:user_id, :scenario_name, CURRENT_TIMESTAMP, CURRENT_TIMESTAMP)
+        """), {"user_id": user_id, "scenario_name": scenario_name})
+        scenario_id = db.session.execute(text("SELECT id FROM user_scenario WHERE user_id = :user_id AND scenario_name = :scenario_name"),
+                                         {"user_id": user_id, "scenario_name": scenario_name}).scalar()
+    else:
+        result = db.session.execute(text("""
+            UPDATE user_scenario SET scenario_name = :scenario_name, updated_at = CURRENT_TIMESTAMP
+            WHERE id = :scenario_id AND user_id = :user_id
+        """), {"user_id": user_id, "scenario_name": scenario_name, "scenario_id": scenario_id})
+        if result.rowcount == 0:
+            db.session.rollback()
+            return None
+        db.session.execute(text("DELETE FROM user_scenario_recipe WHERE scenario_id = :scenario_id"), {"scenario_id": scenario_id})
+
+    for part_id, recipe_id in resolved.items():
+        db.session.execute(text("""
+            INSERT INTO user_scenario_recipe (scenario_id, part_id, recipe_id, created_at, updated_at)
+            VALUES (:scenario_id, :part_id, :recipe_id, CURRENT_TIMESTAMP, CURRENT_TIMESTAMP)
+        """), {"scenario_id": scenario_id, "part_id": part_id, "recipe_id": recipe_id})
+    db.session.commit()
+    bump_data_version(USER_SCENARIO, user_id)
+    return scenario_id
+
+def delete_scenario(user_id, scenario_id):
+    """Delete one of the user's scenarios. Returns False if it does not exist."""
+    owned = db.session.execute(text("SELECT id FROM user_scenario WHERE id = :scenario_id AND user_id = :user_id"),
+                               {"scenario_id": scenario_id, "user_id": user_id}).scalar()
+    if owned is None:
+        return False
+    db.session.execute(text("DELETE FROM user_scenario_recipe WHERE scenario_id = :scenario_id"), {"scenario_id": scenario_id})
+    db.session.execute(text("DELETE FROM user_scenario WHERE id = :scenario_id"), {"scenario_id": scenario_id})
+    db.session.commit()
+    bump_data_version(USER_SCENARIO, user_id)
+    return True
+
+def get_scenario_recipe_map(user_id, scenario):
+    """Return the user's effective recipe map with the scenario's overrides applied (a new dict)."""
+    selected_recipes = dict(get_effective_recipe_map(user_id))
+    for override in scenario["overrides"]:
+        selected_recipes[override["part_id"]] = override["recipe_name"]
+    return selected_recipes
+
+def summarize_boms(boms, graph):
+    """
+    Return {"Machines": {machine: count}, "Raw Resources": {part name: parts per minute}} for a list of flat BOMs.
+    Parts made without ingredients (or without a recipe) are raw resources.
+    """
+    machines = {}
+    raw_resources = {}
+    for bom in boms:
+        if not isinstance(bom, list):
+            continue
+        for row in bom:
+            if row["Produced In"] is not None:
+                machine = str(row["Produced In"])
+                machines[machine] = machines.get(machine, 0) + row["No. of Machines"]
+            recipe = graph.get_recipe(row["Part ID"], row["Recipe"])
+            if recipe is None or not recipe.ingredients:
+                raw_resources[row["Part Name"]] = raw_resources.get(row["Part Name"], 0) + row["Required Parts PM"]
+    return {"Machines": machines, "Raw Resources": raw_resources}
+
+def _evaluate(targets, selected_recipes, graph, mode):
+    reports = [dict(target) for target in targets]
+    boms = build_trees(reports, builder=build_flat_bom, graph=graph, selected_recipes=selected_recipes)
+    trees = boms if mode == "flat" else build_trees(reports, builder=BUILDERS[mode], graph=graph, selected_recipes=selected_recipes)
+    for report, tree in zip(reports, trees):
+        report["tree"] = tree
+    return dict(summarize_boms(boms, graph), Reports=reports)
+
+def _cached(key, versions, compute):
+    with _scenario_results_lock:
+        cached = _scenario_results.get(key)
+        if cached is not None and cached[0] == versions:
+            _scenario_results.move_to_end(key)
+            return cached[1]
+
+    result = compute()
+    max_results = current_app.config.get("SCENARIO_CACHE_SIZE", 128)
+    with _scenario_results_lock:
+        _scenario_results[key] = (versions, result)
+        _scenario_results.move_to_end(key)
+        while len(_scenario_results) > max_results:
+            _scenario_results.popitem(last=False)
+    return result
+
+def evaluate_scenario(user_id, scenario_id, mode="tree", targets=None):
+    """
+    Evaluate the user's tracked parts (or the given targets) under a scenario (None means the current selections).
+    Returns {"Machines", "Raw Resources", "Reports"} where each report carries a "tree" built in mode ("tree" or "flat"),
+    or None if the scenario does not exist. Results are cached and shared, so callers must not modify them.
+    """
+    versions = (
+        get_reference_data_version(),
+        get_data_version(USER_SELECTION, user_id),
+        get_data_version(USER_TRACKER, user_id),
+        get_data_version(USER_SCENARIO, user_id),
+    )
+    key = (user_id, scenario_id, mode, json.dumps(targets, sort_keys=True, default=str) if targets is not None else None)
+
+    def compute():
+        graph = get_recipe_graph()
+        if scenario_id is None:
+            selected_recipes = get_effective_recipe_map(user_id)
+        else:
+            scenario = load_scenario(user_id, scenario_id)
+            if scenario is None:
+                return None
+            selected_recipes = get_scenario_recipe_map(user_id, scenario)
+        logger.info(f"🔄 Evaluating scenario {scenario_id} for user {user_id}")
+        return _evaluate(targets if targets is not None else load_tracker_targets(user_id), selected_recipes, graph, mode)
+
+    return _cached(key, versions, compute)
+
+def _deltas(values, baseline):
+    return {
+        name: values.get(name, 0) - baseline.get(name, 0)
+        for name in sorted(values.keys() | baseline.keys())
+        if abs(values.get(name, 0) - baseline.get(name, 0)) > 1e-9
+    }
+
+def compare_scenarios(user_id, scenario_ids, targets=None):
+    """
+    Compare scenarios with the user's current selections.
+    Returns {"Baseline": {"Machines", "Raw Resources"}, "Scenarios": [{"id", "scenario_name", "Machines", "Raw Resources",
+    "Machine Deltas", "Raw Resource Deltas"}]}. Deltas are scenario minus baseline; unchanged entries are left out.
+    Returns None if any of the scenarios does not exist.
+    """
+    baseline = evaluate_scenario(user_id, None, "flat", targets)
+    names = {scenario["id"]: scenario["scenario_name"] for scenario in load_scenarios(user_id)}
+    comparisons = []
+    for scenario_id in scenario_ids:
+        if scenario_id not in names:
+            return None
+        result = evaluate_scenario(user_id, scenario_id, "flat", targets)
+        comparisons.append({
+            "id": scenario_id,
+            "scenario_name": names[scenario_id],
+            "Machines": result["Machines"],
+            "Raw Resources": result["Raw Resources"],
+            "Machine Deltas": _deltas(result["Machines"], baseline["Machines"]),
+            "Raw Resource Deltas": _deltas(result["Raw Resources"], baseline["Raw Resources"]),
+        })
+    return {
+        "Baseline": {"Machines": baseline["Machines"], "Raw Resources": baseline["Raw Resources"]},
+        "Scenarios": comparisons,
+    }
@@ -0,0 +1,71 @@
+# Description: This module coalesces identical concurrent computations (single flight).
+# The first request for a key runs the computation; requests for the same key that arrive while it is running wait for
+# it and share its result instead of repeating the work. Keys combine the user, the endpoint, the normalized request
+# parameters and the data versions the result depends on, so a request made after a data change never joins an older flight.
+
+import json
+import threading
+from .data_version import get_data_version
+from .recipe_selection import USER_SELECTION
+from .reference_data import get_reference_data_version
+from .logging_util import setup_logger
+
+logger = setup_logger("single_flight")
+
+_flights = {}  # key -> _Flight
+_flights_lock = threading.Lock()
+
+
+class _Flight:
+    def __init__(self):
+        self.done = threading.Event()
+        self.result = None
+        self.error = None
+        self.waiters = 0
+
+
+def normalize_params(params):
+    """Return a hashable, order-independent form of request args (a MultiDict) or a JSON body."""
+    if hasattr(params, "to_dict"):
+        params = params.to_dict(flat=False)
+    return json.dumps(params, sort_keys=True, default=str)
+
+def run_single_flight(key, compute, label="computation"):
+    """Run compute() once for all concurrent callers with the same key and return its result to each of them."""
+    with _flights_lock:
+        flight = _flights.get(key)
+        leader = flight is None
+        if leader:
+            flight = _Flight()
+            _flights[key] = flight
+        else:
+            flight.waiters += 1
+
+    if not leader:
+        flight.done.wait()
+        if flight.error is not None:
+            raise flight.error
+        return flight.result
+
+    try:
+        flight.result = compute()
+        return flight.result
+    except Exception as e:
+        flight.error = e
+        raise
+    finally:
+        with _flights_lock:
+            _flights.pop(key, None)
+        flight.done.set()
+        if flight.waiters:
+            logger.info(f"🔄 Shared {label} result with {flight.waiters} concurrent duplicate request(s)")
+
+def single_flight(user_id, endpoint, params, compute, versions=None):
+    """
+    Coalesce a per-user computation keyed by (user, endpoint, normalized params, data versions).
+    versions are the current versions of the data the result depends on; the default covers results built from the
+    reference data and the user's recipe selections. The result is shared between requests, so callers must not modify it.
+    """
+    if versions is None:
+        versions = (get_reference_data_version(), get_data_version(USER_SELECTION, user_id) if user_id else 0)
+    return run_single_flight((user_id, endpoint, normalize_params(params), tuple(versions)), compute, endpoint)
@@ -0,0 +1,34 @@
+# Description: This module streams JSON responses as newline-delimited JSON (NDJSON).
+# Each item is encoded and sent as soon as it is produced, so the client can render results progressively and the
+# server never holds the whole encoded body in memory.
+
+import json
+from flask import Response, request, stream_with_context
+from .logging_util import setup_logger
+
+logger = setup_logger("streaming")
+
+NDJSON_MIMETYPE = "application/x-ndjson"
+
+
+def wants_ndjson():
+    """Return True if the client prefers an NDJSON stream over a single JSON document."""
+    return request.accept_mimetypes.best_match([NDJSON_MIMETYPE, "application/json"]) == NDJSON_MIMETYPE
+
+def ndjson_response(items, error_message="Failed to generate response"):
+    """
+    Return a streamed response with one JSON document per line for each item of the iterable.
+    The status is sent before the items are produced, so a failure part way ends the stream with an {"error"} line.
+    The response is never cached or tagged with an ETag, so a stream that ended in an error is not reused.
+    """
+    def generate():
+        try:
+            for item in items:
+                yield json.dumps(item, default=str) + "\n"
+        except Exception as e:
+            logger.error(f"❌ {error_message}: {e}")
+            yield json.dumps({"error": error_message}) + "\n"
+    response = Response(stream_with_context(generate()), mimetype=NDJSON_MIMETYPE)
+    response.vary.add("Accept")
+    response.headers["Cache-Control"] = "no-store"
+    return response
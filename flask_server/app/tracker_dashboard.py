@@ -0,0 +1,50 @@
+# Description: This module builds the tracker dashboard: the tracker reports, the production and machine usage
+# comparisons, and the user's save data, all from one pass over the recipe graph. Sections are produced in order by a
+# generator so the route can either stream them as they are ready or collect them into one response.
+
+from .recipe_graph import get_recipe_graph
+from .recipe_selection import get_effective_recipe_map
+from .tracker_reports import get_cached_tracker_reports
+from .production_report import build_target_boms, build_production_report, build_machine_usage_report, load_user_save_rows
+from .logging_util import setup_logger
+
+logger = setup_logger("tracker_dashboard")
+
+DASHBOARD_SECTIONS = ("tracker_reports", "production_report", "machine_usage_report", "user_save", "save_summary")
+
+
+def summarize_save(save_rows):
+    """Return the headline figures of the user's save data (None if no save has been uploaded)."""
+    if not save_rows:
+        return None
+    return {
+        "sav_file_name": save_rows[0]["sav_file_name"],
+        "created_at": save_rows[0]["created_at"],
+        "machines": len(save_rows),
+        "parts": len({row["part_name"] for row in save_rows if row["part_name"]}),
+        "actual_ppm": sum(row["actual_ppm"] for row in save_rows),
+    }
+
+def iter_dashboard_sections(user_id):
+    """
+    Yield (section name, data) for each of DASHBOARD_SECTIONS in order.
+    The tracker trees and the flat bills of materials share one graph, selection map and unit subtree memo.
+    """
+    graph = get_recipe_graph()
+    selected_recipes = get_effective_recipe_map(user_id)
+
+    reports = get_cached_tracker_reports(user_id)
+    yield "tracker_reports", reports
+
+    # The report stubs carry the tracked targets, so the tracker table is only read once
+    boms = build_target_boms(user_id, targets=reports, graph=graph, selected_recipes=selected_recipes)
+    yield "production_report", build_production_report(user_id, boms)
+    yield "machine_usage_report", build_machine_usage_report(user_id, boms)
+
+    save_rows = load_user_save_rows(user_id)
+    yield "user_save", save_rows
+    yield "save_summary", summarize_save(save_rows)
+
+def build_tracker_dashboard(user_id):
+    """Return every dashboard section as one dict."""
+    return dict(iter_dashboard_sections(user_id))
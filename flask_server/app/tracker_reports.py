@@ -0,0 +1,241 @@
+# Description: This module builds the tracker reports (one production tree per tracked part) and keeps each user's
+# last computed reports in memory together with a dependency index {part_id: positions of the tracked roots containing it}.
+# When the user changes a recipe selection only the roots that contain the changed parts are rebuilt, and the response
+# lists just the branches that changed. The remembered reports are served as-is until one of the versions they were
+# built from moves (reference data, the user's selections, tracker or save), and are rebuilt in the background after an upload.
+
+from collections import OrderedDict, namedtuple
+import threading
+from flask import current_app
+from sqlalchemy import text
+from . import db
+from .build_tree import build_trees, get_tree_part_ids
+from .tree_workers import build_trees_parallel
+from .data_version import get_data_version, USER_SAVE, USER_TRACKER
+from .recipe_graph import get_recipe_graph
+from .recipe_selection import get_effective_recipe_map, USER_SELECTION
+from .reference_data import get_reference_data_version
+from .logging_util import setup_logger
+
+logger = setup_logger("tracker_reports")
+
+_last_reports = OrderedDict()  # user_id -> TrackerReportState
+_last_reports_lock = threading.Lock()
+
+ReportVersions = namedtuple("ReportVersions", ["reference", "selection", "tracker", "save"])
+
+
+class TrackerReportState:
+    """The reports last sent to a user and what they were computed from."""
+
+    def __init__(self, versions, selected_recipes, targets, reports, dependency_index):
+        self.versions = versions  # ReportVersions read before the reports were built
+        self.selected_recipes = selected_recipes  # {part_id: recipe_name} the trees were built with
+        self.targets = targets  # tuple of (part_id, recipe_name, target_quantity, target_parts_pm, target_timeframe)
+        self.reports = reports
+        self.dependency_index = dependency_index  # part_id -> set of report positions
+
+
+def get_report_versions(user_id):
+    """Return the current ReportVersions for the user."""
+    return ReportVersions(
+        get_reference_data_version(),
+        get_data_version(USER_SELECTION, user_id),
+        get_data_version(USER_TRACKER, user_id),
+        get_data_version(USER_SAVE, user_id),
+    )
+
+def load_tracker_targets(user_id):
+    """Return the user's tracked parts as report stubs (everything but the tree), in tracker order."""
+    query = """
+        SELECT t.part_id, t.recipe_id, t.target_quantity, t.target_parts_pm, t.target_timeframe, p.part_name, r.recipe_name
+        FROM tracker t
+        JOIN part p ON t.part_id = p.id
+        JOIN recipe r ON t.recipe_id = r.id
+        WHERE t.user_id = :user_id
+        ORDER BY t.id
+    """
+    return [{
+        "part_id": part.part_id,
+        "part_name": part.part_name,
+        "recipe_name": part.recipe_name,
+        "target_quantity": part.target_quantity,
+        "target_parts_pm": part.target_parts_pm,
+        "target_timeframe": part.target_timeframe,
+    } for part in db.session.execute(text(query), {"user_id": user_id})]
+
+def _target_key(report):
+    return (report["part_id"], report["recipe_name"], report["target_quantity"], report["target_parts_pm"], report["target_timeframe"])
+
+def _store_state(user_id, state):
+    max_users = current_app.config.get("TRACKER_REPORT_CACHE_SIZE", 64)
+    with _last_reports_lock:
+        _last_reports[user_id] = state
+        _last_reports.move_to_end(user_id)
+        while len(_last_reports) > max_users:
+            _last_reports.popitem(last=False)
+
+def _build_dependency_index(reports, graph, selected_recipes):
+    dependency_index = {}
+    for position, report in enumerate(reports):
+        for part_id in get_tree_part_ids(report["part_id"], report["recipe_name"], graph, selected_recipes):
+            dependency_index.setdefault(part_id, set()).add(position)
+    return dependency_index
+
+def build_tracker_reports(user_id):
+    """Build every tracked part's tree in one pass, remember the result for the user and return the reports."""
+    versions = get_report_versions(user_id)
+    graph = get_recipe_graph()
+    selected_recipes = get_effective_recipe_map(user_id)
+
+    reports = load_tracker_targets(user_id)
+    if len(reports) >= current_app.config.get("TREE_WORKER_MIN_TARGETS", 16):
+        trees = build_trees_parallel(reports, selected_recipes, graph=graph)
+    else:
+        trees = build_trees(reports, graph=graph, selected_recipes=selected_recipes)
+    for report, tree in zip(reports, trees):
+        report["tree"] = tree
+
+    _remember_reports(user_id, versions, selected_recipes, reports, graph)
+    return reports
+
+def _remember_reports(user_id, versions, selected_recipes, reports, graph):
+    _store_state(user_id, TrackerReportState(
+        versions,
+        dict(selected_recipes),
+        tuple(_target_key(report) for report in reports),
+        reports,
+        _build_dependency_index(reports, graph, selected_recipes),
+    ))
+
+def _get_fresh_state(user_id, versions):
+    with _last_reports_lock:
+        state = _last_reports.get(user_id)
+        if state is not None and state.versions == versions:
+            _last_reports.move_to_end(user_id)
+            logger.info(f"✅ Tracker reports for user {user_id} served from cache")
+            return state
+    return None
+
+def get_cached_tracker_reports(user_id):
+    """
+    Return the user's tracker reports, from the cache when nothing they depend on has changed since they were built.
+    The reports are shared with later requests, so callers must not modify them.
+    """
+    state = _get_fresh_state(user_id, get_report_versions(user_id))
+    if state is not None:
+        return state.reports
+    return build_tracker_reports(user_id)
+
+def iter_tracker_reports(user_id):
+    """
+    Yield the user's tracker reports one at a time, each as soon as its tree is built (or straight from the cache).
+    When the stream completes, the reports are remembered as build_tracker_reports would.
+    """
+    versions = get_report_versions(user_id)
+    state = _get_fresh_state(user_id, versions)
+    if state is not None:
+        yield from state.reports
+        return
+
+    graph = get_recipe_graph()
+    selected_recipes = get_effective_recipe_map(user_id)
+    reports = load_tracker_targets(user_id)
+    for report in reports:
+        report["tree"] = build_trees([report], graph=graph, selected_recipes=selected_recipes)[0]
+        yield report
+    _remember_reports(user_id, versions, selected_recipes, reports, graph)
+
+def warm_tracker_reports(user_id):
+    """Rebuild the user's tracker reports on a background thread so their next visit is served from the cache."""
+    app = current_app._get_current_object()
+
+    def warm():
+        with app.app_context():
+            try:
+                reports = build_tracker_reports(user_id)
+                logger.info(f"✅ Warmed {len(reports)} tracker reports for user {user_id}")
+            except Exception as e:
+                logger.error(f"❌ Error warming tracker reports for user {user_id}: {e}")
+
+    threading.Thread(target=warm, name=f"tracker-report-warmup-{user_id}", daemon=True).start()
+
+def diff_tree(old_tree, new_tree):
+    """
+    Compare two nested trees and return the branches that changed as [{"Path": [names...], "Entry": new entry or None}].
+    An entry is listed whole when its own values change; otherwise only the changed entries below it are listed.
+    """
+    if "Error" in old_tree or "Error" in new_tree:
+        return [] if old_tree == new_tree else [{"Path": [], "Entry": new_tree}]
+
+    changes = []
+    stack = [([], old_tree, new_tree)]
+    while stack:
+        path, old_subtree, new_subtree = stack.pop()
+        for name in sorted(old_subtree.keys() - new_subtree.keys()):
+            changes.append({"Path": path + [name], "Entry": None})
+        for name, entry in new_subtree.items():
+            old_entry = old_subtree.get(name)
+            if old_entry is None or any(old_entry.get(field) != value for field, value in entry.items() if field != "Subtree") \
+                    or old_entry.keys() != entry.keys():
+                changes.append({"Path": path + [name], "Entry": entry})
+            elif old_entry["Subtree"] != entry["Subtree"]:
+                stack.append((path + [name], old_entry["Subtree"], entry["Subtree"]))
+    return changes
+
+def refresh_tracker_reports(user_id):
+    """
+    Bring the user's remembered reports up to date after a recipe selection change.
+    Returns {"full_refresh": bool, "changes": [{"index", "part_id", "recipe_name", "branches"}]}. If nothing was
+    remembered, or the tracker or reference data changed since, every report is rebuilt and full_refresh is True.
+    """
+    with _last_reports_lock:
+        state = _last_reports.get(user_id)
+
+    versions = get_report_versions(user_id)
+    targets = load_tracker_targets(user_id)
+    if (state is None or state.versions.reference != versions.reference
+            or state.targets != tuple(_target_key(report) for report in targets)):
+        reports = build_tracker_reports(user_id)
+        return {
+            "full_refresh": True,
+            "changes": [{
+                "index": position,
+                "part_id": report["part_id"],
+                "recipe_name": report["recipe_name"],
+                "branches": [{"Path": [], "Entry": report["tree"]}],
+            } for position, report in enumerate(reports)],
+        }
+
+    graph = get_recipe_graph()
+    selected_recipes = get_effective_recipe_map(user_id)
+    changed_parts = {
+        part_id for part_id in state.selected_recipes.keys() | selected_recipes.keys()
+        if state.selected_recipes.get(part_id) != selected_recipes.get(part_id)
+    }
+    affected = sorted(set().union(*(state.dependency_index.get(part_id, set()) for part_id in changed_parts)))
+    logger.info(f"🔄 Selection change for user {user_id} touches parts {sorted(changed_parts)}: rebuilding {len(affected)} of {len(state.reports)} tracker trees")
+
+    reports = list(state.reports)
+    new_trees = build_trees([reports[position] for position in affected], graph=graph, selected_recipes=selected_recipes)
+    changes = []
+    for position, tree in zip(affected, new_trees):
+        old_report = reports[position]
+        branches = diff_tree(old_report["tree"], tree)
+        reports[position] = dict(old_report, tree=tree)
+        if branches:
+            changes.append({
+                "index": position,
+                "part_id": old_report["part_id"],
+                "recipe_name": old_report["recipe_name"],
+                "branches": branches,
+            })
+
+    # Only the rebuilt roots can have gained or lost parts
+    dependency_index = {part_id: set(positions) - set(affected) for part_id, positions in state.dependency_index.items()}
+    for position in affected:
+        for part_id in get_tree_part_ids(reports[position]["part_id"], reports[position]["recipe_name"], graph, selected_recipes):
+            dependency_index.setdefault(part_id, set()).add(position)
+
+    _store_state(user_id, TrackerReportState(versions, dict(selected_recipes), state.targets, reports, dependency_index))
+    return {"full_refresh": False, "changes": changes}
@@ -0,0 +1,149 @@
+# Description: This module builds many production trees in parallel, outside the request that asked for them.
+# Loading a user's inputs (tracked targets and recipe selections) is database-bound, so it runs on a thread pool with
+# an app context per thread. Building the trees is CPU-bound work over the in-memory recipe graph, so it runs on a pool
+# of processes that each receive a copy of the graph once and keep their own unit subtree memos.
+# The module can also be run on its own to compute trees offline:
+#   python -m app.tree_workers --user-id 1 --user-id 2 --processes 4 --output trees.json
+
+import argparse
+import json
+import multiprocessing
+import os
+import threading
+from concurrent.futures import ThreadPoolExecutor, ProcessPoolExecutor
+from flask import current_app
+from sqlalchemy import text
+from . import db
+from .build_tree import build_tree, build_flat_bom, build_tree_dag, build_trees
+from .recipe_graph import get_recipe_graph
+from .recipe_selection import get_effective_recipe_map
+from .logging_util import setup_logger
+
+logger = setup_logger("tree_workers")
+
+BUILDERS = {"tree": build_tree, "flat": build_flat_bom, "dag": build_tree_dag}
+
+_worker_graph = None  # the RecipeGraph of a worker process
+
+_process_pool = None  # (graph, processes, ProcessPoolExecutor) shared by the server's requests
+_process_pool_lock = threading.Lock()
+
+
+def _init_worker(graph):
+    global _worker_graph
+    _worker_graph = graph
+
+def _build_chunk(targets, selected_recipes, builder):
+    return build_trees(targets, builder=builder, graph=_worker_graph, selected_recipes=selected_recipes)
+
+def create_process_pool(graph, processes):
+    """Start a pool of processes that each hold a copy of graph."""
+    # spawn rather than fork: the server process has threads and open database connections
+    return ProcessPoolExecutor(max_workers=processes, mp_context=multiprocessing.get_context("spawn"),
+                               initializer=_init_worker, initargs=(graph,))
+
+def get_process_pool(graph, processes):
+    """Return the process-wide pool for graph, replacing it when the graph is reloaded."""
+    global _process_pool
+    with _process_pool_lock:
+        if _process_pool is None or _process_pool[0] is not graph or _process_pool[1] != processes:
+            if _process_pool is not None:
+                _process_pool[2].shutdown(wait=False)
+            _process_pool = (graph, processes, create_process_pool(graph, processes))
+            logger.info(f"🔄 Started {processes} tree worker processes")
+        return _process_pool[2]
+
+def _split(items, parts):
+    size = max(1, -(-len(items) // parts))
+    return [items[start:start + size] for start in range(0, len(items), size)]
+
+def _submit_chunks(pool, processes, targets, selected_recipes, builder):
+    return [pool.submit(_build_chunk, chunk, dict(selected_recipes), builder) for chunk in _split(list(targets), processes)]
+
+def _collect_chunks(futures):
+    return [tree for future in futures for tree in future.result()]
+
+def build_trees_parallel(targets, selected_recipes, graph=None, builder=build_tree, processes=None):
+    """
+    Same result as build_trees(targets, builder, graph, selected_recipes), with the targets split across the
+    process-wide worker pool (TREE_WORKER_PROCESSES processes unless given). Builds inline with fewer than 2 processes.
+    """
+    if graph is None:
+        graph = get_recipe_graph()
+    processes = processes or current_app.config.get("TREE_WORKER_PROCESSES", 0)
+    if processes < 2 or len(targets) < 2:
+        return build_trees(targets, builder=builder, graph=graph, selected_recipes=selected_recipes)
+    pool = get_process_pool(graph, processes)
+    return _collect_chunks(_submit_chunks(pool, processes, targets, selected_recipes, builder))
+
+def load_user_inputs(user_ids, threads=None):
+    """
+    Return {user_id: (tracker targets, {part_id: recipe_name})}, loaded on a thread pool.
+    Each thread pushes its own app context, so this can be called from a request or from the command line.
+    """
+    from .tracker_reports import load_tracker_targets
+
+    app = current_app._get_current_object()
+    threads = threads or current_app.config.get("TREE_WORKER_THREADS", 4)
+
+    def load(user_id):
+        with app.app_context():
+            return load_tracker_targets(user_id), dict(get_effective_recipe_map(user_id))
+
+    with ThreadPoolExecutor(max_workers=threads) as executor:
+        return dict(zip(user_ids, executor.map(load, user_ids)))
+
+def compute_user_trees(targets, selected_recipes, graph, builder=build_tree):
+    """Return the targets as tracker reports (each with its "tree"), built from an explicit selection map."""
+    trees = build_trees(targets, builder=builder, graph=graph, selected_recipes=selected_recipes)
+    return [dict(target, tree=tree) for target, tree in zip(targets, trees)]
+
+def build_users_trees(user_ids, builder=build_tree, processes=None, threads=None):
+    """Return {user_id: tracker reports} for many users: inputs are loaded on threads, trees built on processes."""
+    graph = get_recipe_graph()
+    inputs = load_user_inputs(user_ids, threads)
+    processes = processes or current_app.config.get("TREE_WORKER_PROCESSES", 0)
+    if processes < 2:
+        return {user_id: compute_user_trees(targets, selected_recipes, graph, builder)
+                for user_id, (targets, selected_recipes) in inputs.items()}
+
+    with create_process_pool(graph, processes) as pool:
+        # Submit every user's chunks before waiting on any, so all processes stay busy
+        futures = {user_id: _submit_chunks(pool, processes, targets, selected_recipes, builder)
+                   for user_id, (targets, selected_recipes) in inputs.items()}
+        return {user_id: [dict(target, tree=tree) for target, tree in zip(inputs[user_id][0], _collect_chunks(user_futures))]
+                for user_id, user_futures in futures.items()}
+
+
+def main(argv=None):
+    parser = argparse.ArgumentParser(description="Build tracker trees for users offline.")
+    parser.add_argument("--user-id", type=int, action="append", default=[], help="user to build (repeatable)")
+    parser.add_argument("--all-users", action="store_true", help="build every user with tracked parts")
+    parser.add_argument("--mode", choices=sorted(BUILDERS), default="tree", help="shape of each result")
+    parser.add_argument("--processes", type=int, default=os.cpu_count(), help="worker processes for tree building")
+    parser.add_argument("--threads", type=int, default=4, help="worker threads for database reads")
+    parser.add_argument("--output", help="write the JSON result here instead of stdout")
+    args = parser.parse_args(argv)
+    if not args.user_id and not args.all_users:
+        parser.error("give at least one --user-id or --all-users")
+
+    from . import create_app
+    app = create_app()
+    with app.app_context():
+        user_ids = list(args.user_id)
+        if args.all_users:
+            user_ids += [row.user_id for row in db.session.execute(text("SELECT DISTINCT user_id FROM tracker ORDER BY user_id"))
+                         if row.user_id not in user_ids]
+
+        results = build_users_trees(user_ids, BUILDERS[args.mode], args.processes, args.threads)
+        logger.info(f"✅ Built trees for {len(results)} users ({sum(len(reports) for reports in results.values())} tracked parts)")
+
+    encoded = json.dumps({str(user_id): reports for user_id, reports in results.items()}, default=str)
+    if args.output:
+        with open(args.output, "w") as output_file:
+            output_file.write(encoded)
+    else:
+        print(encoded)
+
+if __name__ == "__main__":
+    main()
@@ -0,0 +1,108 @@
+"""Add save generations, ingest jobs, scenarios and data versions
+
+Revision ID: 6b2e9d41c7a3
+Revises: 358f7b375081
+Create Date: 2026-10-17 09:12:44.518203
+
+"""
+from alembic import op
+import sqlalchemy as sa
+
+
+# revision identifiers, used by Alembic.
+revision = '6b2e9d41c7a3'
+down_revision = '358f7b375081'
+branch_labels = None
+depends_on = None
+
+# Per-user save tables whose rows carry an ingest_generation (see app/save_generation.py)
+SAVE_TABLES = ('user_save', 'user_save_connections', 'user_save_conveyors', 'user_save_pipes', 'user_connection_data',
+               'user_pipe_data')
+
+
+def upgrade():
+    op.create_table('data_version',
+    sa.Column('id', sa.Integer(), nullable=False),
+    sa.Column('category', sa.String(length=100), nullable=False),
+    sa.Column('user_id', sa.Integer(), nullable=False),
+    sa.Column('version', sa.Integer(), nullable=False),
+    sa.Column('created_at', sa.DateTime(), nullable=True),
+    sa.Column('updated_at', sa.DateTime(), nullable=True),
+    sa.PrimaryKeyConstraint('id'),
+    sa.UniqueConstraint('category', 'user_id', name='unique_data_version')
+    )
+    op.create_table('user_scenario',
+    sa.Column('id', sa.Integer(), nullable=False),
+    sa.Column('user_id', sa.Integer(), nullable=False),
+    sa.Column('scenario_name', sa.String(length=100), nullable=False),
+    sa.Column('created_at', sa.DateTime(), nullable=True),
+    sa.Column('updated_at', sa.DateTime(), nullable=True),
+    sa.ForeignKeyConstraint(['user_id'], ['user.id'], ),
+    sa.PrimaryKeyConstraint('id'),
+    sa.UniqueConstraint('user_id', 'scenario_name', name='unique_user_scenario')
+    )
+    op.create_table('user_scenario_recipe',
+    sa.Column('id', sa.Integer(), nullable=False),
+    sa.Column('scenario_id', sa.Integer(), nullable=False),
+    sa.Column('part_id', sa.Integer(), nullable=False),
+    sa.Column('recipe_id', sa.Integer(), nullable=False),
+    sa.Column('created_at', sa.DateTime(), nullable=True),
+    sa.Column('updated_at', sa.DateTime(), nullable=True),
+    sa.ForeignKeyConstraint(['part_id'], ['part.id'], ),
+    sa.ForeignKeyConstraint(['recipe_id'], ['recipe.id'], ),
+    sa.ForeignKeyConstraint(['scenario_id'], ['user_scenario.id'], ondelete='CASCADE'),
+    sa.PrimaryKeyConstraint('id'),
+    sa.UniqueConstraint('scenario_id', 'part_id', name='unique_scenario_part')
+    )
+    op.create_table('user_save_generation',
+    sa.Column('user_id', sa.Integer(), nullable=False),
+    sa.Column('active_generation', sa.Integer(), nullable=False),
+    sa.Column('latest_generation', sa.Integer(), nullable=False),
+    sa.Column('created_at', sa.DateTime(), nullable=True),
+    sa.Column('updated_at', sa.DateTime(), nullable=True),
+    sa.ForeignKeyConstraint(['user_id'], ['user.id'], ),
+    sa.PrimaryKeyConstraint('user_id')
+    )
+    op.create_table('save_ingest_job',
+    sa.Column('id', sa.String(length=36), nullable=False),
+    sa.Column('user_id', sa.Integer(), nullable=False),
+    sa.Column('sav_file_name', sa.String(length=200), nullable=False),
+    sa.Column('file_path', sa.String(length=500), nullable=False),
+    sa.Column('status', sa.String(length=20), nullable=False),
+    sa.Column('stage', sa.String(length=100), nullable=True),
+    sa.Column('progress', sa.Float(), nullable=False),
+    sa.Column('error', sa.Text(), nullable=True),
+    sa.Column('timings', sa.Text(), nullable=True),
+    sa.Column('started_at', sa.DateTime(), nullable=True),
+    sa.Column('finished_at', sa.DateTime(), nullable=True),
+    sa.Column('created_at', sa.DateTime(), nullable=True),
+    sa.Column('updated_at', sa.DateTime(), nullable=True),
+    sa.ForeignKeyConstraint(['user_id'], ['user.id'], ),
+    sa.PrimaryKeyConstraint('id')
+    )
+    with op.batch_alter_table('save_ingest_job', schema=None) as batch_op:
+        batch_op.create_index('ix_save_ingest_job_status', ['status', 'created_at'], unique=False)
+        batch_op.create_index('ix_save_ingest_job_user', ['user_id'], unique=False)
+
+    # Existing rows become generation 0, which readers use until a user's first generational ingest
+    for table in SAVE_TABLES:
+        with op.batch_alter_table(table, schema=None) as batch_op:
+            batch_op.add_column(sa.Column('ingest_generation', sa.Integer(), server_default='0', nullable=False))
+            batch_op.create_index(f'ix_{table}_generation', ['user_id', 'ingest_generation'], unique=False)
+
+
+def downgrade():
+    for table in reversed(SAVE_TABLES):
+        with op.batch_alter_table(table, schema=None) as batch_op:
+            batch_op.drop_index(f'ix_{table}_generation')
+            batch_op.drop_column('ingest_generation')
+
+    with op.batch_alter_table('save_ingest_job', schema=None) as batch_op:
+        batch_op.drop_index('ix_save_ingest_job_user')
+        batch_op.drop_index('ix_save_ingest_job_status')
+
+    op.drop_table('save_ingest_job')
+    op.drop_table('user_save_generation')
+    op.drop_table('user_scenario_recipe')
+    op.drop_table('user_scenario')
+    op.drop_table('data_version')
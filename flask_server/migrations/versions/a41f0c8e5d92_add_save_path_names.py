@@ -0,0 +1,33 @@
+"""Add save path names to user_save and user_save_connections
+
+Revision ID: a41f0c8e5d92
+Revises: 6b2e9d41c7a3
+Create Date: 2026-10-17 09:40:18.203377
+
+"""
+from alembic import op
+import sqlalchemy as sa
+
+
+# revision identifiers, used by Alembic.
+revision = 'a41f0c8e5d92'
+down_revision = '6b2e9d41c7a3'
+branch_labels = None
+depends_on = None
+
+
+def upgrade():
+    # Existing rows have no path name; the user's next upload rewrites them with one (see app/incremental_ingest.py)
+    with op.batch_alter_table('user_save', schema=None) as batch_op:
+        batch_op.add_column(sa.Column('save_path_name', sa.String(length=300), nullable=True))
+
+    with op.batch_alter_table('user_save_connections', schema=None) as batch_op:
+        batch_op.add_column(sa.Column('save_path_name', sa.String(length=300), nullable=True))
+
+
+def downgrade():
+    with op.batch_alter_table('user_save_connections', schema=None) as batch_op:
+        batch_op.drop_column('save_path_name')
+
+    with op.batch_alter_table('user_save', schema=None) as batch_op:
+        batch_op.drop_column('save_path_name')
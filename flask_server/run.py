@@ -11,6 +11,9 @@ app = create_app()
 migrate = Migrate(app, db)
 
 if __name__ == '__main__':
+    # Pick up save files queued before a restart
+    from app.ingest_jobs import ensure_ingest_workers
+    ensure_ingest_workers(app)
     # Use Waitress to serve the Flask app
     serve(app, host="0.0.0.0", port=5000)
 
@@ -61,12 +61,12 @@ const TrackerPage = () => {
   }, []);
 
   useEffect(() => {
-    if (uploading) {
+    if (uploading || processing) {
       setGameModalOpen(true);
     } else {
       setGameModalOpen(false);
     }
-  }, [uploading]);
+  }, [uploading, processing]);
 
   // useEffect(() => {
   //   console.log("uploadSuccess changed:", uploadSuccess);
@@ -307,10 +307,11 @@ const TrackerPage = () => {
 
       setUploadStatus(response.data.message || "Upload successful!");
       setUploadSuccess(true);
+      setProcessing(true);
       setUploading(false);
 
-      showAlert("success", "File uploaded successfully!");
-      fetchData();
+      // The save is processed in the background; poll until it is done
+      pollProcessingStatus(response.data.processing_id);
 
     } catch (error) {
       console.error("Upload failed:", error);
@@ -329,12 +330,23 @@ const TrackerPage = () => {
       const response = await axios.get(`${API_ENDPOINTS.processing_status}/${processingId}`);
       if (response.data.status === "completed") {
         setProcessing(false);
+        showAlert("success", "Save file processed successfully!");
+        fetchData();
+      } else if (response.data.status === "failed") {
+        setProcessing(false);
+        setUploadStatus("Processing failed. Please try again.");
+        setUploadSuccess(false);
+        console.error("❌ TrackerPage: Save file processing failed", response.data.error);
+        showAlert("error", "Save file processing failed. Please try again.");
       } else {
         setTimeout(() => pollProcessingStatus(processingId), 2000); // Poll every 2 seconds
       }
     } catch (error) {
       console.error("Error fetching processing status:", error);
       setProcessing(false);
+      setUploadStatus("Could not check the processing status. Please refresh the page.");
+      setUploadSuccess(false);
+      showAlert("error", "Could not check whether the save file was processed. Please refresh the page.");
     }
   };
 